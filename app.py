@@ -1,8 +1,7 @@
 from flask import Flask, request, jsonify
-import pandas as pd
 from flask_cors import CORS
-import joblib
-import os
+
+from scoring import ScoringCore, read_payload, resolve_feature_columns, STANDARD_FEATURES
 
 app = Flask(__name__)
 CORS(app)
@@ -10,52 +9,35 @@ CORS(app)
 # Caminho do modelo treinado
 MODEL_PATH = "model.pkl"
 
-# Carregar modelo treinado
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(
-        f"Modelo não encontrado em {MODEL_PATH}. Treine e salve-o primeiro."
-    )
-
-model = joblib.load(MODEL_PATH)
+# Carregar modelo treinado (ingestão, aliases, imputação e inferência vêm de scoring.py,
+# o mesmo núcleo usado por backend/main.py)
+core = ScoringCore.from_paths(MODEL_PATH, STANDARD_FEATURES)
+model = core.models[core.default]["model"]
 
 
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
-        if "file" in request.files:
-            file = request.files["file"]
-            # Lê CSV de forma robusta
-            df = pd.read_csv(
-                file,
-                sep=",",
-                skipinitialspace=True,
-                on_bad_lines='skip',  # ignora linhas mal formatadas
-                engine='python'
-            )
-
-        elif request.is_json:
-            data = request.get_json()
-            df = pd.DataFrame(data)
-        else:
-            return jsonify({"error": "Envie um arquivo CSV ou JSON válido"}), 400
+        df, _ = read_payload(request)
 
-        # Opcional: verificar se o CSV tem todas as features necessárias
-        required_features = [
-            "period_d","duration_h","depth_ppm","snr",
-            "planet_radius_re","stellar_teff_k","stellar_logg","stellar_radius_rs"
-        ]
-        missing = [f for f in required_features if f not in df.columns]
+        # Verificar se o arquivo tem todas as features necessárias (nomes padrão ou aliases)
+        resolved = resolve_feature_columns(df.columns, core.features)
+        missing = [f for f, col in resolved.items() if col is None]
         if missing:
             return jsonify({"error": f"Colunas faltando no CSV: {missing}"}), 400
 
-        # Preencher NaN com 0 ou mediana, se quiser
-        df.fillna(0, inplace=True)
+        # Preparo compartilhado: aliases KOI/K2, coerção numérica e imputação por mediana
+        # (todas as linhas são mantidas)
+        X, rows, _ = core.prepare(df, min_raw_nonnull=0)
 
-        # Predição
-        preds = model.predict(df[required_features].values)
-        df["prediction"] = preds
+        # Predição: classe com maior probabilidade
+        p1 = core.score(X, [core.default])[core.default]
+        preds = model.classes_[(p1 > 0.5).astype(int)]
 
-        return jsonify(df.to_dict(orient="records"))
+        out = df.iloc[rows].copy()
+        out["prediction"] = preds
+        out = out.astype(object).where(out.notna(), None)
+        return jsonify(out.to_dict(orient="records"))
 
     except Exception as e:
         return jsonify({"error": f"Erro ao processar: {str(e)}"}), 400
@@ -1,137 +1,293 @@
+# Inicialização rápida: só flask/flask_cors são importados aqui. numpy, pandas,
+# sklearn e os modelos são carregados por load_backend() em uma thread de fundo
+# (STARTUP_MODE=background, padrão) enquanto "/" responde "loading"; requisições
+# que chegam antes esperam até READY_WAIT_S segundos. STARTUP_MODE=eager carrega
+# tudo no import, como antes.
+import time
+_T0 = time.perf_counter()
+
+import json, multiprocessing, os, sys, threading
+from pathlib import PurePath
 from flask import Flask, request, jsonify, Response
-import pandas as pd
-import json
-import numpy as np
 from flask_cors import CORS
-import joblib, os, io
+
+# módulos compartilhados ficam na raiz do repositório
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 app = Flask(__name__)
-CORS(app)
+# headers com contagens do preparo precisam ser visíveis para o frontend
+CORS(app, expose_headers=["X-Rows-Dropped", "X-Rows-Prefiltered", "X-Lines-Skipped", "X-Model", "X-Max-Deviation",
+                               "X-Shard-Timings", "ETag", "X-Cache", "X-Rows-Collapsed"])
 
 # MODEL_PATH = "./rf_300.pkl"   # seu modelo salvo
 MODEL_PATH = "../models/rf_model.pkl"   # modelo treinado após remoçao de NaN e one hot encoding 
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(f"Modelo não encontrado em {MODEL_PATH}")
-
+# qualquer engine do modelo.py serve (rf_model.pkl, hgb_model.pkl ou o .npz do
+# compress_forest.py): só predict_proba é exigido
+MODEL_PATH = os.getenv("MODEL_PATH", MODEL_PATH)
 FEATURES_PATH = os.getenv("FEATURES_PATH", "../models/rf_features.pkl")
+# leaderboard de candidatos gerado por train_multi_rf.py
+LEADERBOARD_PATH = os.getenv("LEADERBOARD_PATH", "../artifacts/leaderboard.sqlite")
+
+# modelos extras servidos lado a lado: "nome=caminho,nome2=caminho2" (caminho aceita glob;
+# vale o arquivo mais recente). Por padrão: model.pkl do app.py raiz, o HGB do
+# modelo.py --engine hgb, a RF compactada por compress_forest.py (.npz) e os
+# últimos artefatos de train_multi_rf.py, se existirem.
+EXTRA_MODELS = os.getenv(
+    "EXTRA_MODELS",
+    "legacy=../model.pkl,hgb=../models/hgb_model.pkl,compact=../models/rf_model.npz,"
+    "student=../models/student.npz,multi=../artifacts/rf_*.pkl,multi_hgb=../artifacts/hgb_*.pkl",
+)
+# aluno destilado (modelo.py --distill): vira o padrão do /predict-individual só se o
+# desvio medido contra o modelo completo (student.json) ficar dentro da tolerância
+# abaixo; senão fica disponível apenas via models=student. O /predict continua
+# sempre com o modelo completo.
+STUDENT_INFO_PATH = os.getenv("STUDENT_INFO_PATH", "../models/student.json")
+STUDENT_MAX_P99_DEV = float(os.getenv("STUDENT_MAX_P99_DEV", "0.05"))
+STUDENT_MAX_ABS_DEV = float(os.getenv("STUDENT_MAX_ABS_DEV", "0.2"))
+# índice KD-tree dos objetos rotulados (gravado pelo modelo.py): vizinhos mais
+# próximos no /neighbors e no /predict?neighbors=k
+NEIGHBORS_PATH = os.getenv("NEIGHBORS_PATH", "../models/neighbors.pkl")
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()   # background|eager
+READY_WAIT_S = float(os.getenv("READY_WAIT_S", "30"))
+WARMUP_ROWS = 64
+# scoring em shards para catálogos enormes: SCORING_WORKERS processos (0 = desligado)
+# com os modelos pré-carregados; matrizes com SHARD_MIN_ROWS+ linhas são divididas
+# em fatias de SHARD_ROWS linhas, compartilhadas via memória compartilhada
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))
+SHARD_ROWS = int(os.getenv("SHARD_ROWS", "250000"))
+SHARD_MIN_ROWS = int(os.getenv("SHARD_MIN_ROWS", "500000"))
+# threads de inferência por requisição: 1 a cada ROWS_PER_THREAD linhas, dividindo um
+# orçamento global de INFERENCE_THREADS (padrão: nº de CPUs) entre as requisições em
+# andamento, em vez do n_jobs=-1 do treino em cada uma (0 = usa o n_jobs do modelo)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", str(os.cpu_count() or 1)))
+ROWS_PER_THREAD = int(os.getenv("ROWS_PER_THREAD", "20000"))
+# cache de respostas do /predict endereçado por conteúdo (upload + parâmetros + modelos);
+# RESULT_CACHE_MB=0 desliga
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "../artifacts/result_cache")
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "256"))
+
+# ======== load models ========
+core = None
+result_cache = None
+MODELS_FINGERPRINT = None    # hash dos modelos servidos + código de scoring (entra na chave do cache)
+STUDENT_INFO = {}
+NEIGHBORS = None             # NeighborIndex (None = sem índice)
+INDIVIDUAL_MODEL = None      # modelo padrão do /predict-individual (None = o mesmo do /predict)
+_ready = threading.Event()
+STARTUP = {"mode": STARTUP_MODE, "status": "loading", "error": None, "timings_s": {}}
+
+def _timed(step, fn):
+    t = time.perf_counter()
+    out = fn()
+    STARTUP["timings_s"][step] = round(time.perf_counter() - t, 4)
+    return out
 
-rf = joblib.load(MODEL_PATH)
-FEATURES = joblib.load(FEATURES_PATH)
-
-# mapeamento de nomes comuns KOI/K2 -> nomes padronizados
-CANDS = {
-    "period_d":        ["period_d","koi_period","pl_orbper","orbital_period","period"],
-    "duration_h":      ["duration_h","koi_duration","transit_duration","duration"],
-    "depth_ppm":       ["depth_ppm","transit_depth","depth","delta"],
-    "snr":             ["snr","model_snr","signal_to_noise","koi_model_snr"],
-    "planet_radius_re":["planet_radius_re","pl_rade","koi_prad","planet_radius"],
-    "stellar_teff_k":  ["stellar_teff_k","st_teff","koi_steff","teff"],
-    "stellar_logg":    ["stellar_logg","st_logg","koi_slogg","logg"],
-    "stellar_radius_rs":["stellar_radius_rs","st_rad","koi_srad","stellar_radius"],
-}
-
-# ======== load model ========
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(f"Modelo não encontrado em {MODEL_PATH}")
-rf = joblib.load(MODEL_PATH)
-if not hasattr(rf, "predict_proba"):
-    raise ValueError("O modelo carregado não possui predict_proba().")
+def warm_up(core):
+    """predict_proba de todos os modelos num lote fictício (inicializações preguiçosas saem do caminho)."""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(np.ones((WARMUP_ROWS, len(core.serve_features))), columns=core.serve_features)
+    X, rows, _ = core.prepare(df)
+    core.score(X, list(core.models), df=df, rows=rows)
+
+def student_within_tolerance(core, info):
+    """O aluno só é promovido a padrão com desvio medido e dentro de STUDENT_MAX_*_DEV."""
+    if "student" not in core.models:
+        return False
+    p99, worst = info.get("p99_abs_dev"), info.get("max_abs_dev")
+    if p99 is None or worst is None:
+        print(f"[WARN] Aluno sem desvio medido ({STUDENT_INFO_PATH}); /predict-individual usa o modelo completo.")
+        return False
+    if p99 > STUDENT_MAX_P99_DEV or worst > STUDENT_MAX_ABS_DEV:
+        print(f"[WARN] Aluno fora da tolerância (p99 {p99} > {STUDENT_MAX_P99_DEV} ou máx {worst} > "
+              f"{STUDENT_MAX_ABS_DEV}); /predict-individual usa o modelo completo (models=student ainda aceito).")
+        return False
+    return True
+
+def load_backend():
+    """Imports pesados, carga dos modelos (uma vez) e warm-up; preenche STARTUP."""
+    global core, result_cache, MODELS_FINGERPRINT, STUDENT_INFO, NEIGHBORS, INDIVIDUAL_MODEL
+    try:
+        _timed("import_numpy_pandas", lambda: (__import__("numpy"), __import__("pandas")))
+        _timed("import_sklearn", lambda: __import__("sklearn.ensemble"))
+        scoring = _timed("import_scoring", lambda: __import__("scoring"))
+        _timed("import_leaderboard", lambda: __import__("leaderboard"))
+        import joblib
+        features = _timed("load_features", lambda: joblib.load(FEATURES_PATH))
+        loaded = _timed("load_models", lambda: scoring.ScoringCore.from_paths(MODEL_PATH, features, extra_models=EXTRA_MODELS))
+        if INFERENCE_THREADS > 0:
+            loaded.set_thread_budget(INFERENCE_THREADS, ROWS_PER_THREAD)
+        _timed("warmup", lambda: warm_up(loaded))
+        if SCORING_WORKERS > 0:
+            try:
+                _timed("start_shard_pool", lambda: loaded.enable_sharding(SCORING_WORKERS, SHARD_ROWS, SHARD_MIN_ROWS))
+            except Exception as e:
+                # sem pool o scoring continua no processo (threads), só mais lento
+                print("[WARN] Pool de shards indisponível, scoring no processo:", str(e))
+        if "student" in loaded.models and os.path.exists(STUDENT_INFO_PATH):
+            with open(STUDENT_INFO_PATH, "r", encoding="utf-8") as f:
+                STUDENT_INFO = json.load(f)
+        INDIVIDUAL_MODEL = "student" if student_within_tolerance(loaded, STUDENT_INFO) else None
+        if os.path.exists(NEIGHBORS_PATH):
+            try:
+                from neighbor_index import NeighborIndex
+                index = _timed("load_neighbors", lambda: NeighborIndex.load(NEIGHBORS_PATH))
+                if not set(index.features) <= set(loaded.features):
+                    raise ValueError(f"features do índice {index.features} fora das features do modelo")
+                NEIGHBORS = index
+            except Exception as e:
+                # sem índice só o /neighbors e o ?neighbors= ficam indisponíveis
+                print("[WARN] Índice de vizinhos indisponível:", str(e))
+        if RESULT_CACHE_MB > 0:
+            from result_cache import ResultCache, models_fingerprint
+            code = [os.path.join(os.path.dirname(scoring.__file__), f) for f in ("scoring.py", "exo_preprocess.py", "compress_forest.py")]
+            if NEIGHBORS is not None:
+                code += [os.path.join(os.path.dirname(scoring.__file__), "neighbor_index.py"), NEIGHBORS_PATH]
+            MODELS_FINGERPRINT = _timed("fingerprint_models", lambda: models_fingerprint(loaded.models, extra_files=code))
+            result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MB * 2**20))
+        core = loaded
+        STARTUP["status"] = "ok"
+    except Exception as e:
+        STARTUP["status"] = "error"
+        STARTUP["error"] = str(e)
+        print("[ERROR] Falha ao carregar o backend:", str(e))
+    STARTUP["ready_after_s"] = round(time.perf_counter() - _T0, 4)
+    _ready.set()
+
+def decompress_requests(wsgi_app):
+    """
+    Corpos com Content-Encoding: gzip/zstd são descomprimidos em streaming antes
+    do parse (DecompressRequestMiddleware, importado só quando um chega).
+    """
+    state = {}
+    def middleware(environ, start_response):
+        if not environ.get("HTTP_CONTENT_ENCODING"):
+            return wsgi_app(environ, start_response)
+        if "mw" not in state:
+            from scoring import DecompressRequestMiddleware
+            state["mw"] = DecompressRequestMiddleware(wsgi_app)
+        return state["mw"](environ, start_response)
+    return middleware
+
+app.wsgi_app = decompress_requests(app.wsgi_app)
+
+@app.before_request
+def wait_until_ready():
+    # "/" responde na hora (loading/ok/error); as demais rotas esperam os modelos
+    if request.endpoint == "health_check":
+        return None
+    if not _ready.wait(READY_WAIT_S):
+        resp = jsonify({"error": "Modelos ainda carregando, tente novamente em instantes.", "status": "loading"})
+        resp.headers["Retry-After"] = "5"
+        return resp, 503
+    if core is None:
+        return jsonify({"error": f"Backend indisponível: {STARTUP['error']}", "status": "error"}), 503
+    return None
+
+STARTUP["timings_s"]["import_flask"] = round(time.perf_counter() - _T0, 4)
+# com o reloader do modo debug, o processo pai só observa arquivos: não carrega modelos
+_RELOADER_PARENT = __name__ == "__main__" and not os.environ.get("WERKZEUG_RUN_MAIN")
+# workers do pool de shards (spawn) reimportam este módulo: também não carregam nada
+_SHARD_WORKER = multiprocessing.current_process().name != "MainProcess"
+if _RELOADER_PARENT or _SHARD_WORKER:
+    pass
+elif STARTUP_MODE == "eager":
+    load_backend()
+else:
+    threading.Thread(target=load_backend, name="load-backend", daemon=True).start()
 
 # ======== helpers ========
-def _to_num(s: pd.Series) -> pd.Series:
-    s = pd.Series(s, dtype="object").astype(str).str.replace(",", ".", regex=False)
-    return pd.to_numeric(
-        s.str.extract(r"([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)")[0],
-        errors="coerce",
-    )
-
-def _get_any(df: pd.DataFrame, names) -> pd.Series:
-    cols = {c.lower().strip(): c for c in df.columns}
-    for n in names:
-        nlow = n.lower().strip()
-        if nlow in cols:
-            return _to_num(df[cols[nlow]])
-        for key, orig in cols.items():
-            if key == nlow or key.startswith(nlow) or nlow in key:
-                return _to_num(df[orig])
-    return pd.Series([np.nan] * len(df))
-
-def build_features_only(df: pd.DataFrame) -> pd.DataFrame:
-    out = pd.DataFrame()
-    lower = {c.lower().strip(): c for c in df.columns}
-    if all(f in lower for f in [c.lower() for c in FEATURES]):
-        for f in FEATURES:
-            out[f] = _to_num(df[lower[f.lower()]])
-        return out
-    for f in FEATURES:
-        out[f] = _get_any(df, CANDS[f])
-    return out
-
-def prepare_input_to_features(df_in: pd.DataFrame, min_raw_nonnull: int = 3) -> pd.DataFrame:
-    X = build_features_only(df_in)
-    keep = X.notna().sum(axis=1) >= min_raw_nonnull
-    X = X.loc[keep].copy()
-    if len(X) == 0:
-        raise ValueError(
-            f"Nenhuma linha com informação suficiente (min_raw_nonnull={min_raw_nonnull})."
-        )
-    X = X.replace([np.inf, -np.inf], np.nan)
-    med = X.median(numeric_only=True)
-    for c in X.columns:
-        X[c] = X[c].fillna(med[c])
-    return X
-
-def read_payload_to_df(req) -> pd.DataFrame:
-    if "file" in req.files:
-        file = req.files["file"]
-        name = (file.filename or "").lower()
-        if name.endswith(".xlsx") or name.endswith(".xls"):
-            return pd.read_excel(file)
-        return pd.read_csv(file, sep=",", skipinitialspace=True, on_bad_lines="skip", engine="python")
-    if req.is_json:
-        payload = req.get_json()
-        if isinstance(payload, dict) and "data" in payload:
-            return pd.DataFrame(payload["data"])
-        return pd.DataFrame(payload)
-    raise ValueError("Envie um arquivo CSV/XLSX em 'file' ou JSON válido.")
-
-def format_prob_column(out: pd.DataFrame, prob_format: str, prob_decimals: int, keep_float: bool):
-    # já vem como p_planet_float de 0..1
-    if prob_format == "percent":
-        pct = (out["p_planet_float"] * 100).round(prob_decimals)
-        # formata com símbolo %
-        out["p_planet"] = pct.map(lambda x: f"{int(x)}%" if prob_decimals == 0 else f"{x:.{prob_decimals}f}%")
-    else:
-        # mantém decimal 0..1 com casas definidas
-        out["p_planet"] = out["p_planet_float"].round(prob_decimals)
-    if not keep_float:
-        out.drop(columns=["p_planet_float"], inplace=True)
-    return out
+def _flag(name, default="0"):
+    return request.args.get(name, default).lower() in ("1", "true")
+
+def stats_headers(stats: dict) -> dict:
+    """Contagens do preparo expostas nos headers da resposta."""
+    headers = {
+        "X-Rows-Dropped": str(stats["rows_dropped"]),
+        "X-Rows-Prefiltered": str(stats["rows_prefiltered"]),
+    }
+    if "rows_collapsed" in stats:
+        headers["X-Rows-Collapsed"] = str(stats["rows_collapsed"])
+    return headers
+
+# respostas JSON menores que isso não compensam a compressão
+MIN_COMPRESS_BYTES = 1024
+
+def _response_encoding():
+    """Melhor codificação aceita pelo cliente (Accept-Encoding), ou None."""
+    from scoring import response_encodings
+    return request.accept_encodings.best_match(response_encodings())
+
+def encoded_headers(headers: dict, encoding) -> dict:
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return headers
+
+def cached_response(key, meta, body_file):
+    """Resposta do /predict servida do cache (sem ingestão nem scoring)."""
+    from result_cache import iter_file
+    from scoring import compress_chunks
+    headers = dict(meta["headers"], **{"X-Cache": "hit"})
+    encoding = _response_encoding()
+    if meta["mimetype"] != "text/csv" and meta["size"] < MIN_COMPRESS_BYTES:
+        encoding = None
+    body = iter_file(body_file)
+    if encoding:
+        body = compress_chunks(body, encoding)
+    resp = Response(body, mimetype=meta["mimetype"], headers=encoded_headers(headers, encoding))
+    resp.set_etag(key, weak=True)
+    return resp
 
 @app.route("/predict-individual", methods=["POST"])
 def predict_individual():
+    from scoring import frame_from_json, is_bulk, json_loads
     try:
-        # 1) Ler o JSON do corpo da requisição
-        data = request.get_json()
-
-        if not data:
+        # 1) Ler o JSON do corpo da requisição: um objeto, ou uma lista de objetos
+        #    (variante em lote; o layout colunar também é aceito)
+        raw = request.get_data()
+        if not raw:
             return jsonify({"error": "Nenhum dado enviado no corpo da requisição."}), 400
+        payload = json_loads(raw)
+        bulk = is_bulk(payload)
 
         # 2) Converter em DataFrame (mesmo formato usado no treino)
-        df_in = pd.DataFrame([data])
+        df_in = frame_from_json(payload)
 
-        # 3) Pré-processamento e alinhamento de features
-        X = prepare_input_to_features(df_in)
-        X_aligned = X.reindex(columns=FEATURES, fill_value=0)
+        # 3) Pré-processamento direto para a matriz float32 alinhada com as features
+        #    (sem imputação: cada linha é avaliada como se fosse enviada sozinha)
+        X, rows, _ = core.prepare(df_in, impute=False)
 
-        # 4) Obter probabilidade da classe positiva (exoplaneta)
-        p_planet = rf.predict_proba(X_aligned)[:, 1][0]
+        # 4) Obter probabilidade da classe positiva (exoplaneta) de cada modelo
+        #    (sem ?models=, o aluno destilado responde, se houver um carregado)
+        names = core.parse_model_names(request.args.get("models") or INDIVIDUAL_MODEL)
+        scores = core.score(X, names, df=df_in, rows=rows)
+        p_planet = core.combine(scores, names, _flag("ensemble"))
 
         # 5) Retornar resultado como JSON simples
-        return jsonify({
-            "probability": float(p_planet),
-            "probability_percent": round(float(p_planet) * 100, 4)
-        })
+        def result(i):
+            r = {
+                "probability": float(p_planet[i]),
+                "probability_percent": round(float(p_planet[i]) * 100, 4)
+            }
+            if len(names) > 1:
+                r["models"] = {n: float(p[i]) for n, p in scores.items()}
+            return r
+
+        if not bulk:
+            resp = jsonify(result(0))
+        else:
+            # linhas descartadas (informação insuficiente) voltam com erro, na mesma posição
+            results = [{"error": "Informação insuficiente para avaliar este objeto."}] * len(df_in)
+            for i, pos in enumerate(rows):
+                results[pos] = result(i)
+            resp = jsonify(results)
+        resp.headers["X-Model"] = ",".join(names)
+        if names[0] == "student" and "max_abs_dev" in STUDENT_INFO:
+            resp.headers["X-Max-Deviation"] = str(STUDENT_INFO["max_abs_dev"])
+        return resp
 
     except Exception as e:
         print("[ERROR] /predict-individual:", str(e))
@@ -139,70 +295,181 @@ def predict_individual():
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    from scoring import compress_chunks, iter_csv_chunks, read_payload
     try:
         # params
         fmt = (request.args.get("format") or "json").lower()            # json|csv
-        top = request.args.get("top")
-        include_index = request.args.get("include_index", "0").lower() in ("1", "true")
+        try:
+            top = int(request.args.get("top"))
+        except (TypeError, ValueError):
+            top = None
+        include_index = _flag("include_index")
         min_raw_nonnull = int(request.args.get("min_raw_nonnull", 3))
         prob_format = (request.args.get("prob_format") or "percent").lower()  # percent|float
         prob_decimals = int(request.args.get("prob_decimals", 8))
-        keep_float = request.args.get("keep_float", "0").lower() in ("1", "true")
-
-        # 1) ler input
-        df_in = read_payload_to_df(request)
-
-        # 2) features only + preparo
-        X = prepare_input_to_features(df_in, min_raw_nonnull=min_raw_nonnull)
-
-        # 3) prob de classe positiva
-        # --- Garante alinhamento com features do treino ---
-        X_aligned = X.reindex(columns=FEATURES, fill_value=0)
-
-        missing = [f for f in FEATURES if f not in X.columns]
-        extra = [f for f in X.columns if f not in FEATURES]
-        if missing or extra:
-            print(f"[WARN] Features ausentes: {missing}, extras: {extra}")
-
-        p1 = rf.predict_proba(X_aligned)[:, 1]
-        out = X.copy()
-        out["p_planet_float"] = pd.Series(p1, index=out.index)
-
-        # 4) ranking (maior -> menor) por probabilidade numérica
-        if include_index:
-            out = out.reset_index(names="orig_idx")
-        out = out.sort_values("p_planet_float", ascending=False)
+        keep_float = _flag("keep_float")
+        names = core.parse_model_names(request.args.get("models"))        # ex.: rf,legacy
+        ensemble = _flag("ensemble")
+        dedupe = _flag("dedupe", "1")       # linhas com features idênticas: pontuadas uma vez só
+        n_neighbors = int(request.args.get("neighbors", 0))   # k vizinhos rotulados por linha (0 = não)
+        if n_neighbors > 0 and NEIGHBORS is None:
+            return jsonify({"error": "Índice de vizinhos não encontrado. Rode modelo.py primeiro."}), 404
+
+        # 0) mesmo conteúdo + mesmos parâmetros + mesmos modelos -> mesma resposta:
+        #    a chave (hash) é o ETag e endereça o cache em disco
+        req, key = request, None
+        if result_cache is not None:
+            from result_cache import cache_key, hashed_request
+            req, digest = hashed_request(request)
+            upload = (request.files["file"].filename or "") if "file" in request.files else ""
+            params = {
+                "format": fmt, "top": top, "include_index": include_index,
+                "min_raw_nonnull": min_raw_nonnull, "prob_format": prob_format,
+                "prob_decimals": prob_decimals, "keep_float": keep_float,
+                "models": names, "ensemble": ensemble, "dedupe": dedupe, "neighbors": n_neighbors,
+                "upload": [request.mimetype, "".join(PurePath(upload.lower()).suffixes[-2:])],
+            }
+            key = cache_key(digest, params, MODELS_FINGERPRINT)
+            # ETag fraco: o mesmo corpo sai em gzip/zstd/identidade conforme o Accept-Encoding
+            if request.if_none_match.contains_weak(key):
+                resp = Response(status=304, headers={"Vary": "Accept-Encoding"})
+                resp.set_etag(key, weak=True)
+                return resp
+            hit = result_cache.get(key)
+            if hit is not None:
+                return cached_response(key, *hit)
+
+        # 1) ler input (só as colunas que alimentam alguma feature)
+        df_in, ingest = read_payload(req, usecols_for=lambda cols: core.needed_columns(cols, names))
+
+        # 2) features only + preparo (matriz float32 já na ordem das features)
+        X, rows, stats = core.prepare(df_in, min_raw_nonnull=min_raw_nonnull)
+
+        # 3) prob de classe positiva: um preparo, todos os modelos pedidos
+        #    (catálogos com SHARD_MIN_ROWS+ linhas vão para o pool de shards; linhas
+        #    repetidas são avaliadas uma vez e o resultado copiado para todas)
+        shard_timings = []
+        scores = core.score(X, names, df=df_in, rows=rows, timings=shard_timings, dedupe=dedupe, stats=stats)
+
+        # 4) ranking, top N e formatação da probabilidade
+        out = core.result_frame(
+            X, rows, df_in.index, scores, names,
+            ensemble=ensemble, top=top, include_index=include_index,
+            prob_format=prob_format, prob_decimals=prob_decimals, keep_float=keep_float,
+        )
+        if n_neighbors > 0:
+            # uma consulta em lote no KD-tree para as linhas devolvidas (no CSV, JSON por célula)
+            near = NEIGHBORS.neighbors(out[NEIGHBORS.features].to_numpy(), k=n_neighbors, with_values=False)
+            out["neighbors"] = [json.dumps(r, ensure_ascii=False) for r in near] if fmt == "csv" else near
+
+        # 5) resposta (guardada no cache sem compressão e sem os tempos por shard)
+        headers = stats_headers(stats)
+        headers["X-Lines-Skipped"] = str(ingest["lines_skipped"])
+        if fmt == "csv":
+            headers["Content-Disposition"] = "attachment; filename=predicoes.csv"
+        meta = {"headers": dict(headers)}
+        if key:
+            headers["X-Cache"] = "miss"
+        if shard_timings:
+            headers["X-Shard-Timings"] = json.dumps(
+                [[t["model"], t["stop"] - t["start"], t["seconds"]] for t in shard_timings], separators=(",", ":"))
+        encoding = _response_encoding()
+        if fmt == "csv":
+            # CSV gerado em fatias e comprimido em streaming (sem montar o arquivo inteiro)
+            body = iter_csv_chunks(out)
+            if key:
+                body = result_cache.tee(key, body, dict(meta, mimetype="text/csv"))
+            if encoding:
+                body = compress_chunks(body, encoding)
+            resp = Response(body, mimetype="text/csv", headers=encoded_headers(headers, encoding))
+        else:
+            resp = jsonify(out.to_dict(orient="records"))
+            if key:
+                result_cache.put(key, resp.get_data(), dict(meta, mimetype=resp.mimetype, size=resp.content_length))
+            if encoding and resp.content_length >= MIN_COMPRESS_BYTES:
+                resp.set_data(b"".join(compress_chunks([resp.get_data()], encoding)))
+            else:
+                encoding = None
+            resp.headers.update(encoded_headers(headers, encoding))
+        if key:
+            resp.set_etag(key, weak=True)
+        return resp
 
-        # 5) top N opcional
-        if top is not None:
-            try:
-                n = int(top)
-                if n > 0:
-                    out = out.head(n)
-            except ValueError:
-                pass
+    except Exception as e:
+        return jsonify({"error": f"Erro ao processar: {str(e)}"}), 400
 
-        # 6) formatar coluna final de probabilidade
-        out = format_prob_column(out, prob_format, prob_decimals, keep_float)
+@app.route("/neighbors", methods=["POST"])
+def neighbors():
+    # objetos rotulados (KOI/K2) mais parecidos com cada objeto enviado, no espaço das features
+    from scoring import frame_from_json, is_bulk, json_loads
+    if NEIGHBORS is None:
+        return jsonify({"error": "Índice de vizinhos não encontrado. Rode modelo.py primeiro."}), 404
+    try:
+        k = int(request.args.get("k", 5))
+        raw = request.get_data()
+        if not raw:
+            return jsonify({"error": "Nenhum dado enviado no corpo da requisição."}), 400
+        # mesmo formato do /predict-individual: um objeto ou uma lista de objetos
+        payload = json_loads(raw)
+        bulk = is_bulk(payload)
+        df_in = frame_from_json(payload)
+
+        # faltas ficam NaN aqui e são imputadas com as medianas do próprio índice
+        X, rows, _ = core.prepare(df_in, impute=False)
+        cols = [core.serve_features.index(f) for f in NEIGHBORS.features]
+        near = NEIGHBORS.neighbors(X[:, cols], k=k)
+
+        if not bulk:
+            return jsonify({"neighbors": near[0]})
+        results = [{"error": "Informação insuficiente para avaliar este objeto."}] * len(df_in)
+        for i, pos in enumerate(rows):
+            results[pos] = {"neighbors": near[i]}
+        return jsonify(results)
 
-        # 7) manter apenas features + prob(s)
-        keep_cols = FEATURES + (["orig_idx"] if include_index else []) + (["p_planet"] + (["p_planet_float"] if keep_float else []))
-        out = out[keep_cols]
+    except Exception as e:
+        print("[ERROR] /neighbors:", str(e))
+        return jsonify({"error": f"Erro ao processar: {str(e)}"}), 400
 
-        # 8) resposta
-        if fmt == "csv":
-            buf = io.StringIO()
-            out.to_csv(buf, index=False)
-            buf.seek(0)
-            return Response(
-                buf.getvalue(),
-                mimetype="text/csv",
-                headers={"Content-Disposition": "attachment; filename=predicoes.csv"},
-            )
-        return jsonify(out.to_dict(orient="records"))
+def _opt_float_arg(name):
+    v = request.args.get(name)
+    return float(v) if v not in (None, "") else None
 
+@app.route("/leaderboard", methods=["GET"])
+def get_leaderboard():
+    # ranking pré-calculado: nenhuma inferência é feita aqui
+    from leaderboard import query_leaderboard
+    if not os.path.exists(LEADERBOARD_PATH):
+        return jsonify({"error": "Leaderboard não encontrado. Rode train_multi_rf.py primeiro."}), 404
+    try:
+        result = query_leaderboard(
+            LEADERBOARD_PATH,
+            mission=request.args.get("mission"),
+            p_min=_opt_float_arg("p_min"),
+            p_max=_opt_float_arg("p_max"),
+            r_min=_opt_float_arg("r_min"),
+            r_max=_opt_float_arg("r_max"),
+            page=int(request.args.get("page", 1)),
+            page_size=int(request.args.get("page_size", 50)),
+        )
     except Exception as e:
         return jsonify({"error": f"Erro ao processar: {str(e)}"}), 400
+    return jsonify(result)
+
+@app.route("/models", methods=["GET"])
+def list_models():
+    return jsonify({
+        "default": core.default,
+        "models": {
+            n: {"path": m["path"], "features": m["features"], "pipeline": "pipeline" in m}
+            for n, m in core.models.items()
+        },
+        "individual_default": INDIVIDUAL_MODEL or core.default,
+        "student": STUDENT_INFO or None,
+        "student_tolerance": {"p99_abs_dev": STUDENT_MAX_P99_DEV, "max_abs_dev": STUDENT_MAX_ABS_DEV},
+        "threads": core.budget.stats() if core.budget else None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "neighbors": {"path": NEIGHBORS_PATH, "objects": len(NEIGHBORS), "features": NEIGHBORS.features} if NEIGHBORS else None,
+    })
 
 @app.route("/metrics_summary", methods=["GET"])
 def get_metrics_summary():
@@ -215,7 +482,9 @@ def get_metrics_summary():
 
 @app.route("/", methods=["GET"])
 def health_check():
-    return jsonify({"status": "ok", "message": "Backend Flask ativo"})
+    # loading -> ok (ou error); "startup" traz o tempo de cada etapa da carga
+    messages = {"ok": "Backend Flask ativo", "loading": "Carregando modelos", "error": "Falha ao carregar modelos"}
+    return jsonify({"status": STARTUP["status"], "message": messages[STARTUP["status"]], "startup": STARTUP})
 
 if __name__ == "__main__":
     # debug=True só em dev
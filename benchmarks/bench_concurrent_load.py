@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Load test of inference parallelism under concurrent requests.
+
+``--clients`` threads (a threaded/multi-worker server) send scoring requests
+back to back for ``--duration`` seconds through ``ScoringCore.score``, with a
+mix of batch sizes (mostly single objects and small tables, some large
+catalogues).  Two configurations are compared:
+
+    static     every model keeps ``n_jobs`` as trained (``--static_jobs``,
+               ``-1`` = all cores): each request starts a full set of joblib
+               threads, whatever its size and however many are in flight
+    adaptive   ``ScoringCore.set_thread_budget``: threads per request from the
+               batch size, capped by a global budget of ``--threads``
+
+and reported as requests/s, rows/s and p50/p99 latency per batch size.
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_concurrent_load.py
+    python benchmarks/bench_concurrent_load.py --clients 32 --duration 20 --sizes 1,1,1,50,50,5000,100000
+    python benchmarks/bench_concurrent_load.py --static_jobs 16   # emulate the trained n_jobs=-1 of a 16-core box
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import defaultdict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scoring import ScoringCore  # noqa: E402
+
+
+def run_load(core, names, batches, clients: int, duration: float) -> dict:
+    """Drive ``clients`` threads for ``duration`` seconds over ``(size, X)`` batches; latencies per size."""
+    lat = defaultdict(list)
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        local = defaultdict(list)
+        while time.perf_counter() < stop_at:
+            size, X = batches[rng.integers(len(batches))]
+            t0 = time.perf_counter()
+            core.score(X, names)
+            local[size].append(time.perf_counter() - t0)
+        with lock:
+            for k, v in local.items():
+                lat[k].extend(v)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"wall_s": time.perf_counter() - t0, "lat": lat}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Static n_jobs vs adaptive thread budget under concurrent load.")
+    parser.add_argument("--model", type=str, default=os.path.join(ROOT, "models", "rf_model.pkl"), help="Model to serve (.pkl or .npz).")
+    parser.add_argument("--features", type=str, default=os.path.join(ROOT, "models", "rf_features.pkl"), help="Feature list of the model (joblib).")
+    parser.add_argument("--data", type=str, default=os.path.join(ROOT, "datasets", "clean_KOI.csv"), help="Catalogue the batches are sampled from.")
+    parser.add_argument("--sizes", type=str, default="1,1,1,1,20,20,500,20000", help="Batch sizes drawn uniformly by the clients.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client threads.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per configuration.")
+    parser.add_argument("--static_jobs", type=int, default=-1, help="n_jobs of the static configuration (-1 = all cores, as trained).")
+    parser.add_argument("--threads", type=int, default=None, help="Global thread budget of the adaptive configuration (default: cpu count).")
+    parser.add_argument("--rows_per_thread", type=int, default=20_000, help="Rows per leased thread (adaptive).")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    core = ScoringCore.from_paths(args.model, joblib.load(args.features))
+    names = [core.default]
+    raw = pd.read_csv(args.data, comment="#")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    batches = []
+    for i, n in enumerate(sizes):
+        X, _, _ = core.prepare(raw.sample(n=n, replace=True, random_state=i).reset_index(drop=True))
+        batches.append((n, X))
+    print(f"cpus={os.cpu_count()} clients={args.clients} sizes={sizes} duration={args.duration}s")
+
+    model = core.models[core.default]["model"]
+    results = {}
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = args.static_jobs
+        results["static"] = run_load(core, names, batches, args.clients, args.duration)
+    else:
+        print(f"[WARN] {type(model).__name__} has no n_jobs; only the adaptive configuration is run.")
+    core.set_thread_budget(args.threads, args.rows_per_thread)
+    results["adaptive"] = run_load(core, names, batches, args.clients, args.duration)
+
+    print(f"{'config':<9} {'req/s':>8} {'rows/s':>10}  " + "  ".join(f"{f'p50/p99 ms @{n}':>22}" for n in sorted(set(sizes))))
+    for label, r in results.items():
+        n_req = sum(len(v) for v in r["lat"].values())
+        n_rows = sum(k * len(v) for k, v in r["lat"].items())   # requested rows
+        cells = []
+        for n in sorted(set(sizes)):
+            v = np.array(r["lat"].get(n, [np.nan])) * 1000
+            cells.append(f"{np.percentile(v, 50):>10.1f}/{np.percentile(v, 99):<11.1f}")
+        print(f"{label:<9} {n_req / r['wall_s']:>8.1f} {n_rows / r['wall_s']:>10.0f}  " + "  ".join(cells))
+    print(f"thread budget: {core.budget.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sky cross-match of ``crossmatch.py`` (unit-vector KD-tree)
+against the all-pairs angular distance it replaces.
+
+A synthetic catalogue of ``--rows`` objects is drawn uniformly on the sphere,
+with periods log-uniform in 0.5-500 days; ``--dup_frac`` of them are copied
+into a second "mission" with the position jittered by ~1 arcsec and the
+period by 0.1%.  For each size the script prints the time of both matchers and
+whether they find the same pairs (the all-pairs run is skipped above
+``--max_brute`` rows).
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_crossmatch.py
+    python benchmarks/bench_crossmatch.py --rows 10000,100000,1000000 --max_brute 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crossmatch import match_pairs, unit_vectors  # noqa: E402
+
+
+def synthetic_sky(n: int, dup_frac: float, rng):
+    """(ra, dec, period, base) of ``n`` objects plus jittered copies of a fraction of them."""
+    ra = rng.uniform(0, 360, n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    period = np.exp(rng.uniform(np.log(0.5), np.log(500), n))
+    dup = rng.choice(n, int(n * dup_frac), replace=False)
+    jitter = 1.0 / 3600
+    ra2 = ra[dup] + rng.normal(0, jitter, len(dup)) / np.cos(np.radians(dec[dup]))
+    dec2 = np.clip(dec[dup] + rng.normal(0, jitter, len(dup)), -90, 90)
+    period2 = period[dup] * (1 + rng.normal(0, 0.001, len(dup)))
+    base = np.r_[np.zeros(n, dtype=int), np.ones(len(dup), dtype=int)]
+    return np.r_[ra, ra2 % 360], np.r_[dec, dec2], np.r_[period, period2], base
+
+
+def brute_pairs(ra, dec, period, base, radius_arcsec, period_rtol, block=2000):
+    """All-pairs angular distances, in blocks of rows."""
+    U = unit_vectors(ra, dec)
+    cos_r = np.cos(np.radians(radius_arcsec / 3600))
+    out_i, out_j = [], []
+    for s in range(0, len(U), block):
+        cos = U[s:s + block] @ U.T
+        i, j = np.nonzero(cos >= cos_r)
+        i += s
+        keep = (i < j) & (base[i] != base[j])
+        keep &= np.abs(period[i] - period[j]) <= period_rtol * np.maximum(period[i], period[j])
+        out_i.append(i[keep])
+        out_j.append(j[keep])
+    return np.concatenate(out_i), np.concatenate(out_j)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KD-tree vs all-pairs sky cross-match.")
+    parser.add_argument("--rows", type=str, default="5000,20000,100000", help="Comma-separated catalogue sizes.")
+    parser.add_argument("--dup_frac", type=float, default=0.2, help="Fraction of objects duplicated in the second mission.")
+    parser.add_argument("--radius_arcsec", type=float, default=3.0, help="Match radius.")
+    parser.add_argument("--period_rtol", type=float, default=0.01, help="Relative period tolerance.")
+    parser.add_argument("--max_brute", type=int, default=20_000, help="Largest size the all-pairs matcher is run on.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    match_pairs(*synthetic_sky(100, 0.2, rng)[:3])   # imports out of the timings
+    print(f"{'rows':>9} {'pairs':>8} {'kdtree_s':>9} {'brute_s':>9}  same pairs")
+    for n in [int(s) for s in args.rows.split(",") if s.strip()]:
+        ra, dec, period, base = synthetic_sky(n, args.dup_frac, rng)
+        t0 = time.perf_counter()
+        i, j = match_pairs(ra, dec, period, args.radius_arcsec, args.period_rtol, groups=base)
+        t_kd = time.perf_counter() - t0
+        if len(ra) <= args.max_brute:
+            t0 = time.perf_counter()
+            bi, bj = brute_pairs(ra, dec, period, base, args.radius_arcsec, args.period_rtol)
+            t_brute = f"{time.perf_counter() - t0:>9.3f}"
+            same = set(zip(i.tolist(), j.tolist())) == set(zip(bi.tolist(), bj.tolist()))
+        else:
+            t_brute, same = f"{'-':>9}", "-"
+        print(f"{len(ra):>9} {len(i):>8} {t_kd:>9.3f} {t_brute}  {same}")
+
+
+if __name__ == "__main__":
+    main()
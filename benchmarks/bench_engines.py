@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Side-by-side report of the ``modelo.py`` training engines (``--engine rf|hgb``).
+
+Both engines are trained on the same KOI + K2 splits and ``FEATURES`` as
+``modelo.py`` (``load_splits``) and compared on:
+
+    fit_s        training time
+    size_kb      joblib artifact size
+    p50/p99_ms   latency of a single-row ``predict_proba`` (the
+                 ``/predict-individual`` case), over ``--single`` calls
+    batch_ms     ``predict_proba`` over the whole combined test set
+    auc          ROC-AUC on the combined test set
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_engines.py
+    python benchmarks/bench_engines.py --n_estimators 500 --single 2000 --json engines.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import modelo  # noqa: E402
+from scoring import predict_positive  # noqa: E402
+from sklearn.metrics import roc_auc_score  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare RandomForest vs HistGradientBoosting for modelo.py.")
+    parser.add_argument("--engines", type=str, default="rf,hgb", help="Comma-separated engines to compare.")
+    parser.add_argument("--n_estimators", type=int, default=300, help="Trees (rf) / boosting iterations (hgb).")
+    parser.add_argument("--max_depth", type=int, default=20, help="Maximum tree depth.")
+    parser.add_argument("--single", type=int, default=500, help="Single-row predictions timed per engine.")
+    parser.add_argument("--json", type=str, default=None, help="Optional path for the report as JSON.")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    X_train, y_train, X_test, y_test, *_ = modelo.load_splits()
+    X_test32 = np.ascontiguousarray(X_test.to_numpy(dtype=np.float32))
+    rows = np.random.default_rng(0).integers(0, len(X_test32), size=args.single)
+    print(f"train={len(X_train)} test={len(X_test)} features={len(modelo.FEATURES)}")
+
+    report = {}
+    for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+        est = modelo.build_estimator(engine, args.n_estimators, args.max_depth)
+        t0 = time.perf_counter()
+        est.fit(X_train, y_train)
+        fit_s = time.perf_counter() - t0
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"{engine}.pkl")
+            joblib.dump(est, path)
+            size_kb = os.path.getsize(path) / 1024
+
+        predict_positive(est, X_test32[:1])  # warm-up
+        lat = np.empty(len(rows))
+        for i, r in enumerate(rows):
+            t0 = time.perf_counter()
+            predict_positive(est, X_test32[r:r + 1])
+            lat[i] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        scores = predict_positive(est, X_test32)
+        batch_ms = (time.perf_counter() - t0) * 1000
+
+        report[engine] = {
+            "fit_s": round(fit_s, 3),
+            "size_kb": round(size_kb, 1),
+            "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 3),
+            "p99_ms": round(float(np.percentile(lat, 99)) * 1000, 3),
+            "batch_ms": round(batch_ms, 2),
+            "auc": round(float(roc_auc_score(y_test, scores)), 4),
+        }
+
+    cols = ["fit_s", "size_kb", "p50_ms", "p99_ms", "batch_ms", "auc"]
+    print(f"{'engine':<7}" + "".join(f"{c:>11}" for c in cols))
+    for engine, r in report.items():
+        print(f"{engine:<7}" + "".join(f"{r[c]:>11}" for c in cols))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n_estimators": args.n_estimators, "max_depth": args.max_depth, "engines": report}, f, indent=2)
+        print(f"[OK] Report saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
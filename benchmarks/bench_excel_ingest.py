@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark XLSX ingestion: ``pd.read_excel`` vs the streaming reader in ``scoring``.
+
+For each workbook three readers are timed and their peak Python heap
+(``tracemalloc``) is recorded:
+
+    read_excel        pd.read_excel, full openpyxl workbook
+    stream (all)      scoring.read_excel_stream, read-only row iterator
+    stream (features) same, keeping only the columns that feed a feature
+
+The streamed table with all columns is also checked to be identical to the
+``pd.read_excel`` one.
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_excel_ingest.py
+    python benchmarks/bench_excel_ingest.py --files datasets/KOI.xlsx --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import CANDS, alias_usecols, read_excel_stream  # noqa: E402
+
+
+def measure(fn, repeat: int):
+    """Best wall time over ``repeat`` runs and the peak traced memory (MiB) of the last one."""
+    best, peak, out = float("inf"), 0.0, None
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return out, best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare pd.read_excel with the streaming XLSX reader.")
+    parser.add_argument("--files", type=str, default="datasets/KOI.xlsx,datasets/K2.xlsx",
+                        help="Comma-separated list of XLSX files.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per reader (best time is reported).")
+    args = parser.parse_args()
+
+    usecols = alias_usecols(list(CANDS.values()))
+    print(f"{'file':<20} {'reader':<18} {'rows':>7} {'cols':>5} {'time_s':>8} {'peak_MiB':>9}")
+    for path in [p.strip() for p in args.files.split(",") if p.strip()]:
+        full, t_full, m_full = measure(lambda: pd.read_excel(path), args.repeat)
+        stream, t_stream, m_stream = measure(lambda: read_excel_stream(path), args.repeat)
+        narrow, t_narrow, m_narrow = measure(lambda: read_excel_stream(path, usecols_for=usecols), args.repeat)
+
+        name = os.path.basename(path)
+        for label, df, t, m in [
+            ("read_excel", full, t_full, m_full),
+            ("stream (all)", stream, t_stream, m_stream),
+            ("stream (features)", narrow, t_narrow, m_narrow),
+        ]:
+            print(f"{name:<20} {label:<18} {len(df):>7} {df.shape[1]:>5} {t:>8.2f} {m:>9.1f}")
+
+        same = list(full.columns) == list(stream.columns) and all(full[c].equals(stream[c]) for c in full.columns)
+        print(f"{name:<20} identical to read_excel: {same}")
+
+
+if __name__ == "__main__":
+    main()
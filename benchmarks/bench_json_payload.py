@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON payload decoding: records vs columnar layout, stdlib json vs orjson.
+
+Payloads are built by resampling ``datasets/clean_KOI.csv`` to the requested
+sizes.  For each size, layout and decoder the script times the path a
+``/predict`` request takes before inference:
+
+    decode (json/orjson) -> frame_from_json -> ScoringCore-style feature matrix
+
+and checks that both layouts produce the same float32 matrix.
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_json_payload.py
+    python benchmarks/bench_json_payload.py --sizes 1000,100000,500000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import STANDARD_FEATURES, build_feature_matrix, frame_from_json  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def best_time(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare records vs columnar JSON payload decoding.")
+    parser.add_argument("--data", type=str, default="datasets/clean_KOI.csv", help="CSV used to build the payloads.")
+    parser.add_argument("--sizes", type=str, default="1000,100000", help="Comma-separated row counts.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (best time is reported).")
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.data)
+    features = [f for f in STANDARD_FEATURES if f in base.columns]
+    base = base[features]
+
+    decoders = [("json", json.loads)]
+    if orjson is not None:
+        decoders.append(("orjson", orjson.loads))
+    else:
+        print("(orjson não instalado: só o decodificador stdlib é medido)")
+
+    print(f"{'rows':>8} {'layout':<9} {'decoder':<7} {'bytes':>11} {'decode_s':>9} {'frame_s':>8} {'matrix_s':>9} {'total_s':>8}")
+    for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        df = base.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+        payloads = {
+            "records": json.dumps({"data": json.loads(df.to_json(orient="records"))}).encode(),
+            "columnar": json.dumps({c: [None if v != v else v for v in df[c].tolist()] for c in features}).encode(),
+        }
+        matrices = {}
+        for layout, body in payloads.items():
+            for dec_name, loads in decoders:
+                payload, t_dec = best_time(lambda: loads(body), args.repeat)
+                frame, t_frame = best_time(lambda: frame_from_json(payload), args.repeat)
+                X, t_mat = best_time(lambda: build_feature_matrix(frame, features), args.repeat)
+                matrices[layout] = X
+                total = t_dec + t_frame + t_mat
+                print(f"{n:>8} {layout:<9} {dec_name:<7} {len(body):>11} {t_dec:>9.4f} {t_frame:>8.4f} {t_mat:>9.4f} {total:>8.4f}")
+        same = np.array_equal(matrices["records"], matrices["columnar"], equal_nan=True)
+        print(f"{n:>8} records/columnar matrices identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
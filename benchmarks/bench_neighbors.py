@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-row cost of nearest labelled neighbour queries (``neighbor_index.py``).
+
+Rows resampled from ``datasets/clean_KOI.csv`` are queried against the index
+saved by ``modelo.py`` (``models/neighbors.pkl``) in batches of ``--batch``
+rows, with the prebuilt KD-tree and with a brute-force scan (full distance
+matrix against every labelled object).  The script prints the per-row query
+time of each and whether the neighbours found are the same.
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_neighbors.py
+    python benchmarks/bench_neighbors.py --rows 200000 --k 10 --batch 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from neighbor_index import NeighborIndex  # noqa: E402
+from scoring import build_feature_matrix  # noqa: E402
+
+
+def brute_force(index: NeighborIndex, Z: np.ndarray, k: int):
+    """Exact k nearest by a full distance matrix against every indexed point."""
+    points = np.asarray(index.tree.data)
+    d2 = (Z * Z).sum(axis=1)[:, None] - 2.0 * Z @ points.T + (points * points).sum(axis=1)[None, :]
+    pos = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(d2, pos, axis=1)
+    order = np.argsort(part, axis=1, kind="stable")
+    pos = np.take_along_axis(pos, order, axis=1)
+    return np.sqrt(np.maximum(np.take_along_axis(part, order, axis=1), 0)), pos
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="KD-tree vs brute-force nearest labelled neighbours.")
+    parser.add_argument("--index", type=str, default=os.path.join(ROOT, "models", "neighbors.pkl"), help="Index saved by modelo.py.")
+    parser.add_argument("--data", type=str, default=os.path.join(ROOT, "datasets", "clean_KOI.csv"), help="Catalogue the queries are sampled from.")
+    parser.add_argument("--rows", type=int, default=50_000, help="Query rows.")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per row.")
+    parser.add_argument("--batch", type=int, default=10_000, help="Rows per query batch.")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    index = NeighborIndex.load(args.index)
+    t_load = time.perf_counter() - t0
+    raw = pd.read_csv(args.data, comment="#")
+    df = raw.sample(n=args.rows, replace=True, random_state=0).reset_index(drop=True)
+    Z = index.scaled(build_feature_matrix(df, index.features))
+    print(f"{args.index}: {len(index)} objects x {len(index.features)} features (load {t_load * 1000:.1f} ms); "
+          f"{len(Z)} query rows, k={args.k}")
+
+    results = {}
+    for label, fn in (("kd-tree", lambda z: index.tree.query(z, k=args.k)),
+                      ("brute", lambda z: brute_force(index, z, args.k))):
+        t0 = time.perf_counter()
+        parts = [fn(Z[i:i + args.batch]) for i in range(0, len(Z), args.batch)]
+        t = time.perf_counter() - t0
+        results[label] = (np.vstack([d for d, _ in parts]), np.vstack([p for _, p in parts]), t)
+
+    d_ref, p_ref, _ = results["brute"]
+    print(f"{'method':<8} {'total_s':>8} {'us/row':>8}  same neighbours")
+    for label, (d, p, t) in results.items():
+        # ties at equal distance may come back in a different order
+        same = np.mean(np.all((p == p_ref) | np.isclose(d, d_ref, rtol=0, atol=1e-9), axis=1))
+        print(f"{label:<8} {t:>8.3f} {t / len(Z) * 1e6:>8.1f}  {same:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark sharded scoring (``ScoringCore.enable_sharding`` / ``ShardPool``)
+against the in-process path on a catalogue resampled to millions of rows.
+
+The matrix is prepared once from ``datasets/clean_KOI.csv`` (resampled with
+replacement) and scored with the in-process threads and then with 1, 2, 4, ...
+worker processes.  For each run the script prints the wall time, the speedup
+and whether the probabilities are identical to the in-process ones; with
+``--show_shards`` it also prints the per-shard timings of the last run.
+
+Pool start-up (spawning the workers and loading the models) is reported
+separately: in the backend it is paid once, at start-up.
+
+Example usage (from the repository root):
+
+    python benchmarks/bench_sharded_scoring.py
+    python benchmarks/bench_sharded_scoring.py --rows 4000000 --workers 1,2,4,8 --shard_rows 250000
+    python benchmarks/bench_sharded_scoring.py --model models/hgb_model.pkl --show_shards
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scoring import ScoringCore  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare in-process vs sharded process-pool scoring.")
+    parser.add_argument("--model", type=str, default=os.path.join(ROOT, "models", "rf_model.pkl"), help="Model to score with (.pkl or .npz).")
+    parser.add_argument("--features", type=str, default=os.path.join(ROOT, "models", "rf_features.pkl"), help="Feature list of the model (joblib).")
+    parser.add_argument("--data", type=str, default=os.path.join(ROOT, "datasets", "clean_KOI.csv"), help="Catalogue to resample.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows of the resampled catalogue.")
+    parser.add_argument("--workers", type=str, default="1,2,4", help="Comma-separated pool sizes.")
+    parser.add_argument("--shard_rows", type=int, default=250_000, help="Rows per shard.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (best time is reported).")
+    parser.add_argument("--show_shards", action="store_true", help="Print the per-shard timings of the last run.")
+    args = parser.parse_args()
+
+    core = ScoringCore.from_paths(args.model, joblib.load(args.features))
+    raw = pd.read_csv(args.data, comment="#")
+    df = raw.sample(n=args.rows, replace=True, random_state=0).reset_index(drop=True)
+    X, rows, _ = core.prepare(df)
+    name = core.default
+    print(f"{args.model}: {len(X)} rows x {X.shape[1]} features ({X.nbytes / 2**20:.0f} MiB), cpus={os.cpu_count()}")
+
+    def best(fn):
+        t, out = float("inf"), None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            t = min(t, time.perf_counter() - t0)
+        return out, t
+
+    ref, t_ref = best(lambda: core.score(X, [name])[name])
+    print(f"{'mode':<12} {'startup_s':>10} {'score_s':>9} {'speedup':>8}  identical")
+    print(f"{'in-process':<12} {'-':>10} {t_ref:>9.3f} {1.0:>7.2f}x  True")
+
+    timings = []
+    for w in [int(s) for s in args.workers.split(",") if s.strip()]:
+        t0 = time.perf_counter()
+        core.enable_sharding(w, shard_rows=args.shard_rows, min_rows=0)
+        t_start = time.perf_counter() - t0
+
+        def run():
+            timings.clear()
+            return core.score(X, [name], timings=timings)[name]
+
+        p, t = best(run)
+        core._shards.close()
+        print(f"{f'{w} workers':<12} {t_start:>10.3f} {t:>9.3f} {t_ref / t:>7.2f}x  {np.array_equal(p, ref)}")
+
+    core._shards = None
+    if args.show_shards:
+        print(f"{'model':<8} {'rows':>9} {'pid':>8} {'seconds':>8}")
+        for s in timings:
+            print(f"{s['model']:<8} {s['stop'] - s['start']:>9} {s['pid']:>8} {s['seconds']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
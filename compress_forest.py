@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Compact forest artifacts: prune, quantise and save a trained random forest.
+
+``models/rf_model.pkl`` is a pickled sklearn forest: every node carries
+float64 thresholds, int64 child/feature indices, impurity and sample counts
+that inference never reads, and unpickling rebuilds one Python object per
+tree.  This tool turns a fitted ``RandomForestClassifier`` (or
+``ExtraTreesClassifier``) into a ``CompactForest``:
+
+    1. tree pruning: trees are added greedily, each time the one that most
+       improves validation ROC-AUC, until the sub-forest is within
+       ``--auc_tol`` of the full forest's AUC *and* its probabilities are
+       within ``--max_mean_dp`` (mean absolute difference) of the full
+       forest's; the remaining trees are dropped.  Trees are selected on half
+       of the validation rows and the deltas are reported on the other half;
+    2. thresholds are stored as float32, rounded *down*, so ``x <= t`` gives
+       the same branch as sklearn's float64 threshold for every float32 input
+       (sklearn casts inputs to float32 before traversing its trees);
+    3. leaf probabilities are stored as float16 (``--leaf_dtype``);
+    4. feature and child indices use the narrowest integer type that fits.
+
+The result is a versioned ``.npz`` (flat node arrays, no pickle) that loads
+with ``np.load`` in milliseconds.  ``CompactForest`` predicts with vectorised
+NumPy traversal and exposes ``predict_proba``/``feature_names_in_``, so
+``ScoringCore`` (``scoring.load_model``) serves ``.npz`` models like any
+other model.
+
+Validation data defaults to the KOI + K2 test split of ``modelo.py``; models
+trained by ``train_multi_rf.py`` use ``--processed_dir``/``--base_names`` (the
+feature-store validation split, imputed with the training medians).
+
+Example usage:
+
+    python compress_forest.py --model models/rf_model.pkl
+    python compress_forest.py --model artifacts/rf_KOIFULL_K2FULL_<ts>.pkl \\
+        --processed_dir processed --base_names KOIFULL,K2FULL --auc_tol 0.001
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import time
+from typing import Optional
+
+import numpy as np
+
+FORMAT_NAME = "goldlens-compact-forest"
+FORMAT_VERSION = 1
+
+
+def _int_dtype(max_value: int, min_value: int = 0):
+    """Narrowest signed integer dtype holding ``[min_value, max_value]``."""
+    for dt in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dt)
+        if info.min <= min_value and max_value <= info.max:
+            return dt
+    return np.int64
+
+
+class CompactForest:
+    """
+    Random forest stored as flat node arrays (one segment per tree).
+
+    ``feature`` is -1 on leaves; ``left``/``right`` are child indices local to
+    each tree; ``value`` is the positive-class probability of each leaf (for
+    a regression forest fitted on probabilities, e.g. a distilled student, the
+    leaf prediction).
+    """
+
+    def __init__(self, features, offsets, max_depth, feature, threshold, left, right, missing_left, value, classes=(0, 1)):
+        self.feature_names_in_ = np.asarray(features, dtype=str)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.classes_ = np.asarray(classes)
+        self.offsets = np.asarray(offsets)
+        self.max_depth = int(max_depth)
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.offsets)
+
+    @classmethod
+    def from_sklearn(cls, forest, trees=None, leaf_dtype=np.float16, features=None) -> "CompactForest":
+        """
+        Compact copy of a fitted binary sklearn forest classifier, or of a
+        forest regressor whose targets are probabilities (optionally only the
+        ``trees`` positions).  ``features`` names the inputs of forests fitted
+        on plain arrays.
+        """
+        is_clf = hasattr(forest, "classes_")
+        if not hasattr(forest, "estimators_") or (is_clf and len(forest.classes_) != 2):
+            raise ValueError("Only fitted binary RandomForest/ExtraTrees classifiers (or regressors) can be compacted.")
+        estimators = [forest.estimators_[i] for i in (range(len(forest.estimators_)) if trees is None else trees)]
+        tts = [e.tree_ for e in estimators]
+        sizes = np.array([t.node_count for t in tts])
+        n_feat = forest.n_features_in_
+
+        thr = np.concatenate([t.threshold for t in tts])
+        thr32 = thr.astype(np.float32)
+        # round down: for float32 x, x <= thr32 exactly when x <= thr (float64)
+        up = thr32.astype(np.float64) > thr
+        thr32[up] = np.nextafter(thr32[up], np.float32(-np.inf))
+
+        feat = np.concatenate([np.where(t.feature < 0, -1, t.feature) for t in tts])
+        is_leaf = feat < 0
+        idx_dt = _int_dtype(int(sizes.max()))
+        left = np.concatenate([np.maximum(t.children_left, 0) for t in tts]).astype(idx_dt)
+        right = np.concatenate([np.maximum(t.children_right, 0) for t in tts]).astype(idx_dt)
+        if is_clf:
+            val = np.concatenate([t.value[:, 0, 1] / t.value[:, 0, :].sum(axis=1) for t in tts])
+        else:
+            val = np.clip(np.concatenate([t.value[:, 0, 0] for t in tts]), 0.0, 1.0)
+        if features is None:
+            features = getattr(forest, "feature_names_in_", None)
+        return cls(
+            features=[str(f) for f in features] if features is not None else [f"x{i}" for i in range(n_feat)],
+            offsets=np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(_int_dtype(int(sizes.sum()))),
+            max_depth=max(t.max_depth for t in tts),
+            feature=feat.astype(_int_dtype(n_feat, -1)),
+            threshold=np.where(is_leaf, 0, thr32).astype(np.float32),
+            left=left,
+            right=right,
+            missing_left=np.concatenate([t.missing_go_to_left for t in tts]).astype(np.uint8),
+            value=np.where(is_leaf, val, 0).astype(leaf_dtype),
+            classes=forest.classes_ if is_clf else (0, 1),
+        )
+
+    # ---- persistence ----
+    def save(self, path) -> None:
+        """Write the versioned ``.npz`` (uncompressed, so loading is a plain read)."""
+        np.savez(
+            path,
+            format=np.array(FORMAT_NAME),
+            version=np.array(FORMAT_VERSION),
+            features=self.feature_names_in_,
+            classes=self.classes_,
+            offsets=self.offsets,
+            max_depth=np.array(self.max_depth),
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            missing_left=self.missing_left,
+            value=self.value,
+        )
+
+    @classmethod
+    def load(cls, path) -> "CompactForest":
+        with np.load(path, allow_pickle=False) as z:
+            if str(z["format"]) != FORMAT_NAME:
+                raise ValueError(f"{path} is not a compact forest file.")
+            version = int(z["version"])
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{path} uses compact forest format v{version}; this code reads up to v{FORMAT_VERSION}.")
+            return cls(
+                features=z["features"], offsets=z["offsets"], max_depth=int(z["max_depth"]),
+                feature=z["feature"], threshold=z["threshold"], left=z["left"], right=z["right"],
+                missing_left=z["missing_left"], value=z["value"], classes=z["classes"],
+            )
+
+    # ---- inference ----
+    def tree_probabilities(self, X, chunk_rows: int = 8192) -> np.ndarray:
+        """Positive-class probability of every tree, shape (n_trees, n_rows), float32."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features_in_}.")
+        roots = self.offsets.astype(np.int64)
+        n_trees, n_feat = self.n_trees, self.n_features_in_
+        out = np.empty((n_trees, len(X)), dtype=np.promote_types(self.value.dtype, np.float32))
+        for start in range(0, len(X), chunk_rows):
+            Xc = X[start:start + chunk_rows]
+            n = len(Xc)
+            flat_x, flat_out = Xc.ravel(), np.empty(n_trees * n, dtype=out.dtype)
+            # one walker per (tree, row); walkers that reach a leaf write it out and are dropped
+            node = np.repeat(roots, n)
+            root = node.copy()
+            x_at = np.tile(np.arange(n) * n_feat, n_trees)
+            slot = np.arange(n_trees * n)
+            for _ in range(self.max_depth + 1):
+                f = self.feature[node]
+                inner = f >= 0
+                if not inner.all():
+                    flat_out[slot[~inner]] = self.value[node[~inner]]
+                    node, root, x_at, slot, f = node[inner], root[inner], x_at[inner], slot[inner], f[inner]
+                    if not len(node):
+                        break
+                x = flat_x[x_at + f]
+                go_left = x <= self.threshold[node]
+                nan = np.isnan(x)
+                if nan.any():
+                    go_left |= nan & (self.missing_left[node] == 1)
+                node = np.where(go_left, self.left[node], self.right[node]) + root
+            out[:, start:start + n] = flat_out.reshape(n_trees, n)
+        return out
+
+    def predict_proba(self, X) -> np.ndarray:
+        p1 = self.tree_probabilities(X).mean(axis=0, dtype=np.float64)
+        return np.column_stack([1.0 - p1, p1])
+
+
+def _auc_rows(scores: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """ROC-AUC of every row of ``scores`` (Mann-Whitney U with average ranks for ties)."""
+    from scipy.stats import rankdata  # only the pruning step needs scipy; serving does not
+
+    pos = y == 1
+    n_pos, n_neg = pos.sum(), (~pos).sum()
+    ranks = rankdata(scores, axis=1)
+    return (ranks[:, pos].sum(axis=1) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def select_trees(
+    tree_probs: np.ndarray,
+    y: np.ndarray,
+    auc_tol: float,
+    max_mean_dp: float,
+    max_trees: Optional[int] = None,
+):
+    """
+    Greedy forward selection: repeatedly add the tree that maximises the
+    validation AUC of the averaged sub-forest, until it reaches the full
+    forest's AUC minus ``auc_tol`` with a mean absolute probability difference
+    to the full forest of at most ``max_mean_dp`` (AUC alone only constrains
+    the ranking, not the probabilities that are served).
+    Returns (tree positions, sub-forest AUC).
+    """
+    y = np.asarray(y)
+    full_p = tree_probs.mean(axis=0)
+    full_auc = float(_auc_rows(full_p[None, :], y)[0])
+    target = full_auc - auc_tol
+    remaining = np.arange(len(tree_probs))
+    total = np.zeros(tree_probs.shape[1])
+    chosen, auc = [], 0.0
+    while len(remaining) and (max_trees is None or len(chosen) < max_trees):
+        aucs = _auc_rows((total + tree_probs[remaining]) / (len(chosen) + 1), y)
+        best = int(np.argmax(aucs))
+        chosen.append(int(remaining[best]))
+        total += tree_probs[remaining[best]]
+        auc = float(aucs[best])
+        remaining = np.delete(remaining, best)
+        if auc >= target and np.abs(total / len(chosen) - full_p).mean() <= max_mean_dp:
+            break
+    return sorted(chosen), auc
+
+
+def _validation_set(model, args):
+    """Validation matrix (in the model's feature order) and labels."""
+    features = [str(f) for f in model.feature_names_in_]
+    if args.processed_dir:
+        from feature_store import load_combined
+
+        bases = [b.strip().upper() for b in args.base_names.split(",") if b.strip()]
+        train, valid, _ = load_combined(args.processed_dir, bases)
+        valid = valid.reindex(columns=features + ["label"])
+        X = valid[features].fillna(train.reindex(columns=features).median())
+        return X.to_numpy(dtype=np.float32), valid["label"].to_numpy()
+    import modelo
+
+    _, _, X_test, y_test, *_ = modelo.load_splits()
+    return X_test[features].to_numpy(dtype=np.float32), y_test.to_numpy()
+
+
+def _best_load_time(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prune and quantise a random forest into a compact .npz artifact.")
+    parser.add_argument("--model", type=str, default="models/rf_model.pkl", help="Fitted forest (joblib pickle).")
+    parser.add_argument("--out", type=str, default=None, help="Output .npz (default: next to --model).")
+    parser.add_argument("--auc_tol", type=float, default=0.002, help="Allowed validation AUC loss from pruning (default: 0.002).")
+    parser.add_argument("--max_mean_dp", type=float, default=0.01, help="Allowed mean |probability change| (default: 0.01).")
+    parser.add_argument("--max_trees", type=int, default=None, help="Upper bound on the number of trees kept.")
+    parser.add_argument("--leaf_dtype", choices=["float16", "float32"], default="float16", help="Leaf probability dtype.")
+    parser.add_argument("--processed_dir", type=str, default=None, help="Feature-store directory for train_multi_rf.py models.")
+    parser.add_argument("--base_names", type=str, default=None, help="Bases of the validation split (with --processed_dir).")
+    args = parser.parse_args()
+    if args.processed_dir and not args.base_names:
+        parser.error("--processed_dir requires --base_names")
+
+    import joblib
+    import warnings
+    from sklearn.metrics import roc_auc_score
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    t_pkl = _best_load_time(lambda: joblib.load(args.model))
+    forest = joblib.load(args.model)
+    X_val, y_val = _validation_set(forest, args)
+
+    # select on one half of the validation rows, report on the other
+    half = np.random.default_rng(42).permutation(len(y_val))
+    sel, rep = half[: len(half) // 2], half[len(half) // 2:]
+    full = CompactForest.from_sklearn(forest, leaf_dtype=np.float64)
+    trees, _ = select_trees(full.tree_probabilities(X_val[sel]), y_val[sel], args.auc_tol, args.max_mean_dp, args.max_trees)
+    compact = CompactForest.from_sklearn(forest, trees=trees, leaf_dtype=np.dtype(args.leaf_dtype))
+
+    out = args.out or os.path.splitext(args.model)[0] + ".npz"
+    compact.save(out)
+    # train_multi_rf.py models keep serving raw rows through their preprocessor sidecar
+    sidecar = os.path.splitext(args.model)[0] + ".preprocess.json"
+    sidecar_out = os.path.splitext(out)[0] + ".preprocess.json"
+    if os.path.exists(sidecar) and os.path.abspath(sidecar) != os.path.abspath(sidecar_out):
+        shutil.copyfile(sidecar, sidecar_out)
+
+    t_npz = _best_load_time(lambda: CompactForest.load(out))
+    loaded = CompactForest.load(out)
+    p_full = forest.predict_proba(X_val[rep])[:, 1]
+    p_compact = loaded.predict_proba(X_val[rep])[:, 1]
+    auc_full, auc_compact = roc_auc_score(y_val[rep], p_full), roc_auc_score(y_val[rep], p_compact)
+    size_pkl, size_npz = os.path.getsize(args.model), os.path.getsize(out)
+
+    print(f"[OK] Compact forest saved to: {out}")
+    print(f"  trees      {len(forest.estimators_):>10} -> {loaded.n_trees:<10}")
+    print(f"  size       {size_pkl / 1024:>9.1f}K -> {size_npz / 1024:.1f}K ({size_npz / size_pkl:.1%})")
+    print(f"  load time  {t_pkl * 1000:>8.1f}ms -> {t_npz * 1000:.2f}ms")
+    print(f"  val AUC    {auc_full:>10.4f} -> {auc_compact:.4f} (delta {auc_compact - auc_full:+.4f})")
+    dp = np.abs(p_compact - p_full)
+    print(f"  |dp|       mean {dp.mean():.4f}, max {dp.max():.4f}")
+    print(f"  (deltas on {len(rep)} held-out validation rows; trees selected on the other {len(sel)})")
+
+
+if __name__ == "__main__":
+    main()
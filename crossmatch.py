@@ -0,0 +1,330 @@
+"""
+Cross-mission duplicate detection on the sky.
+
+The same star (and often the same planet) is listed by more than one mission:
+TESS re-observed the Kepler field and most of the K2 campaigns, so a KOI or a
+K2 object can come back as a TOI.  ``ExoPreprocessor`` drops ``ra``/``dec`` as
+identifier columns, so ``train_multi_rf.py`` concatenated the bases with those
+duplicates in place: a planet could sit in train under one mission and in
+valid under another, and a candidate could be ranked twice.
+
+``tratamentoD.py`` now keeps the sky position, orbital period, planet radius
+and identifier of every row it writes (``<BASE>_sky.npz``, aligned with the
+feature store splits; the preprocessor drops all of them from the features)
+and, after processing, cross-matches all its bases:
+
+    1. RA/Dec become 3-D unit vectors in a KD-tree; a radius query with the
+       chord of ``radius_arcsec`` finds every pair of rows closer than that on
+       the sky (O(n log n) plus the pairs found; no all-pairs distances).
+       Only pairs from different bases count by default: inside one base
+       the rows were already split into train/valid by the preprocessor, and
+       K2 lists many planets once per reference, so matching within a base
+       would empty its validation split.  ``cross_only=False`` matches them
+       too.
+    2. Pairs whose periods differ by more than ``period_rtol`` are discarded,
+       so the planets of one multi-planet system stay apart.  Rows without a
+       position or a period are never matched.
+    3. A union-find over the remaining pairs gives the duplicate groups.
+
+The groups go to ``processed/dedup_map.json``, members ordered by preference:
+labelled rows (train, valid) before candidates, then base order, then row.
+``drop_duplicates`` keeps the first member of each group among the selected
+bases and drops the others (with ``cross_only``, only those of other bases);
+kept candidates carry the other members in an ``also_in`` column, stored in
+the leaderboard.  ``attach_row_info`` gives the candidates their raw radius and
+identifier back for the leaderboard.
+
+Usage:
+    from crossmatch import build_dedup_map, drop_duplicates, load_dedup_map
+
+    dedup = build_dedup_map("processed", ["KOIFULL", "K2FULL", "TOIFULL"])
+    train, valid, cands, dropped = drop_duplicates(load_dedup_map("processed"), bases, train, valid, cands)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feature_store import SPLITS
+
+DEDUP_MAP = "dedup_map.json"
+DEDUP_MAP_VERSION = 1
+# bumped when the fields of <BASE>_sky.npz change (older files are rebuilt)
+SKY_VERSION = 2
+
+DEFAULT_RADIUS_ARCSEC = 3.0
+DEFAULT_PERIOD_RTOL = 0.01
+
+# exact (case-insensitive) names only: "ra" must not pick up koi_prad or rastr
+RA_CANDS: List[str] = ["ra", "ra_deg", "radeg"]
+DEC_CANDS: List[str] = ["dec", "dec_deg", "decdeg"]
+PERIOD_CANDS: List[str] = ["koi_period", "pl_orbper", "period", "orbital_period"]
+RADIUS_CANDS: List[str] = ["koi_prad", "pl_rade", "planet_radius_re", "planet_radius"]
+# identifiers tried when the preprocessor found none (e.g. K2 exports keyed by pl_name)
+ID_CANDS: List[str] = ["kepoi_name", "pl_name", "toi", "epic_candname", "tic_id", "epic", "kepid", "tid"]
+
+SKY_FIELDS: Tuple[str, ...] = ("ra", "dec", "period", "planet_radius_re")
+FIELD_CANDS = dict(zip(SKY_FIELDS, (RA_CANDS, DEC_CANDS, PERIOD_CANDS, RADIUS_CANDS)))
+
+
+def _column(df: pd.DataFrame, names) -> Optional[str]:
+    cols = {str(c).lower().strip(): c for c in df.columns}
+    for n in names:
+        if n in cols:
+            return cols[n]
+    return None
+
+
+def sky_frame(raw: pd.DataFrame, rows, id_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    ``ra``/``dec`` (degrees), ``period`` (days), ``planet_radius_re`` (Earth
+    radii) and ``object_id`` of the rows of ``raw`` labelled ``rows``, in that
+    order (NaN / "" where unavailable).  ``id_col`` defaults to the first of
+    ``ID_CANDS`` present.
+    """
+    out = pd.DataFrame(index=pd.RangeIndex(len(rows)))
+    for field, names in FIELD_CANDS.items():
+        col = _column(raw, names)
+        if col is None:
+            out[field] = np.nan
+        else:
+            values = pd.to_numeric(raw[col], errors="coerce").loc[rows]
+            out[field] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    if id_col is None or id_col not in raw.columns:
+        id_col = _column(raw, ID_CANDS)
+    if id_col is not None:
+        ids = raw[id_col].loc[rows]
+        out["object_id"] = np.where(ids.isna(), "", ids.astype(str))
+    else:
+        out["object_id"] = ""
+    return out
+
+
+def _sky_path(out_dir, base: str) -> Path:
+    return Path(out_dir) / f"{base.upper()}_sky.npz"
+
+
+def write_sky(out_dir, base: str, frames: Dict[str, pd.DataFrame]) -> None:
+    """Store the ``sky_frame`` of each split of ``base`` (no pickled objects)."""
+    arrays = {}
+    for split in SPLITS:
+        df = frames[split]
+        for field in SKY_FIELDS:
+            arrays[f"{split}_{field}"] = df[field].to_numpy(dtype=np.float64)
+        arrays[f"{split}_ids"] = df["object_id"].to_numpy().astype(str)
+    np.savez(_sky_path(out_dir, base), version=np.int64(SKY_VERSION), **arrays)
+
+
+def has_sky(out_dir, base: str) -> bool:
+    """True if ``base`` has a sky file with the current fields."""
+    path = _sky_path(out_dir, base)
+    if not path.exists():
+        return False
+    with np.load(path) as z:
+        return "version" in z.files and int(z["version"]) == SKY_VERSION
+
+
+def read_sky(out_dir, base: str) -> Dict[str, pd.DataFrame]:
+    with np.load(_sky_path(out_dir, base)) as z:
+        return {
+            split: pd.DataFrame({**{f: z[f"{split}_{f}"] for f in SKY_FIELDS}, "object_id": z[f"{split}_ids"]})
+            for split in SPLITS
+        }
+
+
+def attach_row_info(out_dir, bases, cands: pd.DataFrame) -> pd.DataFrame:
+    """
+    Raw ``planet_radius_re`` and ``object_id`` (where the store has none) of
+    the combined candidates of ``bases``, taken from their sky files.  The
+    candidates must still be in stored order (before ``drop_duplicates``).
+    """
+    info = pd.concat([read_sky(out_dir, b)["candidates"] for b in bases], ignore_index=True)
+    if len(info) != len(cands):
+        raise ValueError(f"Sky files hold {len(info)} candidates, the feature store {len(cands)}; rerun tratamentoD.py.")
+    cands = cands.copy()
+    cands["planet_radius_re"] = info["planet_radius_re"].to_numpy()
+    ids = info["object_id"].where(info["object_id"] != "").to_numpy(dtype=object)
+    if "object_id" in cands.columns:
+        ids = np.where(cands["object_id"].isna().to_numpy(), ids, cands["object_id"].to_numpy(dtype=object))
+    cands["object_id"] = ids
+    return cands
+
+
+# ========= matching =========
+def unit_vectors(ra_deg, dec_deg) -> np.ndarray:
+    ra, dec = np.radians(ra_deg), np.radians(dec_deg)
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def match_pairs(ra, dec, period, radius_arcsec: float = DEFAULT_RADIUS_ARCSEC,
+                period_rtol: float = DEFAULT_PERIOD_RTOL, groups=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``(i, j)`` with ``i < j``: rows within ``radius_arcsec`` on the sky whose
+    periods agree within ``period_rtol``; with ``groups`` (the base of each
+    row), only pairs of different groups.
+    """
+    from scipy.spatial import cKDTree   # installed with scikit-learn
+
+    ra, dec, period = (np.asarray(a, dtype=np.float64) for a in (ra, dec, period))
+    ok = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec) & np.isfinite(period) & (period > 0))
+    if len(ok) < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    chord = 2.0 * np.sin(np.radians(radius_arcsec / 3600.0) / 2.0)
+    pairs = cKDTree(unit_vectors(ra[ok], dec[ok])).query_pairs(chord, output_type="ndarray")
+    i, j = np.sort(ok[pairs], axis=1).T
+    if groups is not None:
+        groups = np.asarray(groups)
+        keep = groups[i] != groups[j]
+        i, j = i[keep], j[keep]
+    p_i, p_j = period[i], period[j]
+    keep = np.abs(p_i - p_j) <= period_rtol * np.maximum(p_i, p_j)
+    return i[keep], j[keep]
+
+
+def union_find(n: int, i, j) -> np.ndarray:
+    """Connected component (smallest member) of each of ``n`` items, given the edges ``(i, j)``."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(np.asarray(i).tolist(), np.asarray(j).tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(x) for x in range(n)], dtype=np.intp)
+
+
+# ========= dedup map =========
+def build_dedup_map(out_dir, bases, radius_arcsec: float = DEFAULT_RADIUS_ARCSEC,
+                    period_rtol: float = DEFAULT_PERIOD_RTOL, cross_only: bool = True,
+                    inputs: Optional[dict] = None) -> dict:
+    """
+    Cross-match the sky files of ``bases`` in ``out_dir`` and write
+    ``dedup_map.json``; ``cross_only=False`` also matches rows of the same base.
+    Bases without a sky file are left out.  ``inputs``
+    (base -> build fingerprint) is stored so readers can tell whether the map
+    still matches the splits.  Returns the map.
+    """
+    out_dir = Path(out_dir)
+    bases = [b.upper() for b in bases if has_sky(out_dir, b)]
+    parts = []
+    for b in bases:
+        for split, df in read_sky(out_dir, b).items():
+            parts.append(df.assign(base=b, split=split, row=np.arange(len(df))))
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=[*SKY_FIELDS, "object_id", "base", "split", "row"])
+
+    i, j = match_pairs(rows["ra"], rows["dec"], rows["period"], radius_arcsec, period_rtol,
+                       groups=rows["base"].to_numpy() if cross_only else None)
+    root = union_find(len(rows), i, j)
+    sizes = np.bincount(root, minlength=len(rows))
+    dup = rows.loc[sizes[root] > 1].assign(
+        root=root[sizes[root] > 1],
+        # labelled rows first, then base/split/row order (= position in ``rows``)
+        candidate=lambda d: d["split"] == "candidates",
+    )
+    dup = dup.assign(pos=dup.index).sort_values(["root", "candidate", "pos"], kind="mergesort")
+    groups = [
+        [[m.base, m.split, int(m.row), m.object_id] for m in g.itertuples(index=False)]
+        for _, g in dup.groupby("root", sort=True)
+    ]
+
+    params = {"bases": bases, "radius_arcsec": radius_arcsec, "period_rtol": period_rtol, "cross_only": cross_only,
+              "inputs": {b: (inputs or {}).get(b) for b in bases}}
+    dedup = {
+        "version": DEDUP_MAP_VERSION,
+        **params,
+        "fingerprint": hashlib.sha256(json.dumps([params, groups], sort_keys=True).encode()).hexdigest(),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "n_rows": len(rows),
+        "n_groups": len(groups),
+        "n_duplicates": sum(len(split_group(g, cross_only)[1]) for g in groups),
+        "n_dropped": dropped_counts(groups, bases, cross_only),
+        "groups": groups,
+    }
+    tmp = out_dir / (DEDUP_MAP + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dedup, f, ensure_ascii=False)
+    tmp.replace(out_dir / DEDUP_MAP)
+    return dedup
+
+
+def split_group(members, cross_only: bool):
+    """
+    (kept, dropped) members of one duplicate group.  The first member is kept;
+    with ``cross_only`` so are the other members of its base, which reach the
+    group only through a shared match in another base (a planet listed twice
+    by K2 and once by TESS) and were not matched with each other.
+    """
+    if not cross_only:
+        return members[:1], members[1:]
+    keep_base = members[0][0]
+    return [m for m in members if m[0] == keep_base], [m for m in members if m[0] != keep_base]
+
+
+def dropped_counts(groups, bases, cross_only: bool) -> dict:
+    """Rows ``drop_duplicates`` would drop with every base selected: base -> split -> count."""
+    counts = {b: dict.fromkeys(SPLITS, 0) for b in bases}
+    for members in groups:
+        for base, split, _, _ in split_group(members, cross_only)[1]:
+            counts[base][split] += 1
+    return counts
+
+
+def load_dedup_map(out_dir) -> Optional[dict]:
+    """Contents of ``dedup_map.json`` (None when the directory has none)."""
+    path = Path(out_dir) / DEDUP_MAP
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        dedup = json.load(f)
+    if dedup.get("version", 0) > DEDUP_MAP_VERSION:
+        raise ValueError(f"{path} uses dedup map v{dedup['version']}; this code reads up to v{DEDUP_MAP_VERSION}.")
+    return dedup
+
+
+def drop_duplicates(dedup: dict, bases, train: pd.DataFrame, valid: pd.DataFrame, cands: pd.DataFrame):
+    """
+    Keep one row per duplicate group among the selected ``bases``.
+
+    The frames are the combined splits of ``feature_store.load_combined`` (or
+    the concatenated CSV splits): each base's rows in stored order, tagged by
+    ``mission``.  Kept candidates get an ``also_in`` column naming the other
+    members of their group (``BASE:object_id``).  Returns the filtered frames
+    and the number of rows dropped per split.
+    """
+    selected = {b.upper() for b in bases}
+    drop = {split: set() for split in SPLITS}
+    also_in = {}
+    for members in dedup["groups"]:
+        present = [m for m in members if m[0] in selected]
+        if not present:
+            continue
+        kept, dropped_members = split_group(present, dedup.get("cross_only", False))
+        for base, split, row, _ in dropped_members:
+            drop[split].add((base, row))
+        for base, split, row, _ in kept:
+            if split == "candidates":
+                also_in[(base, row)] = ";".join(
+                    f"{b}:{oid or f'{s}#{r}'}" for b, s, r, oid in members if (b, s, r) != (base, split, row)
+                )
+
+    out, dropped = [], {}
+    for split, df in zip(SPLITS, (train, valid, cands)):
+        keys = list(zip(df["mission"], df.groupby("mission", sort=False).cumcount()))
+        keep = np.array([k not in drop[split] for k in keys], dtype=bool)
+        dropped[split] = int((~keep).sum())
+        if split == "candidates":
+            df = df.assign(also_in=[also_in.get(k) for k in keys])
+        out.append(df.loc[keep].reset_index(drop=True))
+    return out[0], out[1], out[2], dropped
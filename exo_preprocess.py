@@ -26,6 +26,7 @@ See README in repository for more details.
 
 from __future__ import annotations
 
+import json
 import pandas as pd
 import numpy as np
 from typing import List, Optional, Tuple
@@ -233,7 +234,7 @@ class ExoPreprocessor:
 
         # convert object columns to numeric
         for c in df_use.columns:
-            if df_use[c].dtype == "object":
+            if pd.api.types.is_string_dtype(df_use[c].dtype):
                 df_use[c] = self._as_num(df_use[c])
 
         # drop columns with too many NaNs
@@ -244,7 +245,7 @@ class ExoPreprocessor:
         # drop columns with almost zero variance
         var = df_use.var(numeric_only=True)
         const = var.fillna(0.0).abs() <= self.low_var_eps
-        df_use = df_use.loc[:, ~const.reindex(df_use.columns).fillna(False)]
+        df_use = df_use.loc[:, ~const.reindex(df_use.columns).fillna(False).astype(bool)]
 
         # record columns to retain
         self.kept_columns_ = list(df_use.columns)
@@ -263,23 +264,50 @@ class ExoPreprocessor:
 
         return self
 
+    @classmethod
+    def _int_like_values(cls, s: pd.Series) -> np.ndarray:
+        """
+        ``_as_num(s)`` as a float64 array.  Plain numeric columns skip the text
+        round trip: finite values survive it unchanged and ``inf`` becomes NaN.
+        """
+        if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            v = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            return np.where(np.isinf(v), np.nan, v)
+        return cls._as_num(s).to_numpy(dtype=np.float64, na_value=np.nan)
+
     def _apply_imputation(self, df_num: pd.DataFrame) -> pd.DataFrame:
         """
         Apply the learned imputation strategy to a numeric DataFrame.
+
+        Float columns are imputed as one contiguous block with ``np.where`` and
+        written back in a single assignment; integer-like columns get their
+        median fill and rounding as one vectorised step.
         """
         X = df_num.copy()
         # impute integer-like columns with median and round
-        for c, med in (self.medians_int_ or {}).items():
-            if c in X.columns:
-                tmp = self._as_num(X[c])
-                tmp = tmp.fillna(med)
-                X[c] = np.floor(tmp + 0.5)
-
-        # impute remaining numeric columns with mean
-        for c in X.columns:
-            if pd.api.types.is_numeric_dtype(X[c]):
-                mean = self.means_.get(c, np.nan)
-                X[c] = X[c].fillna(mean)
+        int_cols = [c for c in (self.medians_int_ or {}) if c in X.columns]
+        if int_cols:
+            vals = np.column_stack([self._int_like_values(X[c]) for c in int_cols])
+            meds = np.array([self.medians_int_[c] for c in int_cols], dtype=np.float64)
+            X[int_cols] = np.floor(np.where(np.isnan(vals), meds, vals) + 0.5)
+
+        # impute remaining numeric columns with mean: float64 columns as one block,
+        # other numeric dtypes (ints, bools, nullable) only if they hold missing values
+        dtypes = X.dtypes
+        flt = [c for c in X.columns if dtypes[c] == np.float64]
+        if flt:
+            vals = X[flt].to_numpy()
+            missing = np.isnan(vals)
+            if missing.any():
+                means = np.array([self.means_.get(c, np.nan) for c in flt], dtype=np.float64)
+                X[flt] = np.where(missing, means, vals)
+        rest = {
+            c: self.means_.get(c, np.nan)
+            for c in X.columns
+            if dtypes[c] != np.float64 and pd.api.types.is_numeric_dtype(dtypes[c]) and X[c].hasnans
+        }
+        if rest:
+            X = X.fillna(rest)
 
         return X
 
@@ -309,7 +337,7 @@ class ExoPreprocessor:
 
         # convert object columns to numeric
         for c in df.columns:
-            if df[c].dtype == "object":
+            if pd.api.types.is_string_dtype(df[c].dtype):
                 df[c] = self._as_num(df[c])
 
         # retain only the fitted columns
@@ -326,6 +354,93 @@ class ExoPreprocessor:
 
         return X_all, y_all, ids
 
+    # ---- serving: compact state + fast transform ----
+    def to_dict(self) -> dict:
+        """Fitted state as plain JSON types (NaN statistics become ``None``)."""
+        if self.kept_columns_ is None or self.means_ is None:
+            raise RuntimeError("fit() must be called before to_dict().")
+
+        def _num(v):
+            v = float(v)
+            return None if np.isnan(v) else v
+
+        return {
+            "version": 1,
+            "params": {
+                "null_pct_cut": self.null_pct_cut,
+                "low_var_eps": self.low_var_eps,
+                "test_size": self.test_size,
+                "random_state": self.random_state,
+            },
+            "mission": self.mission_,
+            "id_col_for_candidates": self.id_col_for_candidates_,
+            "kept_columns": list(self.kept_columns_),
+            "means": {c: _num(v) for c, v in self.means_.items()},
+            "medians_int": {c: _num(v) for c, v in (self.medians_int_ or {}).items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "ExoPreprocessor":
+        """Rebuild a fitted preprocessor from ``to_dict`` output (no refit)."""
+        pre = cls(**state["params"])
+        pre.mission_ = state.get("mission")
+        pre.id_col_for_candidates_ = state.get("id_col_for_candidates")
+        pre.kept_columns_ = list(state["kept_columns"])
+        nan = lambda v: np.nan if v is None else v
+        pre.means_ = {c: nan(v) for c, v in state["means"].items()}
+        pre.medians_int_ = {c: nan(v) for c, v in state.get("medians_int", {}).items()}
+        return pre
+
+    def save_json(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load_json(cls, path) -> "ExoPreprocessor":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def _index_map(self, columns) -> list:
+        """Input column feeding each kept column (None if absent); O(columns), cheap next to parsing."""
+        stripped = {}
+        for c in columns:
+            stripped.setdefault(str(c).strip(), c)
+        return [stripped.get(c) for c in self.kept_columns_]
+
+    def transform_matrix(self, df_raw: pd.DataFrame) -> np.ndarray:
+        """
+        Fast ``transform`` for serving: the imputed kept columns as one float64
+        matrix (same values as ``transform(df_raw)[0]``).
+
+        Only the kept columns are touched (text ones go through ``_as_num``),
+        column lookup uses a per-header cache and imputation is one vectorised
+        pass with the stored means/medians; no statistics are computed per batch.
+        """
+        if self.kept_columns_ is None or self.means_ is None:
+            raise RuntimeError("fit() must be called before transform_matrix().")
+        cols = self._index_map(df_raw.columns)
+        int_like = self.medians_int_ or {}
+        X = np.full((len(df_raw), len(cols)), np.nan, dtype=np.float64)
+        for j, col in enumerate(cols):
+            if col is None:
+                continue
+            s = df_raw[col]
+            if pd.api.types.is_string_dtype(s.dtype):
+                s = self._as_num(s)
+            if self.kept_columns_[j] in int_like:
+                X[:, j] = self._int_like_values(s)
+            else:
+                X[:, j] = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+        # integer-like columns: median fill, then rounding (as in _apply_imputation)
+        for c, med in int_like.items():
+            if c in self.kept_columns_:
+                j = self.kept_columns_.index(c)
+                X[:, j] = np.floor(np.where(np.isnan(X[:, j]), med, X[:, j]) + 0.5)
+
+        means = np.array([self.means_.get(c, np.nan) for c in self.kept_columns_], dtype=np.float64)
+        return np.where(np.isnan(X), means, X)
+
     def fit_and_split(
         self, df_raw: pd.DataFrame
     ) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series, pd.DataFrame]:
@@ -336,6 +451,9 @@ class ExoPreprocessor:
             X_train, y_train: binary-labelled training data (0/1)
             X_valid, y_valid: holdout validation data (0/1)
             candidates: DataFrame of candidate (label=2) objects
+
+        Every frame keeps the row labels of ``df_raw``, so columns dropped
+        here (e.g. ``ra``/``dec``) can be joined back to the splits.
         """
         self.fit(df_raw)
         X_all, y_all, ids = self.transform(df_raw)
@@ -361,8 +479,9 @@ class ExoPreprocessor:
         if ids is not None:
             candidates_df = pd.DataFrame(
                 {
-                    "object_id": ids.loc[cand_mask].reset_index(drop=True)
-                }
+                    "object_id": ids.loc[cand_mask].to_numpy()
+                },
+                index=X_cand.index,
             )
             for c in X_cand.columns:
                 candidates_df[c] = X_cand[c].values
@@ -0,0 +1,182 @@
+"""
+Typed feature store for the preprocessed catalogues.
+
+``tratamentoD.py`` used to hand its splits to ``train_multi_rf.py`` as CSV
+text, which every training run parsed again and re-aligned with
+``pd.concat(sort=False)``.  The store keeps the same splits as binary NumPy
+blocks instead:
+
+    processed/
+        feature_store.json            schema: union of feature columns + per-base info
+        <BASE>_train_X.npy            float64 (n_rows x n_union), NaN where the base lacks a column
+        <BASE>_train_y.npy            int64 labels
+        <BASE>_valid_X.npy / _y.npy
+        <BASE>_candidates_X.npy
+        <BASE>_candidates_ids.npy     object identifiers as text ("" = missing)
+
+Every block is laid out on the union of columns of all bases written to the
+directory, so the alignment happens once, when a base is written (existing
+blocks are widened if a new base brings new columns).  Readers memory-map
+the blocks (``np.load(mmap_mode="r")``) and only select columns.
+
+Usage:
+    from feature_store import write_base, has_bases, load_combined
+
+    write_base("processed", "KOIFULL", train_df, valid_df, cands_df)
+    if has_bases("processed", ["KOIFULL", "K2FULL"]):
+        train, valid, cands = load_combined("processed", ["KOIFULL", "K2FULL"])
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+STORE_META = "feature_store.json"
+SPLITS: Tuple[str, ...] = ("train", "valid", "candidates")
+# columns stored next to the features, never used as model inputs
+NON_FEATURE_COLS = ("label", "object_id", "mission")
+
+
+def _block_path(out_dir: Path, base: str, split: str, kind: str) -> Path:
+    return out_dir / f"{base}_{split}_{kind}.npy"
+
+
+def read_schema(out_dir) -> Optional[dict]:
+    """Contents of ``feature_store.json`` (None when the directory has no store)."""
+    path = Path(out_dir) / STORE_META
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_schema(out_dir: Path, schema: dict) -> None:
+    tmp = out_dir / (STORE_META + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out_dir / STORE_META)
+
+
+def _aligned(values: np.ndarray, own_cols: List[str], union: List[str]) -> np.ndarray:
+    """Place the columns ``own_cols`` of ``values`` at their positions in ``union`` (NaN elsewhere)."""
+    pos = {c: i for i, c in enumerate(union)}
+    out = np.full((values.shape[0], len(union)), np.nan, dtype=np.float64)
+    out[:, [pos[c] for c in own_cols]] = values
+    return out
+
+
+def _widen_existing(out_dir: Path, schema: dict, new_union: List[str], skip: str) -> None:
+    """Rewrite the blocks of the other bases on the wider column union."""
+    old_union = schema["columns"]
+    for base in schema["bases"]:
+        if base == skip:
+            continue
+        for split in SPLITS:
+            path = _block_path(out_dir, base, split, "X")
+            X = np.load(path)
+            np.save(path, _aligned(X, old_union, new_union))
+
+
+def write_base(out_dir, base: str, train_df: pd.DataFrame, valid_df: pd.DataFrame, cands_df: pd.DataFrame) -> dict:
+    """
+    Write the three splits of ``base`` to the store in ``out_dir``.
+
+    ``train_df``/``valid_df`` hold the feature columns plus ``label``;
+    ``cands_df`` holds the feature columns and, optionally, ``object_id``.
+    Returns the updated schema.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = base.upper()
+    own_cols = [c for c in train_df.columns if c not in NON_FEATURE_COLS]
+
+    schema = read_schema(out_dir) or {"version": 1, "columns": [], "bases": {}}
+    union = list(schema["columns"])
+    new_cols = [c for c in own_cols if c not in union]
+    if new_cols:
+        union += new_cols
+        _widen_existing(out_dir, schema, union, skip=base)
+        schema["columns"] = union
+
+    rows = {}
+    for split, df in zip(SPLITS, (train_df, valid_df, cands_df)):
+        X = df.reindex(columns=own_cols).to_numpy(dtype=np.float64, na_value=np.nan)
+        np.save(_block_path(out_dir, base, split, "X"), _aligned(X, own_cols, union))
+        if split != "candidates":
+            np.save(_block_path(out_dir, base, split, "y"), df["label"].to_numpy(dtype=np.int64))
+        rows[split] = len(df)
+
+    ids_path = _block_path(out_dir, base, "candidates", "ids")
+    has_ids = "object_id" in cands_df.columns
+    if has_ids:
+        ids = cands_df["object_id"]
+        np.save(ids_path, np.where(ids.isna(), "", ids.astype(str)).astype(str))
+    elif ids_path.exists():
+        ids_path.unlink()
+
+    schema["bases"][base] = {"columns": own_cols, "rows": rows, "has_ids": has_ids}
+    _write_schema(out_dir, schema)
+    return schema
+
+
+def has_bases(out_dir, bases) -> bool:
+    """True if every base in ``bases`` has been written to the store in ``out_dir``."""
+    schema = read_schema(out_dir)
+    return schema is not None and all(b.upper() in schema["bases"] for b in bases)
+
+
+def selected_columns(schema: dict, bases) -> List[str]:
+    """
+    Feature columns of the selected bases, in first-appearance order (the
+    column order ``pd.concat(sort=False)`` of their CSV splits would give).
+    """
+    cols: List[str] = []
+    seen = set()
+    for b in bases:
+        for c in schema["bases"][b.upper()]["columns"]:
+            if c not in seen:
+                seen.add(c)
+                cols.append(c)
+    return cols
+
+
+def load_combined(out_dir, bases, mmap_mode: Optional[str] = "r"):
+    """
+    Combined train/valid/candidate frames of ``bases`` read from the store.
+
+    Blocks are memory-mapped and only the columns of the selected bases are
+    gathered, so nothing is parsed.  The frames match what concatenating the
+    CSV splits gave: feature columns, ``label`` (train/valid), ``object_id``
+    (candidates, when available) and ``mission``.
+    """
+    out_dir = Path(out_dir)
+    schema = read_schema(out_dir)
+    bases = [b.upper() for b in bases]
+    feature_cols = selected_columns(schema, bases)
+    pos = {c: i for i, c in enumerate(schema["columns"])}
+    idx = np.array([pos[c] for c in feature_cols], dtype=np.intp)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for split in SPLITS:
+        blocks = [np.load(_block_path(out_dir, b, split, "X"), mmap_mode=mmap_mode)[:, idx] for b in bases]
+        df = pd.DataFrame(np.concatenate(blocks) if len(blocks) > 1 else blocks[0], columns=feature_cols)
+        if split != "candidates":
+            df["label"] = np.concatenate([np.load(_block_path(out_dir, b, split, "y")) for b in bases])
+        elif any(schema["bases"][b]["has_ids"] for b in bases):
+            ids = []
+            for b, blk in zip(bases, blocks):
+                if schema["bases"][b]["has_ids"]:
+                    raw = np.load(_block_path(out_dir, b, split, "ids"))
+                    ids.append(np.where(raw == "", None, raw.astype(object)))
+                else:
+                    ids.append(np.full(len(blk), None, dtype=object))
+            df.insert(0, "object_id", np.concatenate(ids))
+        df["mission"] = np.repeat(bases, [len(blk) for blk in blocks])
+        frames[split] = df
+    return frames["train"], frames["valid"], frames["candidates"]
@@ -0,0 +1,193 @@
+"""
+Persisted candidate leaderboard.
+
+``train_multi_rf.py`` scores every candidate object (label = 2) of the selected
+bases.  Instead of only printing the top 10, the ranking is written to a small
+SQLite database, sorted by probability and indexed on mission, probability and
+planet radius.  The backend serves paginated, filtered queries straight from
+this file without running the forest.
+
+Candidates listed by several missions are ranked once (``train_multi_rf.py``
+drops the other listings using ``crossmatch.py``'s dedup map); the other
+listings are kept in ``also_in`` (``"K2FULL:EPIC 2017...;TOIFULL:1234.01"``).
+
+Usage:
+    from leaderboard import build_leaderboard, query_leaderboard
+
+    build_leaderboard(combined_cand, "artifacts/leaderboard.sqlite", model_name="rf_KOIFULL_...pkl")
+    page = query_leaderboard("artifacts/leaderboard.sqlite", mission="K2FULL", p_min=0.9)
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+# planet radius column names across missions (standardised, KOI, K2/TOI)
+RADIUS_CANDS: List[str] = ["planet_radius_re", "koi_prad", "pl_rade", "planet_radius"]
+
+MAX_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE candidates (
+    rank             INTEGER PRIMARY KEY,
+    object_id        TEXT,
+    mission          TEXT,
+    probability      REAL NOT NULL,
+    planet_radius_re REAL,
+    also_in          TEXT
+);
+CREATE INDEX idx_candidates_prob ON candidates (probability DESC);
+CREATE INDEX idx_candidates_mission_prob ON candidates (mission, probability DESC);
+CREATE INDEX idx_candidates_radius ON candidates (planet_radius_re);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _coalesce_radius(df):
+    """
+    Planet radius per row, taken from the first non-null column in ``RADIUS_CANDS``.
+
+    Multi-mission frames are column unions (``koi_prad`` for KOI rows, ``pl_rade``
+    for K2/TOI rows), so the columns are combined rather than picking just one.
+    """
+    lower = {str(c).lower().strip(): c for c in df.columns}
+    radius = None
+    for name in RADIUS_CANDS:
+        if name in lower:
+            col = df[lower[name]]
+            radius = col if radius is None else radius.combine_first(col)
+    return radius
+
+
+def _as_optional(v):
+    """Convert NaN/None/numpy scalars to plain Python values accepted by sqlite3."""
+    if v is None:
+        return None
+    if hasattr(v, "item"):
+        v = v.item()
+    if isinstance(v, float) and v != v:
+        return None
+    return v
+
+
+def build_leaderboard(cands, db_path, model_name: Optional[str] = None) -> int:
+    """
+    Write the scored candidates to ``db_path`` (rebuilt from scratch).
+
+    ``cands`` must hold a ``probability`` column; ``object_id``, ``mission``,
+    ``also_in`` and a planet radius column (see ``RADIUS_CANDS``) are stored
+    when present.  The file
+    is written to a temporary path and atomically swapped in, so readers never
+    see a half-built leaderboard.  Returns the number of rows written.
+    """
+    if "probability" not in cands.columns:
+        raise ValueError("O DataFrame de candidatos precisa da coluna 'probability'.")
+
+    ranked = cands.sort_values(by="probability", ascending=False, kind="mergesort")
+    radius = _coalesce_radius(ranked)
+    n = len(ranked)
+
+    def col(name):
+        if name in ranked.columns:
+            return ranked[name].tolist()
+        return [None] * n
+
+    rows = zip(
+        range(1, n + 1),
+        (None if v is None else str(v) for v in map(_as_optional, col("object_id"))),
+        (None if v is None else str(v) for v in map(_as_optional, col("mission"))),
+        map(float, ranked["probability"].tolist()),
+        map(_as_optional, radius.tolist() if radius is not None else [None] * n),
+        (v or None for v in map(_as_optional, col("also_in"))),
+    )
+
+    db_path = str(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.executescript(_SCHEMA)
+        con.executemany("INSERT INTO candidates VALUES (?, ?, ?, ?, ?, ?)", rows)
+        con.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("model", model_name or ""),
+                ("built_at", datetime.now().isoformat(timespec="seconds")),
+                ("n_rows", str(n)),
+            ],
+        )
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, db_path)
+    return n
+
+
+def query_leaderboard(
+    db_path,
+    mission: Optional[str] = None,
+    p_min: Optional[float] = None,
+    p_max: Optional[float] = None,
+    r_min: Optional[float] = None,
+    r_max: Optional[float] = None,
+    page: int = 1,
+    page_size: int = 50,
+) -> dict:
+    """
+    Return one page of the leaderboard, best candidates first.
+
+    Filters are optional and combined with AND; ``mission`` is matched
+    case-insensitively against the base name used in training (e.g. ``KOIFULL``).
+    """
+    page = max(int(page), 1)
+    page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+    where, params = [], []
+    if mission:
+        where.append("mission = ?")
+        params.append(mission.strip().upper())
+    if p_min is not None:
+        where.append("probability >= ?")
+        params.append(float(p_min))
+    if p_max is not None:
+        where.append("probability <= ?")
+        params.append(float(p_max))
+    if r_min is not None:
+        where.append("planet_radius_re >= ?")
+        params.append(float(r_min))
+    if r_max is not None:
+        where.append("planet_radius_re <= ?")
+        params.append(float(r_max))
+    clause = (" WHERE " + " AND ".join(where)) if where else ""
+
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        total = con.execute(f"SELECT COUNT(*) FROM candidates{clause}", params).fetchone()[0]
+        # leaderboards built before the cross-mission dedup have no also_in column
+        has_also_in = any(r[1] == "also_in" for r in con.execute("PRAGMA table_info(candidates)"))
+        cur = con.execute(
+            "SELECT rank, object_id, mission, probability, planet_radius_re"
+            + (", also_in " if has_also_in else " ")
+            + f"FROM candidates{clause} ORDER BY rank LIMIT ? OFFSET ?",
+            [*params, page_size, (page - 1) * page_size],
+        )
+        cols = [d[0] for d in cur.description]
+        items = [dict(zip(cols, r)) for r in cur.fetchall()]
+        meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+    finally:
+        con.close()
+
+    return {
+        "model": meta.get("model"),
+        "built_at": meta.get("built_at"),
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "items": items,
+    }
@@ -1,17 +1,21 @@
 # crosstrain20_fixed2.py
 # Treina RF no combinado KOI(80%) + K2(80%) e avalia nos 20% de cada banco.
 # Agora também mostra importâncias de features (Gini e Permutation Importance).
-
+# --engine hgb troca a RF por HistGradientBoosting (mesmas FEATURES, splits e métricas).
+#
+#   python modelo.py                 # RF -> models/rf_model.pkl
+#   python modelo.py --engine hgb    # HGB -> models/hgb_model.pkl
+#   python modelo.py --distill       # + modelo aluno destilado -> models/student.npz (+ student.json)
+#   (todas as execuções também gravam o índice de vizinhos rotulados -> models/neighbors.pkl)
+
+import argparse
 import numpy as np
 import pandas as pd
 import json
 from pathlib import Path
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import (
-    accuracy_score, balanced_accuracy_score, roc_auc_score,
-    f1_score, matthews_corrcoef, confusion_matrix, classification_report
-)
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import roc_auc_score, classification_report
 from sklearn.inspection import permutation_importance
 from sklearn.metrics import make_scorer
 import warnings
@@ -22,6 +26,10 @@ from sklearn.compose import ColumnTransformer
 import joblib
 import os
 
+from compress_forest import CompactForest
+from neighbor_index import NeighborIndex
+from scoring import get_any, read_table, alias_usecols, metrics_block, predict_positive
+
 # ========= config =========
 MODEL_DIR = "models"
 MODEL_NAME = "rf_model.pkl"
@@ -33,42 +41,23 @@ FEATURES = [
 
 MODEL_PATH = os.path.join(MODEL_DIR, MODEL_NAME)
 
-os.makedirs(MODEL_DIR, exist_ok=True)
+# engines de treino: artefato e resumo de métricas de cada um
+ENGINES = {
+    "rf":  {"model": MODEL_NAME,      "summary": "metrics_summary.json"},
+    "hgb": {"model": "hgb_model.pkl", "summary": "metrics_summary_hgb.json"},
+}
 
-# ========= utils =========
-def _to_num(s):
-    s = pd.Series(s, dtype="object").astype(str).str.replace(",", ".", regex=False)
-    return pd.to_numeric(
-        s.str.extract(r"([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)")[0],
-        errors="coerce"
-    )
+# modelo aluno (destilado do modelo treinado) servido no /predict-individual
+STUDENT_NAME = "student.npz"
+STUDENT_INFO = "student.json"
+
+# índice KD-tree dos objetos rotulados (vizinhos mais próximos no /neighbors e /predict)
+NEIGHBORS_NAME = "neighbors.pkl"
 
-def _get_any(df, names, numeric=True, default=np.nan):
-    cols = {c.lower().strip(): c for c in df.columns}
-    for n in names:
-        nlow = n.lower().strip()
-        if nlow in cols:
-            col = df[cols[nlow]]
-            return _to_num(col) if numeric else col
-        for key, orig in cols.items():
-            if key == nlow or key.startswith(nlow) or nlow in key:
-                col = df[orig]
-                return _to_num(col) if numeric else col
-    return pd.Series([default] * len(df))
-
-def metrics_block(y_true, y_pred, y_score):
-    acc = accuracy_score(y_true, y_pred)
-    bal = balanced_accuracy_score(y_true, y_pred)
-    try:
-        auc = roc_auc_score(y_true, y_score)
-    except Exception:
-        auc = float("nan")
-    f1p = f1_score(y_true, y_pred, pos_label=1)
-    f1n = f1_score(y_true, y_pred, pos_label=0)
-    mcc = matthews_corrcoef(y_true, y_pred)
-    cm  = confusion_matrix(y_true, y_pred)
-    return acc, bal, auc, f1p, f1n, mcc, cm
+os.makedirs(MODEL_DIR, exist_ok=True)
 
+# ========= utils =========
+# coerção, resolução de aliases e métricas vêm do núcleo compartilhado (scoring.py)
 def print_report(header, y_true, y_score, thr=0.5):
     y_pred = (y_score >= thr).astype(int)
     acc, bal, auc, f1p, f1n, mcc, cm = metrics_block(y_true, y_pred, y_score)
@@ -77,51 +66,71 @@ def print_report(header, y_true, y_score, thr=0.5):
     print(cm)
 
 # ========= loaders =========
-def load_std_koi():
-    p = DATA_DIR/"KOI.xlsx"; q = DATA_DIR/"clean_KOI.csv"
-    df = pd.read_excel(p) if p.exists() else pd.read_csv(q, comment="#")
-    out = pd.DataFrame({
-        "period_d":        _get_any(df,["koi_period"]),
-        "duration_h":      _get_any(df,["koi_duration"]),
-        "depth_ppm":       _get_any(df,["koi_depth"]),
-        "snr":             _get_any(df,["koi_model_snr"]),
-        "planet_radius_re":_get_any(df,["koi_prad"]),
-        "stellar_teff_k":  _get_any(df,["koi_steff","st_teff"]),
-        "stellar_logg":    _get_any(df,["koi_slogg","st_logg"]),
-        "stellar_radius_rs":_get_any(df,["koi_srad","st_rad"]),
-    })
-    disp = _get_any(df,["koi_disposition"], numeric=False).astype(str).str.upper().str.strip()
+# aliases de cada feature por banco; só as colunas resolvidas são lidas do arquivo
+KOI_ALIASES = {
+    "period_d":        ["koi_period"],
+    "duration_h":      ["koi_duration"],
+    "depth_ppm":       ["koi_depth"],
+    "snr":             ["koi_model_snr"],
+    "planet_radius_re":["koi_prad"],
+    "stellar_teff_k":  ["koi_steff","st_teff"],
+    "stellar_logg":    ["koi_slogg","st_logg"],
+    "stellar_radius_rs":["koi_srad","st_rad"],
+}
+KOI_DISP = ["koi_disposition"]
+
+K2_ALIASES = {
+    "period_d":        ["period","k2_period","koi_period","pl_orbper","orbital_period"],
+    "duration_h":      ["duration","k2_duration","transit_duration","koi_duration"],
+    "depth_ppm":       ["depth_ppm","depth","transit_depth","delta"],
+    "snr":             ["snr","model_snr","signal_to_noise"],
+    "planet_radius_re":["planet_radius","pl_rade","koi_prad"],
+    "stellar_teff_k":  ["st_teff","teff","koi_steff"],
+    "stellar_logg":    ["st_logg","logg","koi_slogg"],
+    "stellar_radius_rs":["st_rad","stellar_radius","koi_srad"],
+}
+K2_DISP = ["k2_disposition","disposition","koi_disposition",
+           "disposition using data from kepler","disposition using data from k2"]
+
+# identificador de cada objeto (só usado no índice de vizinhos)
+KOI_ID = ["kepoi_name","kepler_name","kepid"]
+K2_ID  = ["pl_name","epic_candname","hostname"]
+
+def _read_bank(xlsx, csv, aliases, disp, extra=()):
+    src = xlsx if xlsx.exists() else csv
+    return read_table(src, usecols_for=alias_usecols([*aliases.values(), disp, *extra]))
+
+def _object_ids(df, names, bank):
+    ids = get_any(df, names, numeric=False, default=None)
+    fallback = pd.Series([f"{bank}-{i}" for i in range(len(df))], index=ids.index)
+    return ids.where(ids.notna(), fallback).astype(str).str.strip().to_numpy()
+
+def load_std_koi(ids=False):
+    df = _read_bank(DATA_DIR/"KOI.xlsx", DATA_DIR/"clean_KOI.csv", KOI_ALIASES, KOI_DISP,
+                    extra=[KOI_ID] if ids else ())
+    out = pd.DataFrame({f: get_any(df, names) for f, names in KOI_ALIASES.items()})
+    disp = get_any(df, KOI_DISP, numeric=False).astype(str).str.upper().str.strip()
     y = pd.Series(np.nan, index=out.index)
     y[disp.str.contains("CONFIRM")] = 1
     y[disp.str.contains("FALSE")]   = 0
     out["label"] = y
     out["bank"]  = "KOI"
+    if ids:
+        out["object_id"] = _object_ids(df, KOI_ID, "KOI")
     return out[out.label.isin([0,1])]
 
-def load_std_k2():
-    p = DATA_DIR/"K2.xlsx"; q = DATA_DIR/"clean_K2.csv"
-    df = pd.read_excel(p) if p.exists() else pd.read_csv(q, comment="#")
-    out = pd.DataFrame({
-        "period_d":        _get_any(df,["period","k2_period","koi_period","pl_orbper","orbital_period"]),
-        "duration_h":      _get_any(df,["duration","k2_duration","transit_duration","koi_duration"]),
-        "depth_ppm":       _get_any(df,["depth_ppm","depth","transit_depth","delta"]),
-        "snr":             _get_any(df,["snr","model_snr","signal_to_noise"]),
-        "planet_radius_re":_get_any(df,["planet_radius","pl_rade","koi_prad"]),
-        "stellar_teff_k":  _get_any(df,["st_teff","teff","koi_steff"]),
-        "stellar_logg":    _get_any(df,["st_logg","logg","koi_slogg"]),
-        "stellar_radius_rs":_get_any(df,["st_rad","stellar_radius","koi_srad"]),
-    })
-    disp = _get_any(
-        df,
-        ["k2_disposition","disposition","koi_disposition",
-         "disposition using data from kepler","disposition using data from k2"],
-        numeric=False
-    ).astype(str).str.upper().str.strip()
+def load_std_k2(ids=False):
+    df = _read_bank(DATA_DIR/"K2.xlsx", DATA_DIR/"clean_K2.csv", K2_ALIASES, K2_DISP,
+                    extra=[K2_ID] if ids else ())
+    out = pd.DataFrame({f: get_any(df, names) for f, names in K2_ALIASES.items()})
+    disp = get_any(df, K2_DISP, numeric=False).astype(str).str.upper().str.strip()
     y = pd.Series(np.nan, index=out.index)
     y[disp.str.contains("CONFIRM")]   = 1
     y[disp.str.contains("FALSE|FP")]  = 0
     out["label"] = y
     out["bank"]  = "K2"
+    if ids:
+        out["object_id"] = _object_ids(df, K2_ID, "K2")
     return out[out.label.isin([0,1])]
 
 def remove_empty_columns(train_df, test_df, dataset_name=""):
@@ -223,18 +232,31 @@ def save_metrics_summary_json(file_path, y_true, y_score, threshold=0.5, header=
         json.dump(metrics_data, f, indent=4, ensure_ascii=False)
 
     print(f"[INFO] Resumo de métricas (JSON) salvo em {file_path}")
-# ========= core =========
-def main(
-    n_estimators=500,
-    max_depth=20,
-    threshold=0.5,
-    plot=True,
-    do_permutation=True,
-    perm_repeats=10,
-):
-    print("AAAAAAA")
-    warnings.filterwarnings("ignore", category=UserWarning)
 
+def build_estimator(engine, n_estimators, max_depth):
+    """RF (árvores profundas, votação) ou HGB (features em histograma, boosting de árvores rasas)."""
+    if engine == "rf":
+        return RandomForestClassifier(
+            n_estimators=n_estimators, max_depth=max_depth,
+            max_features="sqrt", class_weight="balanced_subsample",
+            n_jobs=-1, random_state=42
+        )
+    if engine == "hgb":
+        return HistGradientBoostingClassifier(
+            max_iter=n_estimators, max_depth=max_depth, learning_rate=0.1,
+            max_leaf_nodes=31, class_weight="balanced", random_state=42
+        )
+    raise ValueError(f"Engine desconhecida: {engine}. Use uma de {list(ENGINES)}.")
+
+# ========= splits =========
+def load_splits():
+    """
+    KOI + K2 padronizados, split 80/20 estratificado por banco, filtro de
+    completude e imputação com as medianas do treino combinado.
+
+    Retorna X_train, y_train, X_test, y_test (combinado) e os testes de
+    KOI (X_testK, y_testK) e K2 (X_test2, y_test2).
+    """
     # --- Load ---
     koi = load_std_koi()
     k2  = load_std_k2()
@@ -290,39 +312,129 @@ def main(
     assert len(X_train) == len(y_train)
     assert len(X_test)  == len(y_test)
 
-    # --- Treino RF ---
-    rf = RandomForestClassifier(
-        n_estimators=n_estimators, max_depth=max_depth,
-        max_features="sqrt", class_weight="balanced_subsample",
-        n_jobs=-1, random_state=42
-    ).fit(X_train, y_train)
+    return X_train, y_train, X_test, y_test, X_testK, y_testK, X_test2, y_test2
+
+# ========= vizinhos =========
+def build_neighbor_index(features=None):
+    """
+    Índice KD-tree de todos os objetos rotulados (KOI + K2, treino e teste)
+    nas FEATURES do modelo, com o mesmo filtro de completude do treino.
+    As faltas são imputadas com as medianas do próprio índice.
+    """
+    features = list(features or FEATURES)
+    df = pd.concat([load_std_koi(ids=True), load_std_k2(ids=True)], axis=0, ignore_index=True)
+    comp = df[features].replace([np.inf, -np.inf], np.nan)
+    df = df.loc[comp.notna().sum(axis=1) >= max(3, int(0.5 * len(features)))]
+    return NeighborIndex.build(df[features].to_numpy(dtype=np.float64), df["label"].astype(int).to_numpy(),
+                               df["bank"].to_numpy(), df["object_id"].to_numpy(), features)
+
+# ========= destilação =========
+def synthetic_samples(X, n, rng):
+    """
+    Amostras sintéticas no intervalo das features: metade uniforme entre os
+    percentis 0.5 e 99.5 de cada feature, metade reamostrando cada coluna de
+    forma independente (marginais reais, combinações novas).
+    """
+    lo, hi = np.nanpercentile(X, 0.5, axis=0), np.nanpercentile(X, 99.5, axis=0)
+    uniform = rng.uniform(lo, hi, size=(n // 2, X.shape[1]))
+    marginal = np.column_stack([rng.choice(X[:, j], n - n // 2) for j in range(X.shape[1])])
+    return np.vstack([uniform, marginal]).astype(np.float32)
+
+def with_missing(X, frac, rng):
+    """Cópia de X com ``frac`` dos valores apagados (o /predict-individual não imputa)."""
+    Xm = X.copy()
+    Xm[rng.random(X.shape) < frac] = np.nan
+    return Xm
+
+def distill_student(teacher, X_train, X_test, n_estimators=16, max_depth=12,
+                    synth_factor=6, missing_frac=0.2, random_state=42):
+    """
+    Treina um aluno pequeno (RandomForestRegressor raso) sobre o predict_proba
+    do professor, em treino + amostras sintéticas (e cópias com faltantes).
+
+    O desvio |p_aluno - p_professor| é medido em dados fora do treino do aluno
+    (teste, teste com faltantes e sintéticas novas) e vira o limite documentado
+    em student.json.  É um limite empírico, não uma garantia: o backend só usa
+    o aluno como padrão do /predict-individual se ele ficar dentro da tolerância
+    configurada (STUDENT_MAX_P99_DEV / STUDENT_MAX_ABS_DEV).
+
+    16 árvores de profundidade 12 dão ~0,8 MB em .npz (32 x 16 davam ~6,5 MB
+    para ganho pequeno de desvio); a latência por linha fica bem abaixo de 1 ms.
+    """
+    rng = np.random.default_rng(random_state)
+    A = X_train.to_numpy(dtype=np.float32)
+    S = np.vstack([A, synthetic_samples(A, synth_factor * len(A), rng)])
+    S = np.vstack([S, with_missing(S, missing_frac, rng)])
+    target = predict_positive(teacher, S)
+
+    reg = RandomForestRegressor(
+        n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=2,
+        max_features=None, n_jobs=-1, random_state=random_state
+    ).fit(S, target)
+    student = CompactForest.from_sklearn(reg, features=list(X_train.columns))
+
+    B = X_test.to_numpy(dtype=np.float32)
+    holdout = np.vstack([B, with_missing(B, missing_frac, rng), synthetic_samples(A, len(B), rng)])
+    dev = np.abs(student.predict_proba(holdout)[:, 1] - predict_positive(teacher, holdout))
+    info = {
+        "features": list(X_train.columns),
+        "n_estimators": n_estimators,
+        "max_depth": max_depth,
+        "n_distill_samples": int(len(S)),
+        "n_holdout": int(len(holdout)),
+        "max_abs_dev": round(float(dev.max()), 4),
+        "p99_abs_dev": round(float(np.percentile(dev, 99)), 4),
+        "mean_abs_dev": round(float(dev.mean()), 4),
+    }
+    return student, info
+
+# ========= core =========
+def main(
+    engine="rf",
+    n_estimators=500,
+    max_depth=20,
+    threshold=0.5,
+    plot=True,
+    do_permutation=True,
+    perm_repeats=10,
+    distill=False,
+    neighbors=True,
+):
+    print("AAAAAAA")
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    X_train, y_train, X_test, y_test, X_testK, y_testK, X_test2, y_test2 = load_splits()
+
+    # --- Treino (RF ou HGB) ---
+    rf = build_estimator(engine, n_estimators, max_depth).fit(X_train, y_train)
 
     print("Salvando modelo...")
             
     # --- salvar modelo ---
-    joblib.dump(rf, os.path.join(MODEL_DIR, "rf_model.pkl"))
+    joblib.dump(rf, os.path.join(MODEL_DIR, ENGINES[engine]["model"]))
 
     # --- salvar lista de features usadas no treino ---
     joblib.dump(FEATURES, os.path.join(MODEL_DIR, "rf_features.pkl"))
 
     # --- Avaliação ---
-    score_comb = rf.predict_proba(X_test)[:, 1]
-    print_report(f"[COMBINADO] n={n_estimators} depth={max_depth}", y_test,  score_comb, threshold)
+    score_comb = predict_positive(rf, X_test)
+    print_report(f"[COMBINADO] {engine} n={n_estimators} depth={max_depth}", y_test,  score_comb, threshold)
 
-    score_koi = rf.predict_proba(X_testK)[:, 1]
-    print_report(f"[KOI]       n={n_estimators} depth={max_depth}", y_testK, score_koi, threshold)
+    score_koi = predict_positive(rf, X_testK)
+    print_report(f"[KOI]       {engine} n={n_estimators} depth={max_depth}", y_testK, score_koi, threshold)
 
-    score_k2  = rf.predict_proba(X_test2)[:, 1]
-    print_report(f"[K2]        n={n_estimators} depth={max_depth}", y_test2,  score_k2,  threshold)
+    score_k2  = predict_positive(rf, X_test2)
+    print_report(f"[K2]        {engine} n={n_estimators} depth={max_depth}", y_test2,  score_k2,  threshold)
 
-    # --- Importâncias: Gini ---
-    importances = rf.feature_importances_
-    gini_table = sorted(zip(FEATURES, importances), key=lambda x: -x[1])
-    print("\n[Feature Importances - Gini]")
-    for f, imp in gini_table:
-        print(f"{f:20s} {imp:.6f}")
+    # --- Importâncias: Gini (só RF; o HGB não expõe feature_importances_) ---
+    importances = getattr(rf, "feature_importances_", None)
+    if importances is not None:
+        gini_table = sorted(zip(FEATURES, importances), key=lambda x: -x[1])
+        print("\n[Feature Importances - Gini]")
+        for f, imp in gini_table:
+            print(f"{f:20s} {imp:.6f}")
 
-    if plot:
+    if plot and importances is not None:
         try:
             import matplotlib.pyplot as plt
             plt.barh(FEATURES, importances)
@@ -369,15 +481,53 @@ def main(
             except Exception as e:
                 print(f"(Aviso) Falha ao plotar Permutation: {e}")
 
-    score_comb = rf.predict_proba(X_test)[:, 1]
-    print_report(f"[COMBINADO] n={n_estimators} depth={max_depth}", y_test,  score_comb, threshold)
+    score_comb = predict_positive(rf, X_test)
+    print_report(f"[COMBINADO] {engine} n={n_estimators} depth={max_depth}", y_test,  score_comb, threshold)
 
     # salvar resumo em txt
-    SUMMARY_PATH = os.path.join(MODEL_DIR, "metrics_summary.json")
+    SUMMARY_PATH = os.path.join(MODEL_DIR, ENGINES[engine]["summary"])
     save_metrics_summary_json(SUMMARY_PATH, y_test, score_comb, threshold, header="COMBINADO")
 
-
-main(n_estimators=300, max_depth=20, threshold=0.5, plot=True, do_permutation=True,  perm_repeats=10)
+    # --- Índice de vizinhos rotulados (mesmas FEATURES do modelo) ---
+    if neighbors:
+        index = build_neighbor_index(FEATURES)
+        index.save(os.path.join(MODEL_DIR, NEIGHBORS_NAME))
+        print(f"[INFO] Índice de vizinhos salvo em {os.path.join(MODEL_DIR, NEIGHBORS_NAME)} "
+              f"({len(index)} objetos rotulados, {len(index.features)} features)")
+
+    # --- Aluno destilado para o /predict-individual ---
+    if distill:
+        student, info = distill_student(rf, X_train, X_test)
+        info["teacher"] = ENGINES[engine]["model"]
+        info["roc_auc"] = round(float(roc_auc_score(y_test, student.predict_proba(X_test)[:, 1])), 4)
+        student.save(os.path.join(MODEL_DIR, STUDENT_NAME))
+        with open(os.path.join(MODEL_DIR, STUDENT_INFO), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=4, ensure_ascii=False)
+        print(f"[INFO] Aluno destilado salvo em {os.path.join(MODEL_DIR, STUDENT_NAME)} "
+              f"(desvio máx {info['max_abs_dev']:.4f}, p99 {info['p99_abs_dev']:.4f}, "
+              f"médio {info['mean_abs_dev']:.4f}; AUC {info['roc_auc']:.4f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina o modelo combinado KOI + K2 e salva em models/.")
+    parser.add_argument("--engine", choices=list(ENGINES), default="rf",
+                        help="rf (RandomForest, padrão) ou hgb (HistGradientBoosting).")
+    parser.add_argument("--n_estimators", type=int, default=300,
+                        help="Árvores da RF / iterações de boosting do HGB (padrão 300).")
+    parser.add_argument("--max_depth", type=int, default=20, help="Profundidade máxima das árvores (padrão 20).")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Limiar de decisão (padrão 0.5).")
+    parser.add_argument("--no_plot", action="store_true", help="Não abre os gráficos de importância.")
+    parser.add_argument("--no_permutation", action="store_true", help="Pula a Permutation Importance.")
+    parser.add_argument("--distill", action="store_true",
+                        help="Destila um aluno pequeno (models/student.npz) para o /predict-individual.")
+    parser.add_argument("--no_neighbors", action="store_true",
+                        help="Não reconstrói o índice de vizinhos rotulados (models/neighbors.pkl).")
+    args = parser.parse_args()
+
+    main(engine=args.engine, n_estimators=args.n_estimators, max_depth=args.max_depth,
+         threshold=args.threshold, plot=not args.no_plot,
+         do_permutation=not args.no_permutation, perm_repeats=10, distill=args.distill,
+         neighbors=not args.no_neighbors)
 
     
     
\ No newline at end of file
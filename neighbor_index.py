@@ -0,0 +1,129 @@
+"""
+Nearest labelled neighbours of scored objects in feature space.
+
+When a candidate scores high, the natural next question is "what does it look
+like?".  ``modelo.py`` builds a ``NeighborIndex`` over every labelled KOI/K2
+object (confirmed planets and false positives, train and test splits) next to
+``models/rf_model.pkl``; the backend loads it once and answers k-nearest
+queries for whole batches.
+
+Features are compared on a common scale: each column goes through a signed
+``log1p`` (periods, depths and radii span several orders of magnitude) and is
+then standardised with the labelled set's mean and standard deviation.
+Missing values are imputed with the labelled set's medians.  The scaled points
+live in a ``sklearn.neighbors.KDTree`` built at training time, so a query costs
+a tree descent per row instead of a scan over the catalogue.
+
+Usage:
+    from neighbor_index import NeighborIndex
+
+    index = NeighborIndex.build(X, labels, banks, ids, features)
+    index.save("models/neighbors.pkl")
+    index = NeighborIndex.load("models/neighbors.pkl")
+    neighbours = index.neighbors(X_batch, k=5)    # one list of dicts per row
+"""
+
+from __future__ import annotations
+
+import joblib
+import numpy as np
+
+FORMAT_NAME = "goldlens-neighbor-index"
+FORMAT_VERSION = 1
+
+LABEL_NAMES = {0: "FALSE POSITIVE", 1: "CONFIRMED"}
+MAX_K = 50
+
+
+def signed_log1p(X: np.ndarray) -> np.ndarray:
+    return np.sign(X) * np.log1p(np.abs(X))
+
+
+class NeighborIndex:
+    """
+    KD-tree over the scaled features of the labelled objects.
+
+    ``values`` keeps the raw (imputed) feature values, returned with each
+    neighbour; ``labels``/``banks``/``ids`` describe the objects.
+    """
+
+    def __init__(self, features, medians, center, scale, tree, values, labels, banks, ids) -> None:
+        self.features = [str(f) for f in features]
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.tree = tree
+        self.values = np.asarray(values, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int8)
+        self.banks = np.asarray(banks, dtype=object)
+        self.ids = np.asarray(ids, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, X, labels, banks, ids, features, leaf_size: int = 40) -> "NeighborIndex":
+        """Index the labelled rows ``X`` (columns ``features``, NaN allowed)."""
+        from sklearn.neighbors import KDTree
+
+        X = np.array(X, dtype=np.float64)
+        X[~np.isfinite(X)] = np.nan
+        medians = np.nanmedian(X, axis=0)
+        miss = np.isnan(X)
+        X[miss] = np.broadcast_to(medians, X.shape)[miss]
+        Z = signed_log1p(X)
+        center, scale = Z.mean(axis=0), Z.std(axis=0)
+        scale[scale == 0] = 1.0
+        tree = KDTree((Z - center) / scale, leaf_size=leaf_size)
+        return cls(features, medians, center, scale, tree, X, labels, banks, ids)
+
+    def scaled(self, X) -> np.ndarray:
+        """Rows of ``X`` (columns ``features``) in the index space; NaN/inf -> medians."""
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        if X.shape[1] != len(self.features):
+            raise ValueError(f"X has {X.shape[1]} features, but the neighbour index expects {len(self.features)}.")
+        bad = ~np.isfinite(X)
+        if bad.any():
+            X[bad] = np.broadcast_to(self.medians, X.shape)[bad]
+        return (signed_log1p(X) - self.center) / self.scale
+
+    def query(self, X, k: int = 5):
+        """(distances, positions), shape (n_rows, k), nearest first."""
+        k = max(1, min(int(k), MAX_K, len(self)))
+        return self.tree.query(self.scaled(X), k=k)
+
+    def neighbors(self, X, k: int = 5, with_values: bool = True) -> list:
+        """Per row of ``X``: its ``k`` nearest labelled objects as JSON-ready dicts."""
+        dist, pos = self.query(X, k)
+        out = []
+        for d_row, p_row in zip(dist, pos):
+            row = []
+            for d, p in zip(d_row, p_row):
+                item = {
+                    "id": self.ids[p],
+                    "mission": self.banks[p],
+                    "label": LABEL_NAMES.get(int(self.labels[p]), str(self.labels[p])),
+                    "distance": round(float(d), 4),
+                }
+                if with_values:
+                    item["features"] = dict(zip(self.features, self.values[p].tolist()))
+                row.append(item)
+            out.append(row)
+        return out
+
+    def save(self, path) -> None:
+        joblib.dump({
+            "format": FORMAT_NAME, "version": FORMAT_VERSION,
+            "features": self.features, "medians": self.medians, "center": self.center, "scale": self.scale,
+            "tree": self.tree, "values": self.values, "labels": self.labels, "banks": self.banks, "ids": self.ids,
+        }, path)
+
+    @classmethod
+    def load(cls, path) -> "NeighborIndex":
+        state = joblib.load(path)
+        if not isinstance(state, dict) or state.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a neighbour index file.")
+        if state["version"] > FORMAT_VERSION:
+            raise ValueError(f"{path} uses neighbour index format v{state['version']}; this code reads up to v{FORMAT_VERSION}.")
+        return cls(state["features"], state["medians"], state["center"], state["scale"], state["tree"],
+                   state["values"], state["labels"], state["banks"], state["ids"])
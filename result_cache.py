@@ -0,0 +1,261 @@
+"""
+Content-addressed cache of ``/predict`` responses.
+
+The same exports (``test.csv``, clean KOI/K2 tables) are uploaded over and
+over, and with the same query parameters and models the answer cannot change.
+Each request is keyed on
+
+    - the SHA-256 of the uploaded content (the ``file`` part of a multipart
+      form, or the raw body),
+    - the normalised query parameters, and
+    - a fingerprint of the served models (file digests, features, code),
+
+and the finished response body is kept in a size-bounded directory, evicted
+least-recently-used first.  The key doubles as the response ``ETag``: a
+request whose ``If-None-Match`` already names it needs neither the cache entry
+nor any parsing or scoring.  The body is stored uncompressed and encoded per
+request, so the same key is served as gzip, zstd or identity bytes: the backend
+sends it as a weak ETag with ``Vary: Accept-Encoding``.
+
+Usage:
+    from result_cache import ResultCache, cache_key, hashed_request, models_fingerprint
+
+    cache = ResultCache("artifacts/result_cache", max_bytes=256 << 20)
+    fingerprint = models_fingerprint(core.models, extra_files=["scoring.py"])
+    req, digest = hashed_request(request)
+    key = cache_key(digest, {"format": "json", "top": 10}, fingerprint)
+    hit = cache.get(key)          # (meta, open body file) or None
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+HASH_CHUNK_BYTES = 1 << 20
+# raw bodies are copied here while hashed; larger ones spill to a temporary file
+SPOOL_BYTES = 8 << 20
+# leftover *.tmp files older than this are from a crashed write, not one in flight
+STALE_TMP_S = 3600
+
+
+def file_sha256(path, chunk_bytes: int = HASH_CHUNK_BYTES) -> str:
+    """SHA-256 of a file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def models_fingerprint(models: dict, extra_files: Iterable = ()) -> str:
+    """
+    Digest of everything a response depends on besides the upload: each
+    model's name, file, sidecar and features (``ScoringCore.models``), plus
+    ``extra_files`` (the scoring code).
+    """
+    state = {}
+    for name, m in sorted(models.items()):
+        entry = {"sha256": file_sha256(m["path"]), "features": list(m["features"])}
+        if "pipeline" in m:
+            entry["sidecar"] = file_sha256(os.path.splitext(str(m["path"]))[0] + ".preprocess.json")
+        state[name] = entry
+    state["_code"] = {os.path.basename(str(p)): file_sha256(p) for p in extra_files}
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def cache_key(content_digest: str, params: dict, fingerprint: str) -> str:
+    """Key (and ETag) of a response: upload digest + normalised parameters + models."""
+    blob = json.dumps({"content": content_digest, "params": params, "models": fingerprint}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def hashed_request(req, spool_bytes: int = SPOOL_BYTES):
+    """
+    ``(request, sha256)`` of the content uploaded in a werkzeug request.
+
+    Multipart forms are hashed on their ``file`` part only (the random form
+    boundary changes on every upload of the same file); werkzeug already
+    spooled it, so it is rewound and read again by the parser.  A raw body can
+    only be read once: it is copied to a spooled temporary file while hashed
+    and a new request reading from that copy is returned, so ingestion still
+    streams.
+    """
+    h = hashlib.sha256()
+    if req.mimetype == "multipart/form-data":
+        file = req.files.get("file")
+        if file is not None:
+            for block in iter(lambda: file.stream.read(HASH_CHUNK_BYTES), b""):
+                h.update(block)
+            file.stream.seek(0)
+        return req, h.hexdigest()
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    size = 0
+    for block in iter(lambda: req.stream.read(HASH_CHUNK_BYTES), b""):
+        h.update(block)
+        spool.write(block)
+        size += len(block)
+    spool.seek(0)
+    environ = dict(req.environ, **{"wsgi.input": spool, "CONTENT_LENGTH": str(size)})
+    environ.pop("wsgi.input_terminated", None)
+    # flask.request is a proxy: build the copy from the request object itself
+    cls = type(getattr(req, "_get_current_object", lambda: req)())
+    return cls(environ), h.hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded directory of response bodies, addressed by ``cache_key``.
+
+    Each entry is ``<key>.body`` plus a small ``<key>.json`` (mimetype and
+    headers).  The least recently used entries are removed once the total
+    exceeds ``max_bytes``; recency survives restarts through the files' mtime.
+    Body and metadata are written to temporary files first and renamed into
+    place, so a reader never sees a partial one.  On start, temporary files
+    older than ``stale_tmp_s`` are removed; newer ones may belong to another
+    process writing to the same directory.
+    """
+
+    def __init__(self, directory, max_bytes: int = 256 << 20, stale_tmp_s: float = STALE_TMP_S) -> None:
+        self.directory = str(directory)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()   # key -> bytes, oldest first
+        self.total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        now = time.time()
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".body"):
+                key = fname[: -len(".body")]
+                body, meta = self._paths(key)
+                if os.path.exists(meta):
+                    st = os.stat(body)
+                    found.append((st.st_mtime, key, st.st_size + os.path.getsize(meta)))
+                else:
+                    os.remove(body)
+            elif fname.endswith(".tmp"):
+                path = os.path.join(self.directory, fname)
+                try:
+                    if now - os.path.getmtime(path) > stale_tmp_s:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass   # committed or removed by its writer meanwhile
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".json"
+
+    def get(self, key: str):
+        """
+        ``(meta, body_file)`` of a cached response, or None.  The body is
+        returned open, so a concurrent eviction cannot pull it from under the
+        reader; ``iter_file`` streams and closes it.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            body, meta_path = self._paths(key)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                body_file = open(body, "rb")
+                os.utime(body)
+            except FileNotFoundError:
+                # removed by another process sharing the directory
+                self.total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return meta, body_file
+
+    def put(self, key: str, body: bytes, meta: dict) -> None:
+        """Store a finished response body."""
+        if len(body) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        self._commit(key, tmp, meta)
+
+    def tee(self, key: str, chunks: Iterable[bytes], meta: dict):
+        """
+        Pass a streamed response (bytes or str chunks, stored as UTF-8) through
+        while storing it; the entry is committed only if the stream is consumed
+        to the end.
+        """
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        f = os.fdopen(fd, "wb")
+        size = 0
+        try:
+            for chunk in chunks:
+                if f is not None:
+                    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    size += len(data)
+                    if size > self.max_bytes:
+                        # larger than the whole cache: the rest only passes through
+                        f.close()
+                        f = None
+                        os.remove(tmp)
+                    else:
+                        f.write(data)
+                yield chunk
+            if f is not None:
+                f.close()
+                f = None
+                self._commit(key, tmp, meta)
+        finally:
+            if f is not None:
+                # client went away mid-stream: nothing is kept
+                f.close()
+                os.remove(tmp)
+
+    def _commit(self, key: str, tmp: str, meta: dict) -> None:
+        body, meta_path = self._paths(key)
+        fd, meta_tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # metadata first: a body without it is treated as debris by a starting cache
+        os.replace(meta_tmp, meta_path)
+        os.replace(tmp, body)
+        size = os.path.getsize(body) + os.path.getsize(meta_path)
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+def iter_file(f, chunk_bytes: int = HASH_CHUNK_BYTES):
+    """Chunks of an open cached body (closed at the end), for streamed responses."""
+    with f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            yield block
@@ -0,0 +1,1344 @@
+"""
+Shared scoring core for the GoldLens services and training scripts.
+
+Everything between "a table arrived" and "here are the probabilities" lives
+here, so the root ``app.py``, ``backend/main.py`` and the evaluation code in
+``modelo.py`` / ``train_multi_rf.py`` run the same code path:
+
+    - ingestion of uploads (CSV/XLSX/Parquet/Feather/Arrow files, optionally
+      gzip/zstd compressed, Arrow IPC streams and JSON payloads), parsing only
+      the columns that feed a feature;
+    - alias resolution of KOI/K2/TOI column names onto the standard features;
+    - numeric coercion, row filtering and median imputation into a
+      C-contiguous float32 matrix (the dtype sklearn trees use internally);
+    - inference with one or several named models sharing that matrix,
+      optionally sharded over a persistent process pool for huge catalogues;
+    - ranking and serialisation of the results.
+
+Usage:
+    from scoring import ScoringCore, read_payload
+
+    core = ScoringCore.from_paths("models/rf_model.pkl", features)
+    df, info = read_payload(request, usecols_for=core.needed_columns)
+    X, rows, stats = core.prepare(df)
+    scores = core.score(X, ["rf"])
+"""
+
+from __future__ import annotations
+
+import glob
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager, nullcontext
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from compress_forest import CompactForest
+from exo_preprocess import ExoPreprocessor
+from sklearn.metrics import (
+    accuracy_score, balanced_accuracy_score, roc_auc_score,
+    f1_score, matthews_corrcoef, confusion_matrix,
+)
+
+# mapping of common KOI/K2/TOI column names -> standard feature names
+CANDS: Dict[str, List[str]] = {
+    "period_d":        ["period_d","koi_period","pl_orbper","orbital_period","period"],
+    "duration_h":      ["duration_h","koi_duration","transit_duration","duration"],
+    "depth_ppm":       ["depth_ppm","transit_depth","depth","delta"],
+    "snr":             ["snr","model_snr","signal_to_noise","koi_model_snr"],
+    "planet_radius_re":["planet_radius_re","pl_rade","koi_prad","planet_radius"],
+    "stellar_teff_k":  ["stellar_teff_k","st_teff","koi_steff","teff"],
+    "stellar_logg":    ["stellar_logg","st_logg","koi_slogg","logg"],
+    "stellar_radius_rs":["stellar_radius_rs","st_rad","koi_srad","stellar_radius"],
+}
+STANDARD_FEATURES: List[str] = list(CANDS)
+
+
+# ========= coercion / alias resolution =========
+def _is_typed_numeric(s) -> bool:
+    """True for int/float columns (Arrow, Parquet, JSON numbers): no text to parse."""
+    dtype = getattr(s, "dtype", None)
+    return (
+        dtype is not None
+        and pd.api.types.is_numeric_dtype(dtype)
+        and not pd.api.types.is_bool_dtype(dtype)
+        and not pd.api.types.is_complex_dtype(dtype)
+    )
+
+
+def _numeric_values(s, dtype) -> np.ndarray:
+    """Typed numeric column -> ``dtype`` array; inf becomes NaN, as the text path does."""
+    v = s.to_numpy(dtype=dtype, na_value=np.nan)
+    inf = np.isinf(v)
+    # to_numpy pode devolver uma view dos dados de entrada: não alterar in-place
+    return np.where(inf, np.nan, v).astype(dtype, copy=False) if inf.any() else v
+
+
+def to_num(s) -> pd.Series:
+    """Coerce text such as ``"1,5"`` or ``"12.3 ± 0.4"`` to float; anything else becomes NaN."""
+    if _is_typed_numeric(s):
+        # coluna já numérica: sem ida e volta por string/regex
+        return pd.Series(_numeric_values(s, np.float64), index=s.index)
+    s = pd.Series(s, dtype="object").astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(
+        s.str.extract(r"([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)")[0],
+        errors="coerce",
+    )
+
+
+def resolve_column(columns, names) -> Optional[str]:
+    """
+    Original name of the first entry of ``columns`` matching an alias in ``names``.
+
+    Exact (case-insensitive) matches win; otherwise a column starting with or
+    containing the alias is accepted.  Returns None when nothing matches.
+    """
+    cols = {str(c).lower().strip(): c for c in columns}
+    for n in names:
+        nlow = n.lower().strip()
+        if nlow in cols:
+            return cols[nlow]
+        for key, orig in cols.items():
+            if key == nlow or key.startswith(nlow) or nlow in key:
+                return orig
+    return None
+
+
+def get_any(df: pd.DataFrame, names, numeric: bool = True, default=np.nan) -> pd.Series:
+    """Column of ``df`` resolved through ``names`` (coerced to float if ``numeric``)."""
+    col = resolve_column(df.columns, names)
+    if col is None:
+        return pd.Series([default] * len(df))
+    return to_num(df[col]) if numeric else df[col]
+
+
+def resolve_feature_columns(columns, features) -> dict:
+    """Map each feature to the column of ``columns`` that feeds it (None = absent)."""
+    lower = {str(c).lower().strip(): c for c in columns}
+    if all(f.lower() in lower for f in features):
+        return {f: lower[f.lower()] for f in features}
+    return {f: resolve_column(columns, CANDS.get(f, [f])) for f in features}
+
+
+# ========= feature matrix =========
+def build_feature_matrix(df: pd.DataFrame, features, columns: dict = None, rows: np.ndarray = None) -> np.ndarray:
+    """
+    Write ``features`` straight into one C-contiguous float32 block (n_rows x n_features).
+
+    ``columns`` is the mapping from ``resolve_feature_columns`` (recomputed if
+    None); ``rows``, if given, restricts coercion to those positions of ``df``.
+    Typed int/float columns are cast directly; only text columns go through
+    ``to_num``.
+    """
+    if columns is None:
+        columns = resolve_feature_columns(df.columns, features)
+    n = len(df) if rows is None else len(rows)
+    X = np.empty((n, len(features)), dtype=np.float32)
+    for j, f in enumerate(features):
+        col = columns[f]
+        if col is None:
+            X[:, j] = np.nan
+            continue
+        s = df[col] if rows is None else df[col].iloc[rows]
+        if _is_typed_numeric(s):
+            X[:, j] = _numeric_values(s, np.float32)
+        else:
+            X[:, j] = to_num(s).to_numpy(dtype=np.float32, na_value=np.nan)
+    return X
+
+
+def impute_median(X: np.ndarray) -> np.ndarray:
+    """Replace inf/NaN in place with the per-column median (all-NaN columns stay NaN)."""
+    X[np.isinf(X)] = np.nan
+    missing = np.isnan(X)
+    if missing.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            med = np.nanmedian(X, axis=0)
+        r, c = np.nonzero(missing)
+        X[r, c] = med[c]
+    return X
+
+
+def unique_rows(X: np.ndarray):
+    """
+    Distinct rows of a 2-D matrix and the inverse map (``X == U[inverse]``).
+
+    Rows are compared on their raw bits: each row is folded into a 64-bit hash
+    and the hashes are factorised in one pass (pandas hash table, no sort).
+    The result is checked exactly; should two different rows share a hash,
+    ``np.unique`` over a void view of the rows is used instead.  Identical
+    NaNs match; ``-0.0`` and ``0.0`` do not, which only costs a missed collapse.
+    """
+    X = np.ascontiguousarray(X)
+    bits = X.view(f"u{X.dtype.itemsize}")
+    h = bits[:, 0].astype(np.uint64)
+    for j in range(1, bits.shape[1]):
+        h *= np.uint64(0x9E3779B97F4A7C15)
+        h ^= bits[:, j]
+    inverse, _ = pd.factorize(h)
+    # codes are numbered in order of first appearance
+    run = np.maximum.accumulate(inverse)
+    first = np.flatnonzero(np.r_[True, run[1:] > run[:-1]])
+    if not np.array_equal(bits[first][inverse], bits):
+        keys = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return X[first], inverse.ravel()
+
+
+def predict_positive(model, X) -> np.ndarray:
+    """Probability of the positive class (planet) for a feature matrix or frame."""
+    with warnings.catch_warnings():
+        # models fitted on DataFrames are fed float32 matrices in the same column order
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return model.predict_proba(X)[:, 1]
+
+
+# ========= models =========
+def model_features(model, default_features) -> List[str]:
+    """Input features of ``model``; unnamed models (e.g. root ``model.pkl``) use ``default_features`` or CANDS order."""
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return [str(n) for n in names]
+    n = getattr(model, "n_features_in_", len(default_features))
+    return list(default_features) if n == len(default_features) else STANDARD_FEATURES[:n]
+
+
+def load_model(path):
+    """Fitted model from a joblib pickle, or a ``CompactForest`` from a ``compress_forest.py`` ``.npz``."""
+    if str(path).lower().endswith(".npz"):
+        return CompactForest.load(path)
+    return joblib.load(path)
+
+
+def latest_path(pattern: str) -> Optional[str]:
+    """Most recently modified file matching a glob pattern (or None)."""
+    matches = sorted(glob.glob(pattern), key=os.path.getmtime)
+    return matches[-1] if matches else None
+
+
+class MissionPipeline:
+    """
+    Raw catalogue rows -> inputs of a ``train_multi_rf.py`` model.
+
+    Loaded from the ``<model>.preprocess.json`` sidecar written next to the
+    model: one fitted ``ExoPreprocessor`` per training base, the training column
+    union and its medians.  Each batch goes through the preprocessor of the base
+    whose kept columns best match the input header, its columns are scattered
+    onto the union with precomputed index arrays and the rest is filled with the
+    training medians, exactly as the candidates were scored at training time.
+    """
+
+    def __init__(self, preprocessors: dict, feature_cols, median_vals) -> None:
+        self.preprocessors = preprocessors
+        self.feature_cols = list(feature_cols)
+        self.medians = np.array([np.nan if v is None else v for v in median_vals], dtype=np.float64)
+        pos = {c: i for i, c in enumerate(self.feature_cols)}
+        # per base: (positions in the preprocessor output, positions in feature_cols)
+        self._index = {}
+        for base, pre in preprocessors.items():
+            pairs = [(j, pos[c]) for j, c in enumerate(pre.kept_columns_) if c in pos]
+            self._index[base] = (np.array([j for j, _ in pairs], dtype=np.intp),
+                                 np.array([k for _, k in pairs], dtype=np.intp))
+
+    @staticmethod
+    def sidecar_path(model_path) -> str:
+        return os.path.splitext(str(model_path))[0] + ".preprocess.json"
+
+    @classmethod
+    def from_sidecar(cls, path) -> "MissionPipeline":
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        pres = {b: ExoPreprocessor.from_dict(d) for b, d in state["preprocessors"].items()}
+        return cls(pres, state["feature_cols"], state["median_vals"])
+
+    def pick(self, columns) -> str:
+        """Base whose kept columns overlap the most with an input header."""
+        header = {str(c).strip() for c in columns}
+        return max(self.preprocessors, key=lambda b: len(header.intersection(self.preprocessors[b].kept_columns_)))
+
+    def input_columns(self, columns) -> List[str]:
+        """Columns of an input header read by the matching base (for ``usecols``)."""
+        kept = set(self.preprocessors[self.pick(columns)].kept_columns_)
+        return [c for c in columns if str(c).strip() in kept]
+
+    def matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Model-ready float32 matrix on ``feature_cols`` for raw rows ``df``."""
+        base = self.pick(df.columns)
+        src, dest = self._index[base]
+        Xb = self.preprocessors[base].transform_matrix(df)
+        X = np.empty((len(df), len(self.feature_cols)), dtype=np.float64)
+        X[:] = self.medians
+        X[:, dest] = Xb[:, src]
+        # columns the base kept but never imputed (all-NaN at fit time) fall back to the medians
+        miss = np.isnan(X)
+        if miss.any():
+            X[miss] = np.broadcast_to(self.medians, X.shape)[miss]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+
+# ========= inference parallelism =========
+def _threadpool_controller():
+    """A ``threadpoolctl.ThreadpoolController`` (None when threadpoolctl is not installed)."""
+    try:
+        from threadpoolctl import ThreadpoolController
+    except ImportError:
+        return None
+    return ThreadpoolController()
+
+
+class ThreadBudget:
+    """
+    Global cap on the inference threads of concurrent requests.
+
+    Each scoring call leases threads for its batch: one per ``rows_per_thread``
+    rows, at most its fair share of ``total`` among the requests in flight, and
+    never more than what is left.  When the budget is exhausted calls wait, in
+    arrival order, for a thread, so the process never runs more than ``total``
+    inference threads however many requests arrive.
+    """
+
+    def __init__(self, total: Optional[int] = None, rows_per_thread: int = 20_000) -> None:
+        self.total = max(int(total or os.cpu_count() or 1), 1)
+        self.rows_per_thread = max(int(rows_per_thread), 1)
+        self.in_use = 0
+        self.in_flight = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def wanted(self, n_rows: int) -> int:
+        """Threads a batch of ``n_rows`` asks for, before the fair-share and budget caps."""
+        return max(1, -(-int(n_rows) // self.rows_per_thread))
+
+    @contextmanager
+    def lease(self, n_rows: int):
+        """Context manager yielding the number of threads granted to a batch of ``n_rows`` rows."""
+        ticket = object()
+        with self._cond:
+            self.in_flight += 1
+            # first come, first served: no small request starves behind later arrivals
+            self._queue.append(ticket)
+            self._cond.wait_for(lambda: self._queue[0] is ticket and self.in_use < self.total)
+            self._queue.popleft()
+            n = min(self.wanted(n_rows), max(self.total // self.in_flight, 1), self.total - self.in_use)
+            self.in_use += n
+            self._cond.notify_all()
+        try:
+            yield n
+        finally:
+            with self._cond:
+                self.in_use -= n
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"total": self.total, "rows_per_thread": self.rows_per_thread,
+                "in_use": self.in_use, "in_flight": self.in_flight}
+
+
+# ========= sharded scoring =========
+# models loaded once per worker process by _shard_worker_init (name -> estimator)
+_SHARD_MODELS: dict = {}
+
+
+def _shard_worker_init(specs: dict) -> None:
+    """Pool initializer: load every ``name -> path`` model once, single-threaded."""
+    for name, path in specs.items():
+        model = load_model(path)
+        if hasattr(model, "n_jobs"):
+            # the pool already has one process per core
+            model.n_jobs = 1
+        _SHARD_MODELS[name] = model
+
+
+def _shard_ping(_) -> int:
+    return os.getpid()
+
+
+def _score_shard(name, cols, x_name, x_shape, start, stop, out_name, out_shape, out_row) -> dict:
+    """
+    Score rows ``start:stop`` of the shared float32 matrix with the preloaded
+    model ``name`` and write them into row ``out_row`` of the shared output.
+    Only names, shapes and offsets cross the process boundary.
+    """
+    t0 = time.perf_counter()
+    x_shm, out_shm = SharedMemory(name=x_name), SharedMemory(name=out_name)
+    try:
+        X = np.ndarray(x_shape, dtype=np.float32, buffer=x_shm.buf)
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf)
+        Xs = X[start:stop] if cols is None else X[start:stop][:, cols]
+        out[out_row, start:stop] = predict_positive(_SHARD_MODELS[name], Xs)
+        del X, Xs, out   # no views may outlive close()
+    finally:
+        x_shm.close()
+        out_shm.close()
+    return {"model": name, "start": start, "stop": stop, "pid": os.getpid(),
+            "seconds": round(time.perf_counter() - t0, 4)}
+
+
+class ShardPool:
+    """
+    Persistent process pool scoring large matrices in row shards.
+
+    Each worker loads the models once (``specs``: ``name -> path``) when the
+    pool starts.  Per request the prepared matrix is copied once into shared
+    memory, every ``(model, shard)`` pair is submitted as a task carrying only
+    offsets, and the workers write their probabilities straight into a shared
+    output buffer, so neither the matrix nor the models are pickled per task.
+
+    A worker that dies (killed for memory, crashed in native code) breaks the
+    whole executor: ``score`` then raises ``BrokenProcessPool`` and a fresh
+    pool is started in a background thread (``restarts`` counts them).
+    """
+
+    def __init__(self, specs: dict, workers: int, shard_rows: int = 250_000) -> None:
+        self.specs = dict(specs)
+        self.workers = max(int(workers), 1)
+        self.shard_rows = max(int(shard_rows), 1)
+        self.restarts = 0
+        self._restart_lock = threading.Lock()
+        self._restarting = False
+        self._pool = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # spawn: workers never inherit the server's threads/locks
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_shard_worker_init,
+            initargs=(self.specs,),
+        )
+        # start the workers (and load the models) before the first request
+        list(pool.map(_shard_ping, range(self.workers)))
+        return pool
+
+    def restart(self, broken: ProcessPoolExecutor) -> Optional[threading.Thread]:
+        """
+        Replace ``broken`` with a new pool in a background thread (workers load
+        the models again, which takes a while).  Requests failing on the same
+        broken pool meanwhile do not start a second one.
+        """
+        with self._restart_lock:
+            if self._restarting or self._pool is not broken:
+                return None
+            self._restarting = True
+
+        def _run():
+            broken.shutdown(wait=False, cancel_futures=True)
+            try:
+                pool = self._start()
+                with self._restart_lock:
+                    self._pool = pool
+                    self.restarts += 1
+            except Exception as e:
+                print("[WARN] Pool de shards não pôde ser reiniciado:", str(e))
+            finally:
+                with self._restart_lock:
+                    self._restarting = False
+
+        thread = threading.Thread(target=_run, name="shard-pool-restart", daemon=True)
+        thread.start()
+        return thread
+
+    def bounds(self, n_rows: int) -> List[tuple]:
+        """Row ranges: ``shard_rows`` each, but at least one shard per worker."""
+        size = min(self.shard_rows, -(-n_rows // self.workers))
+        return [(a, min(a + size, n_rows)) for a in range(0, n_rows, max(size, 1))]
+
+    def score(self, X: np.ndarray, cols: dict):
+        """
+        Probabilities of every model in ``cols`` (``name -> column indices`` of
+        ``X``, or None for all of them, in order) and the per-shard timings.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        names = list(cols)
+        out_shape = (len(names), len(X))
+        pool = self._pool
+        x_shm = SharedMemory(create=True, size=max(X.nbytes, 1))
+        out_shm = SharedMemory(create=True, size=max(8 * len(names) * len(X), 1))
+        try:
+            np.ndarray(X.shape, dtype=np.float32, buffer=x_shm.buf)[:] = X
+            futures = [
+                pool.submit(_score_shard, name, cols[name], x_shm.name, X.shape,
+                                  start, stop, out_shm.name, out_shape, i)
+                for i, name in enumerate(names)
+                for start, stop in self.bounds(len(X))
+            ]
+            wait(futures)
+            timings = [f.result() for f in futures]
+            out = np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf)
+            scores = {name: out[i].copy() for i, name in enumerate(names)}
+            del out
+        except BrokenProcessPool:
+            self.restart(pool)
+            raise
+        finally:
+            x_shm.close()
+            x_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+        return scores, timings
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ScoringCore:
+    """
+    Named models sharing a single feature preparation per request.
+
+    Parameters
+    ----------
+    features : list of str
+        Features of the default model; they come first in the shared matrix and
+        are the ones counted by ``min_raw_nonnull``.
+    models : dict
+        ``name -> {"model": estimator, "path": str, "features": [...]}``;
+        models with a ``"pipeline"`` (``MissionPipeline``) are fed raw rows
+        through it instead of the shared CANDS matrix.
+    default : str
+        Name of the model used when a request does not pick one.
+    """
+
+    def __init__(self, features, models: dict, default: str = "rf") -> None:
+        self.features = list(features)
+        self.models = models
+        self.default = default
+        # shared matrix columns: default features first, then those only other models use
+        self.serve_features = self.features + sorted(
+            {f for m in models.values() if "pipeline" not in m for f in m["features"]} - set(self.features),
+            key=STANDARD_FEATURES.index,
+        )
+        for m in models.values():
+            if "pipeline" not in m:
+                m["cols"] = np.array([self.serve_features.index(f) for f in m["features"]])
+        self._pool = ThreadPoolExecutor(max_workers=max(len(models), 1))
+        self._shards: Optional[ShardPool] = None
+        self.shard_min_rows = 0
+        self.budget: Optional[ThreadBudget] = None
+        self._threadpools = None
+
+    @classmethod
+    def from_paths(cls, model_path, features=None, extra_models: str = "", default: str = "rf") -> "ScoringCore":
+        """
+        Load the default model from ``model_path`` plus ``extra_models``
+        (``"name=path,name2=glob"``, newest match wins).  Paths ending in
+        ``.npz`` are compact forests written by ``compress_forest.py``.
+
+        Extra models are kept only if they expose ``predict_proba`` and all of
+        their inputs resolve through ``CANDS``, or if a ``.preprocess.json``
+        sidecar (``train_multi_rf.py --save_model``) maps raw rows onto them.
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modelo não encontrado em {model_path}")
+        main_model = load_model(model_path)
+        if not hasattr(main_model, "predict_proba"):
+            raise ValueError("O modelo carregado não possui predict_proba().")
+        if features is None:
+            features = model_features(main_model, STANDARD_FEATURES)
+        models = {default: {"model": main_model, "path": str(model_path), "features": list(features)}}
+
+        for spec in filter(None, (x.strip() for x in (extra_models or "").split(","))):
+            name, _, pattern = spec.partition("=")
+            path = latest_path(pattern.strip())
+            if not path:
+                continue
+            model = load_model(path)
+            feats = model_features(model, features)
+            unknown = [f for f in feats if f not in CANDS]
+            sidecar = MissionPipeline.sidecar_path(path)
+            if not hasattr(model, "predict_proba"):
+                print(f"[WARN] Modelo '{name}' ({path}) não possui predict_proba(); ignorado.")
+            elif os.path.exists(sidecar):
+                # pré-processador por missão carregado uma vez; nenhum refit por requisição
+                models[name.strip()] = {"model": model, "path": path, "features": feats,
+                                        "pipeline": MissionPipeline.from_sidecar(sidecar)}
+            elif unknown:
+                print(f"[WARN] Modelo '{name}' ({path}) usa features fora de CANDS ({len(unknown)}); ignorado.")
+            else:
+                models[name.strip()] = {"model": model, "path": path, "features": feats}
+        return cls(features, models, default=default)
+
+    def enable_sharding(self, workers: int, shard_rows: int = 250_000, min_rows: int = 500_000) -> None:
+        """
+        Score matrices of at least ``min_rows`` rows in a ``ShardPool`` of
+        ``workers`` processes (models without a pipeline only; those score the
+        shared matrix, pipeline models keep the in-process path).
+        """
+        specs = {n: m["path"] for n, m in self.models.items() if "pipeline" not in m}
+        self._shards = ShardPool(specs, workers, shard_rows)
+        self.shard_min_rows = int(min_rows)
+
+    def set_thread_budget(self, total: Optional[int] = None, rows_per_thread: int = 20_000) -> ThreadBudget:
+        """
+        Decide the inference threads of every ``score`` call from a shared
+        ``ThreadBudget`` instead of each model's own ``n_jobs`` (``-1`` as
+        trained: a full set of joblib threads per concurrent request).
+
+        Each call's leased threads bound both its joblib ``n_jobs`` (forests)
+        and its OpenMP team (HistGradientBoosting).  The OpenMP limit is the
+        calling thread's own setting (``omp_set_num_threads``), so requests
+        scored side by side do not change each other's.  BLAS is pinned to one
+        thread for the whole process (tree inference does not use it), and
+        OpenMP defaults to the whole budget for calls made outside a lease.
+        """
+        for m in self.models.values():
+            if hasattr(m["model"], "n_jobs"):
+                m["model"].n_jobs = None   # each call's joblib.parallel_config decides
+        self.budget = ThreadBudget(total, rows_per_thread)
+        self._threadpools = _threadpool_controller()
+        if self._threadpools is not None:
+            self._threadpools.limit(limits=1, user_api="blas")
+            self._threadpools.limit(limits=self.budget.total, user_api="openmp")
+        return self.budget
+
+    def _parallelism(self, n_jobs: Optional[int]):
+        """Context limiting joblib and OpenMP to ``n_jobs`` threads in the calling thread."""
+        if n_jobs is None:
+            return nullcontext()
+        stack = ExitStack()
+        stack.enter_context(joblib.parallel_config(n_jobs=n_jobs))
+        if self._threadpools is not None:
+            stack.enter_context(self._threadpools.limit(limits=n_jobs, user_api="openmp"))
+        return stack
+
+    def needed_columns(self, columns, names=None) -> List[str]:
+        """
+        Columns of an input header that feed some served feature (for
+        ``usecols``), plus the raw columns read by the pipelines of ``names``.
+        """
+        resolved = set(resolve_feature_columns(columns, self.serve_features).values())
+        for n in names or ():
+            pipe = self.models[n].get("pipeline")
+            if pipe is not None:
+                resolved.update(pipe.input_columns(columns))
+        return [c for c in columns if c in resolved]
+
+    def prepare(self, df_in: pd.DataFrame, min_raw_nonnull: int = 3, impute: bool = True):
+        """
+        Build the float32 matrix, drop rows with fewer than ``min_raw_nonnull``
+        values and impute the rest with per-column medians.
+
+        ``impute=False`` leaves missing values as NaN, so every row is scored
+        exactly as if it had been sent alone (``/predict-individual``).
+
+        Rows are dropped in two stages: raw non-null counts (cheap, and an upper
+        bound of what survives coercion) filter rows before the regex coercion,
+        then the exact count is redone on the numeric values.
+
+        Returns (X, rows, stats): the model-ready matrix, the positions (in
+        ``df_in``) of the kept rows and the dropped-row counts.
+        """
+        columns = resolve_feature_columns(df_in.columns, self.serve_features)
+        n_in = len(df_in)
+
+        # 1) vectorised prefilter on raw values (only the default features count)
+        raw_nonnull = np.zeros(n_in, dtype=np.int16)
+        for f in self.features:
+            if columns[f] is not None:
+                raw_nonnull += df_in[columns[f]].notna().to_numpy()
+        cand = np.flatnonzero(raw_nonnull >= min_raw_nonnull)
+
+        # 2) coerce survivors only, then the exact count
+        X = build_feature_matrix(df_in, self.serve_features, columns, rows=cand if len(cand) < n_in else None)
+        keep = (~np.isnan(X[:, :len(self.features)])).sum(axis=1) >= min_raw_nonnull
+        rows = cand[keep]
+        if len(rows) == 0:
+            raise ValueError(
+                f"Nenhuma linha com informação suficiente (min_raw_nonnull={min_raw_nonnull})."
+            )
+        if len(rows) < len(X):
+            X = X[keep]
+        if impute:
+            impute_median(X)
+
+        stats = {
+            "rows_in": n_in,
+            "rows_prefiltered": n_in - len(cand),
+            "rows_dropped": n_in - len(rows),
+        }
+        return X, rows, stats
+
+    def parse_model_names(self, arg: Optional[str]) -> List[str]:
+        """Models requested as ``"a,b"`` (default model when empty)."""
+        names = [n.strip() for n in (arg or self.default).split(",") if n.strip()]
+        unknown = [n for n in names if n not in self.models]
+        if unknown:
+            raise ValueError(f"Modelos desconhecidos: {unknown}. Disponíveis: {list(self.models)}")
+        return names or [self.default]
+
+    def _cols(self, name, n_cols: int):
+        """Column indices of model ``name`` in the shared matrix (None: all of them, in order)."""
+        cols = self.models[name]["cols"]
+        return None if np.array_equal(cols, np.arange(n_cols)) else cols
+
+    def score(self, X: np.ndarray, names, df: Optional[pd.DataFrame] = None, rows=None,
+              timings: Optional[list] = None, n_jobs: Optional[int] = None,
+              dedupe: bool = True, stats: Optional[dict] = None) -> dict:
+        """
+        Score the same prepared matrix with every requested model, in parallel
+        threads.  Each model only sees its own columns (no copy when it uses
+        all of them, in order).
+
+        Pipeline models score the raw rows ``df.iloc[rows]`` (the rows kept by
+        ``prepare``) through their own preprocessor instead.
+
+        With ``enable_sharding``, matrices of ``shard_min_rows`` rows or more
+        are scored shard by shard in the process pool; the per-shard timings
+        are appended to ``timings`` when a list is given.  If the pool is
+        broken (a worker died), the request is scored in-process while the
+        pool restarts.
+
+        ``n_jobs`` sets the inference threads of this call; by default they are
+        leased from the ``set_thread_budget`` budget (if any) according to the
+        batch size, and split between the models scored side by side.
+
+        With ``dedupe`` (default) identical rows of ``X`` are scored once and
+        their probabilities scattered back to every copy; the number of rows
+        saved goes to ``stats["rows_collapsed"]`` when a dict is given.
+        Pipeline models score their own matrix and are not collapsed.
+        """
+        inverse = None
+        if stats is not None:
+            stats["rows_collapsed"] = 0
+        if dedupe and len(X) > 1:
+            Xu, inv = unique_rows(X)
+            if len(Xu) < len(X):
+                X, inverse = Xu, inv
+            if stats is not None:
+                stats["rows_collapsed"] = len(inv) - len(Xu)
+
+        scores = {}
+        if self._shards is not None and len(X) >= self.shard_min_rows:
+            sharded = [n for n in names if n in self._shards.specs]
+            if sharded:
+                try:
+                    scores, shard_times = self._shards.score(X, {n: self._cols(n, X.shape[1]) for n in sharded})
+                except BrokenProcessPool as e:
+                    print("[WARN] Pool de shards quebrado, reiniciando; scoring desta requisição no processo:", str(e))
+                    shard_times = []
+                if timings is not None:
+                    timings.extend(shard_times)
+
+        def _one(name, threads):
+            m = self.models[name]
+            with self._parallelism(threads):
+                if "pipeline" in m:
+                    if df is None:
+                        raise ValueError(f"Modelo '{name}' precisa das linhas originais (df).")
+                    raw = df if rows is None or len(rows) == len(df) else df.iloc[rows]
+                    return predict_positive(m["model"], m["pipeline"].matrix(raw))
+                cols = self._cols(name, X.shape[1])
+                return predict_positive(m["model"], X if cols is None else X[:, cols])
+
+        rest = [n for n in names if n not in scores]
+        if rest:
+            lease = self.budget.lease(len(X)) if self.budget is not None and n_jobs is None else nullcontext(n_jobs)
+            with lease as threads:
+                if len(rest) == 1 or (threads is not None and threads < len(rest)):
+                    # fewer threads than models: one model at a time, each with all of them
+                    for name in rest:
+                        scores[name] = _one(name, threads)
+                else:
+                    per_model = None if threads is None else threads // len(rest)
+                    scores.update(zip(rest, self._pool.map(lambda name: _one(name, per_model), rest)))
+        if inverse is None:
+            return {n: scores[n] for n in names}
+        # unique rows -> every original row
+        return {n: scores[n] if "pipeline" in self.models[n] else scores[n][inverse] for n in names}
+
+    @staticmethod
+    def combine(scores: dict, names, ensemble: bool) -> np.ndarray:
+        """Final probability: mean over models if ``ensemble``, else the first requested model."""
+        return np.mean([scores[n] for n in names], axis=0) if ensemble else scores[names[0]]
+
+    def result_frame(
+        self,
+        X: np.ndarray,
+        rows: np.ndarray,
+        index,
+        scores: dict,
+        names,
+        ensemble: bool = False,
+        top: Optional[int] = None,
+        include_index: bool = False,
+        prob_format: str = "percent",
+        prob_decimals: int = 8,
+        keep_float: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Rank rows by probability (highest first) and build the response table:
+        default features, optional ``orig_idx``, ``p_planet`` and, with several
+        models, one ``p_<name>`` column per model.  Only the returned rows are
+        turned into a DataFrame.
+        """
+        p1 = self.combine(scores, names, ensemble)
+        order = np.argsort(-p1, kind="stable")
+        if top is not None and top > 0:
+            order = order[:top]
+
+        out = pd.DataFrame(display_values(X[order, :len(self.features)]), columns=self.features)
+        if include_index:
+            out.insert(0, "orig_idx", index[rows[order]])
+        out["p_planet_float"] = p1[order]
+        model_cols = [f"p_{n}" for n in names] if len(names) > 1 else []
+        for n, col in zip(names, model_cols):
+            out[col] = scores[n][order]
+
+        out = format_prob_column(out, prob_format, prob_decimals, keep_float)
+        keep_cols = self.features + (["orig_idx"] if include_index else []) + (["p_planet"] + (["p_planet_float"] if keep_float else [])) + model_cols
+        return out[keep_cols]
+
+
+# ========= ingestion / serialisation =========
+CSV_CHUNK_BYTES = 8 << 20
+EXCEL_CHUNK_ROWS = 20_000
+CSV_OUT_CHUNK_ROWS = 50_000
+# corpos binários aceitos em /predict (Content-Type)
+ARROW_STREAM_MIMETYPES = ("application/vnd.apache.arrow.stream",)
+BINARY_BODY_KINDS = {
+    "application/vnd.apache.arrow.file": "feather",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+# sufixos de arquivos comprimidos -> Content-Encoding equivalente
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def _zstandard():
+    """The optional ``zstandard`` module (only needed for zstd bodies/uploads/responses)."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ValueError("Compressão zstd requer o pacote 'zstandard' (pip install zstandard).") from e
+    return zstandard
+
+
+def response_encodings() -> List[str]:
+    """Content-Encodings this server can produce, preferred first."""
+    try:
+        _zstandard()
+    except ValueError:
+        return ["gzip"]
+    return ["zstd", "gzip"]
+
+
+def split_compression(name: str):
+    """``"koi.csv.gz"`` -> (``"koi.csv"``, ``"gzip"``); uncompressed names get None."""
+    name = name or ""
+    for suffix, encoding in COMPRESSED_SUFFIXES.items():
+        if name.lower().endswith(suffix):
+            return name[: -len(suffix)], encoding
+    return name, None
+
+
+def decompress_stream(stream, encoding: Optional[str]):
+    """
+    File-like view of ``stream`` decompressed on the fly (``gzip`` or ``zstd``).
+
+    Nothing is buffered beyond the decompressor's window, so a compressed
+    upload is fed to the CSV parser without ever holding the whole
+    decompressed file.  ``None``/``"identity"`` return ``stream`` unchanged.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return stream
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if encoding == "zstd":
+        reader = _zstandard().ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        return io.BufferedReader(reader, buffer_size=1 << 20)
+    raise ValueError(f"Content-Encoding não suportado: {encoding}")
+
+
+def compress_chunks(chunks, encoding: str):
+    """Compress an iterable of str/bytes chunks incrementally, yielding compressed bytes."""
+    if encoding == "gzip":
+        comp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif encoding == "zstd":
+        comp = _zstandard().ZstdCompressor(level=3).compressobj()
+    else:
+        raise ValueError(f"Content-Encoding não suportado: {encoding}")
+    for chunk in chunks:
+        data = comp.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+class DecompressRequestMiddleware:
+    """
+    WSGI middleware decoding ``Content-Encoding: gzip|zstd`` request bodies.
+
+    The body is swapped for a decompressing stream before Flask parses it, so
+    JSON, multipart uploads and raw CSV bodies all work unchanged; an unknown
+    encoding is answered with 415.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding and encoding != "identity":
+            from werkzeug.wsgi import get_input_stream
+            try:
+                body = decompress_stream(get_input_stream(environ), encoding)
+            except ValueError as e:
+                start_response("415 Unsupported Media Type", [("Content-Type", "text/plain; charset=utf-8")])
+                return [str(e).encode("utf-8")]
+            # tamanho descomprimido é desconhecido: o corpo vai até o fim do stream
+            environ["wsgi.input"] = body
+            environ["wsgi.input_terminated"] = True
+            environ.pop("CONTENT_LENGTH", None)
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.app(environ, start_response)
+
+
+def _iter_line_chunks(stream, chunk_bytes: int = CSV_CHUNK_BYTES):
+    """Yield byte blocks of ``stream`` cut at line boundaries (never inside a quoted field)."""
+    carry = b""
+    while True:
+        block = stream.read(chunk_bytes)
+        if not block:
+            if carry.strip():
+                yield carry
+            return
+        buf = carry + block
+        cut = buf.rfind(b"\n") + 1
+        if cut == 0:
+            carry = buf
+            continue
+        piece, carry = buf[:cut], buf[cut:]
+        # odd number of quotes: the cut fell inside a quoted field, keep reading
+        if piece.count(b'"') % 2:
+            carry = piece + carry
+            continue
+        yield piece
+
+
+def _has_overlong_lines(piece: bytes, n_fields: int) -> bool:
+    """
+    True if some line of ``piece`` has more than ``n_fields`` fields, or if the
+    block contains quotes (field counting by commas would be unreliable).
+    """
+    if b'"' in piece:
+        return True
+    arr = np.frombuffer(piece, dtype=np.uint8)
+    newlines = np.flatnonzero(arr == ord("\n"))
+    commas = np.flatnonzero(arr == ord(","))
+    if len(commas) == 0:
+        return False
+    per_line = np.bincount(np.searchsorted(newlines, commas), minlength=len(newlines) + 1)
+    return bool((per_line >= n_fields).any())
+
+
+def _read_csv_header_line(stream) -> bytes:
+    """First line of ``stream`` that is neither blank nor a ``#`` comment (archive exports)."""
+    line = stream.readline()
+    while line and (not line.strip() or line.lstrip().startswith(b"#")):
+        line = stream.readline()
+    return line
+
+
+def sniff_columns(source, name: str = None) -> List[str]:
+    """
+    Column names of a CSV/XLSX/Parquet/Feather file, reading only its header
+    (or schema).  ``source`` is a path or a seekable binary file object; ``name``
+    defaults to the path and selects the format by extension.
+    """
+    kind = _table_kind(name if name is not None else str(source))
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+        names = pq.read_schema(source).names
+    elif kind == "feather":
+        import pyarrow.ipc as ipc
+        names = ipc.open_file(source).schema.names
+    elif kind == "arrow_stream":
+        import pyarrow.ipc as ipc
+        names = ipc.open_stream(source).schema.names
+    elif kind == "excel":
+        from openpyxl import load_workbook
+        wb = load_workbook(source, read_only=True, data_only=True)
+        try:
+            first = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            wb.close()
+        names = [c for c in first if c is not None]
+    else:
+        if hasattr(source, "read"):
+            header = _read_csv_header_line(source)
+        else:
+            with open(source, "rb") as f:
+                header = _read_csv_header_line(f)
+        names = pd.read_csv(io.BytesIO(header), skipinitialspace=True, nrows=0).columns.tolist()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return [str(c) for c in names]
+
+
+def _table_kind(name: str) -> str:
+    name = (name or "").lower()
+    if name.endswith(".parquet") or name.endswith(".pq"):
+        return "parquet"
+    if name.endswith(".feather") or name.endswith(".arrow"):
+        return "feather"
+    if name.endswith(".arrows"):
+        return "arrow_stream"
+    if name.endswith(".xlsx") or name.endswith(".xls"):
+        return "excel"
+    return "csv"
+
+
+def read_table(source, name: str = None, usecols_for=None) -> pd.DataFrame:
+    """
+    Read a table file parsing only the columns chosen by ``usecols_for(names)``.
+
+    The header/schema is sniffed first (``sniff_columns``), so wide archive
+    exports (100-300 columns) only pay for the handful of columns in use.  CSV
+    files skip ``#`` comment lines like ``pd.read_csv(comment="#")``.
+    """
+    kind = _table_kind(name if name is not None else str(source))
+    if kind == "arrow_stream":
+        # streams não têm schema separado: as colunas são escolhidas lote a lote
+        return read_arrow_stream(source, usecols_for=usecols_for)
+    names = sniff_columns(source, name)
+    usecols = usecols_for(names) if usecols_for is not None else None
+    if kind == "parquet":
+        return pd.read_parquet(source, columns=usecols)
+    if kind == "feather":
+        return pd.read_feather(source, columns=usecols)
+    if kind == "excel":
+        return read_excel_stream(source, usecols_for=usecols_for)
+    return pd.read_csv(source, comment="#", usecols=usecols)
+
+
+def iter_excel_chunks(source, usecols_for=None, chunk_rows: int = EXCEL_CHUNK_ROWS):
+    """
+    Stream the first sheet of an XLSX file as DataFrames of up to ``chunk_rows`` rows.
+
+    The workbook is opened read-only (openpyxl's row iterator over the sheet
+    XML, no cell DOM), so memory is bounded by one chunk of the selected
+    columns instead of the whole spreadsheet.  ``usecols_for(header_names)``
+    picks the columns to keep; cells of the other columns are never turned
+    into Python objects.  Blank rows are skipped, like ``pd.read_excel``.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        names = [str(c) for c in header if c is not None]
+        pos = [i for i, c in enumerate(header) if c is not None]
+        if usecols_for is not None:
+            keep = set(usecols_for(names))
+            pos, names = zip(*[(i, n) for i, n in zip(pos, names) if n in keep]) if keep else ((), ())
+        pos, names = list(pos), list(names)
+
+        buf, emitted = [], False
+        for row in rows:
+            # células vazias ("") viram NaN, como no pd.read_excel
+            vals = [row[i] if i < len(row) and row[i] != "" else None for i in pos]
+            if all(v is None for v in vals) and all(v is None or v == "" for v in row):
+                continue
+            buf.append(vals)
+            if len(buf) >= chunk_rows:
+                yield _excel_frame(buf, names)
+                buf, emitted = [], True
+        if buf or not emitted:
+            yield _excel_frame(buf, names)
+    finally:
+        wb.close()
+
+
+def _excel_frame(rows, names) -> pd.DataFrame:
+    """Rows of cell values -> DataFrame; all-empty columns become float NaN (as in ``pd.read_excel``)."""
+    df = pd.DataFrame(rows, columns=names)
+    empty = [c for c in df.columns if df[c].dtype == object and df[c].isna().all()]
+    if empty:
+        df[empty] = df[empty].astype(np.float64)
+    return df
+
+
+def read_excel_stream(source, usecols_for=None, chunk_rows: int = EXCEL_CHUNK_ROWS) -> pd.DataFrame:
+    """``iter_excel_chunks`` concatenated: the (narrow) table of the selected columns."""
+    frames = list(iter_excel_chunks(source, usecols_for, chunk_rows))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True).infer_objects()
+
+
+def read_arrow_stream(source, usecols_for=None) -> pd.DataFrame:
+    """
+    Read an Arrow IPC *stream* (path or binary file object) batch by batch.
+
+    Only the columns chosen by ``usecols_for(schema_names)`` are kept from each
+    record batch, and typed float/int columns arrive in pandas as numpy arrays,
+    ready for ``build_feature_matrix`` without any text parsing.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    if not hasattr(source, "read"):
+        with open(source, "rb") as f:
+            return read_arrow_stream(f, usecols_for)
+    reader = ipc.open_stream(source)
+    names = reader.schema.names
+    usecols = usecols_for(names) if usecols_for is not None else names
+    batches = [batch.select(usecols) for batch in reader]
+    schema = pa.schema([reader.schema.field(c) for c in usecols])
+    return pa.Table.from_batches(batches, schema=schema).to_pandas()
+
+
+def alias_usecols(alias_lists):
+    """``usecols_for`` callable keeping the columns resolved by each alias list (see ``resolve_column``)."""
+    def _usecols(names):
+        picked = {resolve_column(names, aliases) for aliases in alias_lists}
+        return [c for c in names if c in picked]
+    return _usecols
+
+
+def read_csv_fast(stream, usecols_for=None, chunk_bytes: int = CSV_CHUNK_BYTES):
+    """
+    Parse a CSV byte stream with pandas' C engine, block by block.
+
+    ``usecols_for(header_names)`` may return the subset of columns to keep.  With
+    ``usecols`` neither pandas engine detects lines with too many fields, so each
+    block is checked first (vectorised comma count); blocks with malformed lines
+    (or quotes) are re-parsed by the Python engine, which skips those lines just
+    like ``on_bad_lines="skip"`` did and counts them.  Short lines are padded
+    with NaN by both engines.
+
+    Returns (df, lines_skipped).
+    """
+    header = _read_csv_header_line(stream)
+    names = pd.read_csv(io.BytesIO(header), skipinitialspace=True, nrows=0).columns.tolist()
+    usecols = usecols_for(names) if usecols_for is not None else None
+
+    # empty row placed ahead of later malformed blocks, so their first line is never
+    # mistaken for an implicit index (only the file's real first line can be)
+    sentinel = b"," * (len(names) - 1) + b"\n"
+    frames, skipped = [], 0
+    for i, piece in enumerate(_iter_line_chunks(stream, chunk_bytes)):
+        if not _has_overlong_lines(piece, len(names)):
+            frames.append(pd.read_csv(
+                io.BytesIO(piece), header=None, names=names, index_col=False,
+                usecols=usecols, skipinitialspace=True, engine="c",
+            ))
+            continue
+        # malformed block: same parse as before (header + Python engine), counting skips
+        bad = []
+        df = pd.read_csv(
+            io.BytesIO(header + (sentinel if i else b"") + piece), skipinitialspace=True,
+            on_bad_lines=bad.append, engine="python",
+        )
+        if i:
+            df = df.iloc[1:]
+        skipped += len(bad)
+        frames.append(df if usecols is None else df[usecols])
+
+    if not frames:
+        return pd.DataFrame(columns=usecols if usecols is not None else names), skipped
+    return pd.concat(frames, ignore_index=True), skipped
+
+
+def json_loads(data):
+    """
+    Decode a JSON document with ``orjson`` when installed (stdlib ``json``
+    otherwise, or when the document uses ``NaN``/``Infinity``, which Python
+    clients emit and ``orjson`` rejects).
+    """
+    try:
+        import orjson
+    except ImportError:
+        return json.loads(data)
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+def _json_column(values):
+    """JSON array -> float64 array when it only holds numbers/null; otherwise left to pandas."""
+    arr = np.array(values)
+    if arr.ndim != 1:
+        return values
+    if arr.dtype.kind in "iuf":
+        return arr.astype(np.float64, copy=False)
+    if arr.dtype.kind == "O" and all(v is None or type(v) in (int, float) for v in values):
+        return np.array(values, dtype=np.float64)
+    return values
+
+
+def is_columnar(payload) -> bool:
+    """True for the columnar JSON layout: a non-empty object whose values are all arrays."""
+    return isinstance(payload, dict) and bool(payload) and all(isinstance(v, list) for v in payload.values())
+
+
+def unwrap_json(payload):
+    """The payload inside an optional ``{"data": ...}`` envelope."""
+    if isinstance(payload, dict) and "data" in payload:
+        return payload["data"]
+    return payload
+
+
+def is_bulk(payload) -> bool:
+    """True when ``frame_from_json`` reads ``payload`` as a batch (records or columnar) rather than one row."""
+    payload = unwrap_json(payload)
+    return isinstance(payload, list) or is_columnar(payload)
+
+
+def frame_from_json(payload, usecols_for=None) -> pd.DataFrame:
+    """
+    DataFrame from a decoded JSON payload.
+
+    Accepted layouts (optionally wrapped in ``{"data": ...}``):
+
+        records   ``[{"period_d": 3.5, ...}, ...]``
+        columnar  ``{"period_d": [3.5, ...], "planet_radius_re": [...], ...}``
+        single    ``{"period_d": 3.5, ...}`` (one row)
+
+    Columnar arrays map straight to NumPy columns (float64 when they only hold
+    numbers/null), skipping the per-record dict handling, and only the columns
+    chosen by ``usecols_for(names)`` are converted.
+    """
+    payload = unwrap_json(payload)
+    if isinstance(payload, list):
+        return pd.DataFrame(payload)
+    if not isinstance(payload, dict):
+        raise ValueError("JSON deve ser uma lista de registros ou um objeto (colunar ou registro único).")
+    if not is_columnar(payload):
+        return pd.DataFrame([payload])
+
+    names = list(payload)
+    if usecols_for is not None:
+        names = usecols_for(names)
+    if len({len(payload[c]) for c in payload}) > 1:
+        raise ValueError("JSON colunar com colunas de tamanhos diferentes.")
+    n = len(next(iter(payload.values())))
+    return pd.DataFrame({c: _json_column(payload[c]) for c in names}, index=pd.RangeIndex(n))
+
+
+def read_json_body(req, usecols_for=None) -> pd.DataFrame:
+    """``frame_from_json`` of a Flask request body (decoded with ``json_loads``)."""
+    data = req.get_data(cache=False)
+    if not data:
+        raise ValueError("Nenhum dado enviado no corpo da requisição.")
+    return frame_from_json(json_loads(data), usecols_for=usecols_for)
+
+
+def read_payload(req, usecols_for=None):
+    """
+    Read a Flask request into a DataFrame: multipart ``file`` (CSV/XLSX/Parquet/
+    Feather/Arrow, optionally ``.gz``/``.zst``), a raw ``text/csv``, Arrow IPC
+    stream or Parquet body, or JSON (records or columnar, see ``frame_from_json``).
+
+    Returns (df, info) where ``info["lines_skipped"]`` counts malformed CSV lines.
+    """
+    info = {"lines_skipped": 0}
+    if req.mimetype in ("text/csv", "application/csv"):
+        # corpo CSV cru (ex.: curl --data-binary @koi.csv.gz -H "Content-Encoding: gzip")
+        df, info["lines_skipped"] = read_csv_fast(req.stream, usecols_for=usecols_for)
+        return df, info
+    if req.mimetype in ARROW_STREAM_MIMETYPES:
+        # Arrow IPC stream: lotes lidos direto do corpo, colunas tipadas sem parse de texto
+        return read_arrow_stream(req.stream, usecols_for=usecols_for), info
+    if req.mimetype in BINARY_BODY_KINDS:
+        kind = BINARY_BODY_KINDS[req.mimetype]
+        return read_table(io.BytesIO(req.get_data()), "body." + kind, usecols_for=usecols_for), info
+    if "file" in req.files:
+        file = req.files["file"]
+        name, encoding = split_compression((file.filename or "").lower())
+        kind = _table_kind(name)
+        stream = decompress_stream(file.stream, encoding)
+        if encoding and kind != "csv":
+            # xlsx/parquet/feather precisam de acesso aleatório: descomprime em memória
+            stream = io.BytesIO(stream.read())
+        if kind == "excel":
+            # leitura em streaming (read-only), só com as colunas resolvidas
+            return read_excel_stream(stream, usecols_for=usecols_for), info
+        if kind == "arrow_stream":
+            return read_arrow_stream(stream, usecols_for=usecols_for), info
+        if kind in ("parquet", "feather"):
+            # formatos colunares: só as colunas resolvidas saem do arquivo
+            if not encoding:
+                stream = io.BytesIO(stream.read())
+            return read_table(stream, name, usecols_for=usecols_for), info
+        df, info["lines_skipped"] = read_csv_fast(stream, usecols_for=usecols_for)
+        return df, info
+    if req.is_json:
+        return read_json_body(req, usecols_for=usecols_for), info
+    raise ValueError(
+        "Envie um arquivo CSV/XLSX/Parquet/Feather/Arrow (opcionalmente .gz/.zst) em 'file', "
+        "um corpo text/csv, Arrow IPC stream ou Parquet, ou JSON válido."
+    )
+
+
+def display_values(X: np.ndarray) -> np.ndarray:
+    """
+    float32 -> float64 rounded to 7 significant digits, so responses show
+    0.348 rather than 0.3479999899864197.
+    """
+    X = X.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exp = np.floor(np.log10(np.abs(X)))
+    exp = np.where(np.isfinite(exp), exp, 0)
+    shift = 6 - exp
+    up = np.power(10.0, np.clip(shift, 0, None))
+    down = np.power(10.0, np.clip(-shift, 0, None))
+    return np.where(shift >= 0, np.rint(X * up) / up, np.rint(X / down) * down)
+
+
+def format_prob_column(out: pd.DataFrame, prob_format: str, prob_decimals: int, keep_float: bool):
+    """Turn ``p_planet_float`` (0..1) into the display column ``p_planet`` (percent string or rounded float)."""
+    if prob_format == "percent":
+        pct = (out["p_planet_float"] * 100).round(prob_decimals)
+        out["p_planet"] = pct.map(lambda x: f"{int(x)}%" if prob_decimals == 0 else f"{x:.{prob_decimals}f}%")
+    else:
+        out["p_planet"] = out["p_planet_float"].round(prob_decimals)
+    if not keep_float:
+        out.drop(columns=["p_planet_float"], inplace=True)
+    return out
+
+
+def iter_csv_chunks(out: pd.DataFrame, chunk_rows: int = CSV_OUT_CHUNK_ROWS):
+    """CSV text of a result table in row slices (header first), for streamed responses."""
+    for start in range(0, max(len(out), 1), chunk_rows):
+        yield out.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0)
+
+
+def to_csv_text(out: pd.DataFrame) -> str:
+    """Serialise a result table as CSV text (no index)."""
+    buf = io.StringIO()
+    out.to_csv(buf, index=False)
+    return buf.getvalue()
+
+
+# ========= evaluation =========
+def metrics_block(y_true, y_pred, y_score):
+    """(accuracy, balanced accuracy, AUC, F1(1), F1(0), MCC, confusion matrix)."""
+    acc = accuracy_score(y_true, y_pred)
+    bal = balanced_accuracy_score(y_true, y_pred)
+    try:
+        auc = roc_auc_score(y_true, y_score)
+    except Exception:
+        auc = float("nan")
+    f1p = f1_score(y_true, y_pred, pos_label=1)
+    f1n = f1_score(y_true, y_pred, pos_label=0)
+    mcc = matthews_corrcoef(y_true, y_pred)
+    cm = confusion_matrix(y_true, y_pred)
+    return acc, bal, auc, f1p, f1n, mcc, cm
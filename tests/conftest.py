@@ -0,0 +1,53 @@
+"""Shared fixtures: the repository root on sys.path and small synthetic catalogues."""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_k2(n: int, seed: int = 0) -> pd.DataFrame:
+    """K2-style export: pl_name ids, ra/dec/pl_orbper/pl_rade and a few stellar features."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "pl_name": [f"K2-{i} b" for i in range(n)],
+        "disposition": rng.choice(["CONFIRMED", "FALSE POSITIVE", "CANDIDATE"], n, p=[0.45, 0.35, 0.2]),
+        "ra": rng.uniform(0, 360, n),
+        "dec": rng.uniform(-30, 30, n),
+        "pl_orbper": np.exp(rng.uniform(np.log(0.5), np.log(100), n)),
+        "pl_rade": rng.uniform(0.5, 15, n),
+        "st_teff": rng.normal(5500, 600, n),
+        "st_logg": rng.normal(4.4, 0.2, n),
+        "pl_eqt": rng.normal(900, 300, n),
+        "sy_kmag": rng.normal(11, 1.5, n),
+    })
+
+
+def synthetic_toi_from(k2: pd.DataFrame, rows, seed: int = 1) -> pd.DataFrame:
+    """TOI-style export re-listing ``rows`` of ``k2`` (positions jittered ~0.5", periods 0.1%)."""
+    rng = np.random.default_rng(seed)
+    src = k2.iloc[rows].reset_index(drop=True)
+    n = len(src)
+    disp = src["disposition"].map({"CONFIRMED": "CP", "FALSE POSITIVE": "FP", "CANDIDATE": "PC"})
+    return pd.DataFrame({
+        "toi": np.arange(1000, 1000 + n) + 0.01,
+        "tfopwg_disp": disp,
+        "ra": src["ra"] + rng.normal(0, 0.5 / 3600, n),
+        "dec": src["dec"] + rng.normal(0, 0.5 / 3600, n),
+        "pl_orbper": src["pl_orbper"] * (1 + rng.normal(0, 0.001, n)),
+        "pl_rade": src["pl_rade"],
+        "st_teff": src["st_teff"] + rng.normal(0, 50, n),
+        "st_logg": src["st_logg"],
+        "pl_eqt": src["pl_eqt"],
+        "sy_kmag": src["sy_kmag"],
+    })
+
+
+@pytest.fixture
+def k2_catalogue():
+    return synthetic_k2(200)
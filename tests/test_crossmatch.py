@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from conftest import synthetic_k2, synthetic_toi_from
+from crossmatch import build_dedup_map, drop_duplicates
+from feature_store import load_combined
+from tratamentoD import process_dataset
+
+BASES = ["K2FULL", "TOIFULL"]
+
+
+def _two_catalogues(tmp_path):
+    """K2 with 10 planets listed twice (per reference) and a TOI re-listing 30 K2 planets, 5 of them repeated."""
+    k2 = synthetic_k2(200)
+    repeats = k2.iloc[:10].assign(pl_name=lambda d: d["pl_name"] + " (ref 2)")
+    k2 = pd.concat([k2, repeats], ignore_index=True)
+    toi = synthetic_toi_from(k2, np.arange(5, 35))
+    out = tmp_path / "processed"
+    for name, raw in zip(BASES, (k2, toi)):
+        csv = tmp_path / f"{name}.csv"
+        raw.to_csv(csv, index=False)
+        process_dataset(csv, out, null_cut=0.8, test_size=0.2, write_csv=False)
+    return out
+
+
+def test_default_matches_across_bases_only(tmp_path):
+    out = _two_catalogues(tmp_path)
+    dedup = build_dedup_map(out, BASES)
+
+    assert dedup["cross_only"]
+    # the 5 repeated planets pull both K2 listings into their group, but only the TOI row goes
+    assert dedup["n_groups"] == 30
+    assert sum(len(g) for g in dedup["groups"]) == 65
+    assert all({m[0] for m in g} == set(BASES) for g in dedup["groups"])
+
+    train, valid, cands = load_combined(out, BASES)
+    train2, valid2, cands2, dropped = drop_duplicates(dedup, BASES, train, valid, cands)
+    # labelled rows rank first and K2 before TOI: K2 train/valid are never thinned
+    for before, after in ((train, train2), (valid, valid2)):
+        assert (after["mission"] == "K2FULL").sum() == (before["mission"] == "K2FULL").sum()
+    assert sum(dropped.values()) == 30
+    per_split = {s: sum(c[s] for c in dedup["n_dropped"].values()) for s in dropped}
+    assert per_split == dropped
+
+
+def test_within_bases_is_opt_in(tmp_path):
+    out = _two_catalogues(tmp_path)
+    dedup = build_dedup_map(out, BASES, cross_only=False)
+
+    assert not dedup["cross_only"]
+    # the 10 K2 repeats now count too
+    assert dedup["n_groups"] == 35
+    assert dedup["n_duplicates"] == 40
+    assert sum(dedup["n_dropped"]["K2FULL"].values()) >= 10
@@ -0,0 +1,94 @@
+"""
+Regression test of the vectorised ``ExoPreprocessor._apply_imputation`` /
+``_int_like_values`` against the per-column loop they replaced.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from exo_preprocess import ExoPreprocessor
+
+SAMPLE_ROWS = 800
+
+
+def loop_apply_imputation(self, df_num: pd.DataFrame) -> pd.DataFrame:
+    """``_apply_imputation`` before vectorisation (one column at a time)."""
+    X = df_num.copy()
+    for c, med in (self.medians_int_ or {}).items():
+        if c in X.columns:
+            tmp = self._as_num(X[c])
+            tmp = tmp.fillna(med)
+            X[c] = np.floor(tmp + 0.5)
+    for c in X.columns:
+        if pd.api.types.is_numeric_dtype(X[c]):
+            mean = self.means_.get(c, np.nan)
+            X[c] = X[c].fillna(mean)
+    return X
+
+
+def _sample(name: str) -> pd.DataFrame:
+    path = os.path.join(ROOT, "datasets", name)
+    if not os.path.exists(path):
+        pytest.skip(f"{name} not available")
+    return pd.read_excel(path, nrows=SAMPLE_ROWS)
+
+
+def _koi_batch(raw: pd.DataFrame) -> pd.DataFrame:
+    """KOI rows with the int-like column stressed: NaN, text, half-integers, +-inf; one all-NaN column."""
+    batch = raw.copy()
+    plnt = batch["koi_tce_plnt_num"].astype(object)
+    plnt.iloc[0:40] = np.nan
+    plnt.iloc[40:60] = "3"
+    plnt.iloc[60:70] = "2,5"
+    plnt.iloc[70:75] = np.inf
+    plnt.iloc[75:80] = -np.inf
+    batch["koi_tce_plnt_num"] = plnt
+    batch["koi_impact"] = np.nan
+    return batch
+
+
+def _k2_batch(raw: pd.DataFrame) -> pd.DataFrame:
+    """K2 rows with an all-NaN column, int64 columns and a nullable (non-float64) column with gaps."""
+    batch = raw.copy()
+    batch["pl_orbper"] = np.nan
+    batch["st_teff"] = batch["st_teff"].astype("Float64")
+    batch.loc[batch.index[:25], "st_teff"] = pd.NA
+    return batch
+
+
+@pytest.mark.parametrize("name, make_batch", [("KOI.xlsx", _koi_batch), ("K2.xlsx", _k2_batch)])
+def test_transform_matches_loop_imputation(monkeypatch, name, make_batch):
+    raw = _sample(name)
+    pre = ExoPreprocessor().fit(raw)
+    batch = make_batch(raw)
+    assert batch[pre.kept_columns_].isna().all().any()   # an all-NaN kept column reaches the imputation
+
+    new, y_new, _ = pre.transform(batch)
+    monkeypatch.setattr(ExoPreprocessor, "_apply_imputation", loop_apply_imputation)
+    old, y_old, _ = pre.transform(batch)
+
+    pd.testing.assert_frame_equal(new, old)
+    pd.testing.assert_series_equal(y_new, y_old)
+
+
+def test_int_like_values_matches_text_parsing():
+    values = pd.Series([1.0, 2.4999, 2.5, np.nan, np.inf, -np.inf, -3.0, 1e6])
+    expected = ExoPreprocessor._as_num(values).to_numpy(dtype=np.float64, na_value=np.nan)
+    np.testing.assert_array_equal(ExoPreprocessor._int_like_values(values), expected)
+    for s in (values.astype("Float64"), pd.Series(["1", "2,5", None, "x"])):
+        np.testing.assert_array_equal(
+            ExoPreprocessor._int_like_values(s),
+            ExoPreprocessor._as_num(s).to_numpy(dtype=np.float64, na_value=np.nan),
+        )
+
+
+def test_koi_matrix_matches_frame_transform():
+    raw = _sample("KOI.xlsx")
+    pre = ExoPreprocessor().fit(raw)
+    batch = _koi_batch(raw)
+    frame, _, _ = pre.transform(batch)
+    np.testing.assert_array_equal(pre.transform_matrix(batch), frame.to_numpy(dtype=np.float64))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from conftest import synthetic_k2
+from crossmatch import attach_row_info
+from feature_store import load_combined
+from leaderboard import build_leaderboard, query_leaderboard
+from tratamentoD import process_dataset
+
+
+def _leaderboard(tmp_path, raw):
+    csv = tmp_path / "K2FULL.csv"
+    raw.to_csv(csv, index=False)
+    out = tmp_path / "processed"
+    process_dataset(csv, out, null_cut=0.8, test_size=0.2, write_csv=False)
+    _, _, cands = load_combined(out, ["K2FULL"])
+    cands = attach_row_info(out, ["K2FULL"], cands)
+    cands["probability"] = np.linspace(0.9, 0.1, len(cands))
+    db = tmp_path / "leaderboard.sqlite"
+    build_leaderboard(cands, db)
+    return db
+
+
+def test_radius_filter_returns_rows(tmp_path):
+    raw = synthetic_k2(200)
+    db = _leaderboard(tmp_path, raw)
+
+    expected = raw[(raw["disposition"] == "CANDIDATE") & raw["pl_rade"].between(1.0, 4.0)]
+    page = query_leaderboard(db, r_min=1.0, r_max=4.0, page_size=1000)
+    assert page["total"] == len(expected) > 0
+    assert all(1.0 <= it["planet_radius_re"] <= 4.0 for it in page["items"])
+
+
+def test_candidates_keep_raw_identifiers(tmp_path):
+    raw = synthetic_k2(200)
+    db = _leaderboard(tmp_path, raw)
+
+    page = query_leaderboard(db, page_size=1000)
+    ids = {it["object_id"] for it in page["items"]}
+    assert ids == set(raw.loc[raw["disposition"] == "CANDIDATE", "pl_name"])
+    # each id comes back with its own radius
+    radius = dict(zip(raw["pl_name"], raw["pl_rade"]))
+    assert all(np.isclose(it["planet_radius_re"], radius[it["object_id"]]) for it in page["items"])
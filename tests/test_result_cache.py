@@ -0,0 +1,35 @@
+import json
+import os
+import time
+
+from result_cache import ResultCache, iter_file
+
+
+def test_put_get_leaves_no_temporary_files(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=1 << 20)
+    cache.put("k", b"probability\n0.9\n", {"mimetype": "text/csv", "headers": {}})
+
+    meta, body = cache.get("k")
+    assert meta["mimetype"] == "text/csv"
+    assert b"".join(iter_file(body)) == b"probability\n0.9\n"
+    assert sorted(os.listdir(tmp_path)) == ["k.body", "k.json"]
+
+
+def test_only_stale_temporary_files_are_removed(tmp_path):
+    stale, fresh = tmp_path / "a.tmp", tmp_path / "b.tmp"
+    stale.write_bytes(b"crashed write")
+    fresh.write_bytes(b"write in flight")
+    old = time.time() - 2 * 3600
+    os.utime(stale, (old, old))
+
+    ResultCache(tmp_path, max_bytes=1 << 20, stale_tmp_s=3600)
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_entries_survive_a_restart(tmp_path):
+    ResultCache(tmp_path).put("k", b"[]", {"mimetype": "application/json", "headers": {}, "size": 2})
+    cache = ResultCache(tmp_path)
+    meta, body = cache.get("k")
+    body.close()
+    assert meta == json.loads((tmp_path / "k.json").read_text())
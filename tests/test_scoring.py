@@ -0,0 +1,21 @@
+import pytest
+
+from scoring import frame_from_json, is_bulk, is_columnar
+
+
+@pytest.mark.parametrize("payload, columnar, bulk, rows", [
+    ({"period_d": [3.5, 10.0], "planet_radius_re": [1.2, None]}, True, True, 2),
+    ({"period_d": 3.5, "planet_radius_re": 1.2}, False, False, 1),
+    # a list-valued field in a single record does not make it columnar
+    ({"period_d": [3.5], "planet_radius_re": 1.2}, False, False, 1),
+    ({}, False, False, 1),
+    ([{"period_d": 3.5}, {"period_d": 10.0}], False, True, 2),
+    # the {"data": ...} envelope is looked through
+    ({"data": [{"period_d": 3.5}, {"period_d": 10.0}]}, True, True, 2),
+    ({"data": {"period_d": [3, 4], "snr": [10, 1], "duration_h": [2, 2]}}, False, True, 2),
+    ({"data": {"period_d": 3.5}}, False, False, 1),
+])
+def test_bulk_check_agrees_with_frame_from_json(payload, columnar, bulk, rows):
+    assert is_columnar(payload) is columnar
+    assert is_bulk(payload) is bulk
+    assert len(frame_from_json(payload)) == rows
@@ -0,0 +1,46 @@
+import os
+import signal
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from scoring import ScoringCore
+
+FEATURES = ["period_d", "planet_radius_re", "stellar_teff_k"]
+
+
+@pytest.fixture
+def sharded_core(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, len(FEATURES))).astype(np.float32)
+    rf = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, X[:, 0] > 0)
+    path = tmp_path / "rf.pkl"
+    joblib.dump(rf, path)
+    core = ScoringCore(FEATURES, {"rf": {"model": rf, "path": str(path), "features": FEATURES}})
+    core.enable_sharding(workers=1, shard_rows=100, min_rows=100)
+    yield core, X
+    core._shards.close()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_dead_worker_falls_back_in_process_and_restarts(sharded_core):
+    core, X = sharded_core
+    expected = core.models["rf"]["model"].predict_proba(X)[:, 1]
+
+    for pid in list(core._shards._pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    timings = []
+    scores = core.score(X, ["rf"], timings=timings, dedupe=False)
+    assert timings == []                         # scored in-process
+    np.testing.assert_allclose(scores["rf"], expected)
+
+    deadline = time.monotonic() + 60
+    while core._shards.restarts == 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert core._shards.restarts == 1
+    scores = core.score(X, ["rf"], timings=timings, dedupe=False)
+    assert timings                               # back on the pool
+    np.testing.assert_allclose(scores["rf"], expected)
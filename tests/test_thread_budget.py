@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+from scoring import ScoringCore
+
+threadpoolctl = pytest.importorskip("threadpoolctl")
+FEATURES = ["period_d", "planet_radius_re"]
+
+
+def _openmp_threads():
+    return [i["num_threads"] for i in threadpoolctl.threadpool_info() if i["user_api"] == "openmp"]
+
+
+def test_openmp_limit_follows_the_lease_of_each_thread():
+    X = np.random.default_rng(0).random((200, 2)).astype(np.float32)
+    hgb = HistGradientBoostingClassifier(max_iter=5).fit(X, X[:, 0] > 0.5)
+    core = ScoringCore(FEATURES, {"hgb": {"model": hgb, "path": "hgb.pkl", "features": FEATURES}}, default="hgb")
+    core.set_thread_budget(4)
+    if not _openmp_threads():
+        pytest.skip("no OpenMP runtime loaded")
+
+    inside, leased = [], threading.Event()
+    release = threading.Event()
+
+    def request():
+        with core._parallelism(2):
+            inside.extend(_openmp_threads())
+            leased.set()
+            release.wait(10)
+
+    t = threading.Thread(target=request)
+    t.start()
+    leased.wait(10)
+    try:
+        # a lease in one request thread leaves the others at the budget default
+        assert set(inside) == {2}
+        assert set(_openmp_threads()) == {4}
+    finally:
+        release.set()
+        t.join()
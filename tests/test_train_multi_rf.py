@@ -0,0 +1,45 @@
+import sys
+
+import pytest
+
+import train_multi_rf
+from conftest import synthetic_k2
+from tratamentoD import process_dataset
+
+
+def _train(monkeypatch, *extra):
+    argv = ["train_multi_rf.py", "--processed_dir", "processed", "--base_names", "K2FULL",
+            "--cv", "2", "--n_iter", "1", "--skip_if_unchanged", *extra]
+    monkeypatch.setattr(sys, "argv", argv)
+    train_multi_rf.main()
+
+
+@pytest.fixture
+def processed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    synthetic_k2(200).to_csv("K2FULL.csv", index=False)
+    process_dataset(tmp_path / "K2FULL.csv", tmp_path / "processed", null_cut=0.8, test_size=0.2, write_csv=False)
+    return tmp_path
+
+
+def test_skip_only_when_outputs_match(processed, monkeypatch, capsys):
+    _train(monkeypatch)
+    assert (processed / "artifacts" / "leaderboard.sqlite").exists()
+
+    _train(monkeypatch)
+    assert "[SKIP]" in capsys.readouterr().out
+
+    # asking for a saved model (or another leaderboard) is a different run
+    _train(monkeypatch, "--save_model")
+    assert "[SKIP]" not in capsys.readouterr().out
+    assert list((processed / "artifacts").glob("rf_K2FULL_*.pkl"))
+
+    _train(monkeypatch, "--save_model", "--leaderboard_path", "other.sqlite")
+    assert "[SKIP]" not in capsys.readouterr().out
+    assert (processed / "other.sqlite").exists()
+
+    # a deleted output is written again
+    (processed / "other.sqlite").unlink()
+    _train(monkeypatch, "--save_model", "--leaderboard_path", "other.sqlite")
+    assert "[SKIP]" not in capsys.readouterr().out
+    assert (processed / "other.sqlite").exists()
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 """
-Train a RandomForest classifier across multiple exoplanet missions (KOI, K2, TOI).
+Train a RandomForest (or histogram gradient boosting) classifier across
+multiple exoplanet missions (KOI, K2, TOI).
 
 This script expects that each mission has been preprocessed by ``ExoPreprocessor``
-and saved into a ``processed/`` directory as ``<BASE>_train.csv``,
-``<BASE>_valid.csv`` and ``<BASE>_candidates.csv``.  The names ``BASE``
-should correspond to the raw CSV filenames without extension (e.g., ``KOIFULL``).
+(``tratamentoD.py``) into a ``processed/`` directory.  The splits are read from
+the typed feature store there (``feature_store.json`` + memory-mapped ``.npy``
+blocks, see ``feature_store.py``); directories holding only
+``<BASE>_train.csv``, ``<BASE>_valid.csv`` and ``<BASE>_candidates.csv`` are
+still read as CSV.  The names ``BASE`` should correspond to the raw CSV
+filenames without extension (e.g., ``KOIFULL``).
 
 The script performs the following steps:
 
@@ -15,8 +19,11 @@ The script performs the following steps:
    constructed, and any mission-specific columns that do not appear in a
    particular base will be filled with the global median.
 
-2. Train a RandomForestClassifier using RandomizedSearchCV over a grid
-   of hyperparameters with stratified k-fold cross-validation.  The
+2. Train a RandomForestClassifier (``--engine rf``, default) or a
+   HistGradientBoostingClassifier (``--engine hgb``: binned features, far
+   fewer and shallower trees, smaller artifacts and faster inference) using
+   RandomizedSearchCV over a grid of hyperparameters with stratified k-fold
+   cross-validation.  The
    training labels only include the binary classes (0 = false positive,
    1 = confirmed planet); candidate objects (label = 2) are excluded
    from the fit.
@@ -27,7 +34,9 @@ The script performs the following steps:
    domain‑shift issues.
 
 4. Rank the candidate objects from all missions by predicted
-   probability of being a true planet and print the top 10.
+   probability of being a true planet, print the top 10 and rebuild the
+   persisted leaderboard (``artifacts/leaderboard.sqlite``) served by the
+   backend's ``/leaderboard`` endpoint.
 
 5. Optionally save the trained model to an ``artifacts/`` directory
    with a timestamped filename.
@@ -35,6 +44,20 @@ The script performs the following steps:
 Example usage:
 
     python train_multi_rf.py --base_names KOIFULL,K2FULL,TOIFULL --save_model
+    python train_multi_rf.py --base_names KOIFULL,K2FULL --engine hgb --save_model
+
+Objects listed by more than one mission (cross-matched on the sky by
+``tratamentoD.py``, see ``crossmatch.py``) are kept once: the duplicate rows
+named in ``processed/dedup_map.json`` are dropped before training, so the same
+planet cannot land in train under one mission and in valid under another, and
+a candidate is ranked once (its other listings go to the leaderboard's
+``also_in``).  ``--keep_duplicates`` disables this.
+
+After an incremental ``tratamentoD.py`` run, ``--skip_if_unchanged`` makes the
+script exit early when none of the selected bases was refreshed since the
+last training on the same directory with the same arguments (including
+``--save_model`` and ``--leaderboard_path``) and the model and leaderboard that
+run wrote are still on disk.
 
 Requirements:
     - pandas
@@ -49,29 +72,26 @@ Author: ChatGPT (modified for multi-mission training)
 from __future__ import annotations
 
 import argparse
+import json
+import os
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 import numpy as np
 import joblib
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
 from sklearn.model_selection import StratifiedKFold, RandomizedSearchCV
-from sklearn.metrics import accuracy_score, balanced_accuracy_score, roc_auc_score, f1_score, matthews_corrcoef, confusion_matrix
+
+from crossmatch import attach_row_info, drop_duplicates, has_sky, load_dedup_map
+from feature_store import has_bases, load_combined
+from leaderboard import build_leaderboard
+from scoring import metrics_block, predict_positive
 
 
 def compute_metrics(y_true: pd.Series, y_score: np.ndarray, threshold: float = 0.5) -> dict:
     """Compute evaluation metrics given true labels and predicted probabilities."""
     y_pred = (y_score >= threshold).astype(int)
-    acc = accuracy_score(y_true, y_pred)
-    bal = balanced_accuracy_score(y_true, y_pred)
-    try:
-        auc = roc_auc_score(y_true, y_score)
-    except Exception:
-        auc = float("nan")
-    f1p = f1_score(y_true, y_pred, pos_label=1)
-    f1n = f1_score(y_true, y_pred, pos_label=0)
-    mcc = matthews_corrcoef(y_true, y_pred)
-    cm = confusion_matrix(y_true, y_pred)
+    acc, bal, auc, f1p, f1n, mcc, cm = metrics_block(y_true, y_pred, y_score)
     return {
         "accuracy": acc,
         "balanced_accuracy": bal,
@@ -118,8 +138,160 @@ def train_random_forest(
     return search.best_estimator_
 
 
+def train_hist_gradient_boosting(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    cv_splits: int = 5,
+    n_iter: int = 20,
+    random_state: int = 42,
+) -> HistGradientBoostingClassifier:
+    """Train a HistGradientBoostingClassifier using RandomizedSearchCV (NaN handled natively)."""
+    base_clf = HistGradientBoostingClassifier(
+        class_weight="balanced",
+        random_state=random_state,
+    )
+    param_dist = {
+        "max_iter": [100, 200, 300, 500],
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [10, 20, 50],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    }
+    cv = StratifiedKFold(n_splits=cv_splits, shuffle=True, random_state=random_state)
+    search = RandomizedSearchCV(
+        estimator=base_clf,
+        param_distributions=param_dist,
+        n_iter=n_iter,
+        scoring="roc_auc",
+        cv=cv,
+        random_state=random_state,
+        n_jobs=-1,
+        verbose=1,
+    )
+    search.fit(X_train, y_train)
+    return search.best_estimator_
+
+
+ENGINES = {
+    "rf": train_random_forest,
+    "hgb": train_hist_gradient_boosting,
+}
+
+
+def load_csv_splits(processed_dir: Path, bases: list[str]):
+    """Read and concatenate the CSV splits of ``bases`` (directories without a feature store)."""
+    train_dfs: list[pd.DataFrame] = []
+    valid_dfs: list[pd.DataFrame] = []
+    cand_dfs: list[pd.DataFrame] = []
+
+    # Load train/valid/candidate datasets for each base
+    for base in bases:
+        train_path = processed_dir / f"{base}_train.csv"
+        valid_path = processed_dir / f"{base}_valid.csv"
+        cand_path  = processed_dir / f"{base}_candidates.csv"
+        if not train_path.exists() or not valid_path.exists() or not cand_path.exists():
+            raise FileNotFoundError(f"Missing processed files for base {base} in {processed_dir}")
+        train_df = pd.read_csv(train_path)
+        valid_df = pd.read_csv(valid_path)
+        cand_df  = pd.read_csv(cand_path)
+        train_df['mission'] = base  # track mission
+        valid_df['mission'] = base
+        cand_df['mission'] = base
+        train_dfs.append(train_df)
+        valid_dfs.append(valid_df)
+        cand_dfs.append(cand_df)
+
+    # Combine datasets
+    combined_train = pd.concat(train_dfs, axis=0, ignore_index=True, sort=False)
+    combined_valid = pd.concat(valid_dfs, axis=0, ignore_index=True, sort=False)
+    combined_cand  = pd.concat(cand_dfs, axis=0, ignore_index=True, sort=False)
+    return combined_train, combined_valid, combined_cand
+
+
+TRAIN_STATE = "train_state.json"
+
+
+def write_serving_sidecar(model_path: Path, processed_dir: Path, bases: list[str], feature_cols, median_vals):
+    """
+    Write ``<model>.preprocess.json`` next to a saved model: the fitted
+    ``ExoPreprocessor`` of each base plus the training column union and medians,
+    so the backend can score raw catalogue rows exactly like the candidates here.
+    Returns the path, or None if some base has no ``<BASE>_preprocessor.json``.
+    """
+    preprocessors = {}
+    for base in bases:
+        path = processed_dir / f"{base}_preprocessor.json"
+        if not path.exists():
+            print(f"[WARN] {path} not found; rerun tratamentoD.py to serve this model from raw rows.")
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            preprocessors[base] = json.load(f)
+    sidecar = {
+        "version": 1,
+        "bases": bases,
+        "feature_cols": list(feature_cols),
+        "median_vals": [None if pd.isna(median_vals[c]) else float(median_vals[c]) for c in feature_cols],
+        "preprocessors": preprocessors,
+    }
+    out_path = model_path.with_suffix(".preprocess.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False)
+    return out_path
+
+
+def input_fingerprints(processed_dir: Path, bases: list[str]) -> dict:
+    """Build fingerprint of each base, as recorded by tratamentoD.py in ``<BASE>_meta.json`` (None if unknown)."""
+    fps = {}
+    for base in bases:
+        meta_path = processed_dir / f"{base}_meta.json"
+        fp = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                fp = json.load(f).get("fingerprint")
+        fps[base] = fp
+    return fps
+
+
+def report_build_state(processed_dir: Path, bases: list[str]) -> None:
+    """Print which of the selected bases the last tratamentoD.py run refreshed."""
+    path = processed_dir / "build_state.json"
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    refreshed = [b for b in bases if b in state.get("refreshed", [])]
+    print(f"[INFO] Last preprocessing ({state.get('built_at')}) refreshed: {', '.join(refreshed) or 'none of the selected bases'}")
+
+
+def outputs_present(last: dict) -> bool:
+    """Whether the model (if one was saved) and the leaderboard of a recorded run still exist."""
+    for path in (last.get("model_path"), last.get("leaderboard")):
+        if path and not Path(path).exists():
+            return False
+    return True
+
+
+def load_train_state(processed_dir: Path) -> dict:
+    path = processed_dir / TRAIN_STATE
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_train_state(processed_dir: Path, state: dict) -> None:
+    with open(processed_dir / TRAIN_STATE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
 def main():
-    parser = argparse.ArgumentParser(description="Train a RandomForest across multiple missions and save the model.")
+    parser = argparse.ArgumentParser(description="Train a RandomForest or HistGradientBoosting model across multiple missions and save it.")
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="rf",
+        help="Estimator: rf (RandomForest, default) or hgb (HistGradientBoosting).",
+    )
     parser.add_argument(
         "--processed_dir",
         type=str,
@@ -155,6 +327,25 @@ def main():
         action="store_true",
         help="If set, save the trained model to an artifacts directory.",
     )
+    parser.add_argument(
+        "--leaderboard_path",
+        type=str,
+        default="artifacts/leaderboard.sqlite",
+        help="Where to write the candidate leaderboard (default: artifacts/leaderboard.sqlite).",
+    )
+    parser.add_argument(
+        "--skip_if_unchanged",
+        action="store_true",
+        help=(
+            "Skip training when the selected bases and training arguments are the same "
+            "as in the last run on this processed directory."
+        ),
+    )
+    parser.add_argument(
+        "--keep_duplicates",
+        action="store_true",
+        help="Ignore processed/dedup_map.json and keep cross-mission duplicates.",
+    )
     args = parser.parse_args()
 
     # Parse bases and ensure directory exists
@@ -163,31 +354,61 @@ def main():
     if not processed_dir.is_dir():
         raise FileNotFoundError(f"Processed directory '{processed_dir}' does not exist.")
 
-    train_dfs: list[pd.DataFrame] = []
-    valid_dfs: list[pd.DataFrame] = []
-    cand_dfs: list[pd.DataFrame] = []
-
-    # Load train/valid/candidate datasets for each base
-    for base in bases:
-        train_path = processed_dir / f"{base}_train.csv"
-        valid_path = processed_dir / f"{base}_valid.csv"
-        cand_path  = processed_dir / f"{base}_candidates.csv"
-        if not train_path.exists() or not valid_path.exists() or not cand_path.exists():
-            raise FileNotFoundError(f"Missing processed files for base {base} in {processed_dir}")
-        train_df = pd.read_csv(train_path)
-        valid_df = pd.read_csv(valid_path)
-        cand_df  = pd.read_csv(cand_path)
-        train_df['mission'] = base  # track mission
-        valid_df['mission'] = base
-        cand_df['mission'] = base
-        train_dfs.append(train_df)
-        valid_dfs.append(valid_df)
-        cand_dfs.append(cand_df)
-
-    # Combine datasets
-    combined_train = pd.concat(train_dfs, axis=0, ignore_index=True, sort=False)
-    combined_valid = pd.concat(valid_dfs, axis=0, ignore_index=True, sort=False)
-    combined_cand  = pd.concat(cand_dfs, axis=0, ignore_index=True, sort=False)
+    # Which bases did the last preprocessing refresh?  With --skip_if_unchanged,
+    # stop here if none of the inputs (nor the training arguments) changed.
+    report_build_state(processed_dir, bases)
+    inputs = input_fingerprints(processed_dir, bases)
+
+    # The dedup map names rows by position: it only applies to the splits it was built from
+    dedup = None if args.keep_duplicates else load_dedup_map(processed_dir)
+    if dedup is not None:
+        stale = [b for b in bases if inputs[b] is None or dedup.get("inputs", {}).get(b) != inputs[b]]
+        if stale:
+            print(f"[WARN] {processed_dir / 'dedup_map.json'} is out of date for {', '.join(stale)} "
+                  "(rerun tratamentoD.py); cross-mission duplicates are kept.")
+            dedup = None
+
+    run_key = ",".join(bases)
+    run_record = {
+        "inputs": inputs,
+        # every argument that changes what gets written (split parameters are in the inputs)
+        "args": {
+            "engine": args.engine, "cv": args.cv, "n_iter": args.n_iter, "threshold": args.threshold,
+            "save_model": args.save_model, "leaderboard_path": os.path.abspath(args.leaderboard_path),
+        },
+        "dedup": dedup["fingerprint"] if dedup else None,
+    }
+    train_state = load_train_state(processed_dir)
+    if args.skip_if_unchanged:
+        last = train_state.get(run_key)
+        known = all(run_record["inputs"].values())
+        if known and last and {k: last.get(k) for k in run_record} == run_record and outputs_present(last):
+            print(f"[SKIP] Inputs of {run_key} unchanged since the last training ({last.get('trained_at')}); nothing to do.")
+            return
+
+    if has_bases(processed_dir, bases):
+        # Typed feature store written by tratamentoD.py: memory-mapped blocks,
+        # already aligned on the column union, nothing to parse
+        combined_train, combined_valid, combined_cand = load_combined(processed_dir, bases)
+        print(f"[INFO] Loaded {', '.join(bases)} from the feature store in {processed_dir}")
+    else:
+        combined_train, combined_valid, combined_cand = load_csv_splits(processed_dir, bases)
+
+    # Raw planet radius and identifiers of the candidates: the preprocessor drops
+    # them from the features, but the leaderboard filters and shows them
+    if all(has_sky(processed_dir, b) for b in bases):
+        combined_cand = attach_row_info(processed_dir, bases, combined_cand)
+    else:
+        print(f"[WARN] Some of {', '.join(bases)} have no current <BASE>_sky.npz (rerun tratamentoD.py); "
+              "the leaderboard will have no planet radius.")
+
+    # One row per cross-mission duplicate group (labelled rows win over candidates)
+    if dedup is not None:
+        combined_train, combined_valid, combined_cand, dropped = drop_duplicates(
+            dedup, bases, combined_train, combined_valid, combined_cand
+        )
+        print(f"[INFO] Cross-mission duplicates dropped: {dropped['train']} train, "
+              f"{dropped['valid']} valid, {dropped['candidates']} candidates")
 
     # Identify feature columns (exclude 'label' and 'object_id' and 'mission')
     feature_cols = [c for c in combined_train.columns if c not in ("label", "object_id", "mission")]
@@ -200,7 +421,7 @@ def main():
     y_valid = combined_valid['label']
 
     # Train model
-    model = train_random_forest(
+    model = ENGINES[args.engine](
         X_train, y_train,
         cv_splits=args.cv,
         n_iter=args.n_iter
@@ -210,7 +431,7 @@ def main():
     print(model.get_params())
 
     # Evaluate combined validation set
-    probs_valid = model.predict_proba(X_valid)[:, 1]
+    probs_valid = predict_positive(model, X_valid)
     metrics = compute_metrics(y_valid, probs_valid, threshold=args.threshold)
     print("\nValidation metrics (combined):")
     for k, v in metrics.items():
@@ -224,7 +445,7 @@ def main():
     for base in bases:
         mask = combined_valid['mission'] == base
         if mask.any():
-            probs_sub = model.predict_proba(X_valid.loc[mask])[:, 1]
+            probs_sub = predict_positive(model, X_valid.loc[mask])
             metrics_sub = compute_metrics(y_valid.loc[mask], probs_sub, threshold=args.threshold)
             print(f"Mission {base}:")
             for k, v in metrics_sub.items():
@@ -233,12 +454,13 @@ def main():
                 else:
                     print(f"  {k}: {v:.4f}")
 
-    # Feature importance (global)
-    importances = model.feature_importances_
-    gini_table = sorted(zip(feature_cols, importances), key=lambda x: -x[1])
-    print("\nTop 20 features by Gini importance (combined features):")
-    for f, imp in gini_table[:20]:
-        print(f"  {f:30s} {imp:.6f}")
+    # Feature importance (global; gradient boosting exposes none)
+    if hasattr(model, "feature_importances_"):
+        importances = model.feature_importances_
+        gini_table = sorted(zip(feature_cols, importances), key=lambda x: -x[1])
+        print("\nTop 20 features by Gini importance (combined features):")
+        for f, imp in gini_table[:20]:
+            print(f"  {f:30s} {imp:.6f}")
 
     # Rank candidate objects across all missions.  Only features present in the
     # training set are used for scoring; mission- or candidate-specific columns
@@ -248,7 +470,7 @@ def main():
         # Align candidate features to union of training features
         cand_X = combined_cand.reindex(columns=feature_cols, fill_value=np.nan)
         cand_X = cand_X.fillna(median_vals)
-        cand_probs = model.predict_proba(cand_X)[:, 1]
+        cand_probs = predict_positive(model, cand_X)
         combined_cand['probability'] = cand_probs
         cand_sorted = combined_cand.sort_values(by='probability', ascending=False)
         print("\nTop 10 candidate objects across all selected bases:")
@@ -264,14 +486,36 @@ def main():
             print(cand_sorted[cols_to_display + ['probability']].head(10).to_string(index=False))
 
     # Save model if requested
+    model_name = model_path = None
     if args.save_model:
         out_dir = Path('artifacts')
         out_dir.mkdir(exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        model_name = f"rf_{'_'.join(bases)}_{timestamp}.pkl"
+        model_name = f"{args.engine}_{'_'.join(bases)}_{timestamp}.pkl"
         model_path = out_dir / model_name
         joblib.dump(model, model_path)
         print(f"\n[OK] Model saved to: {model_path}")
+        sidecar = write_serving_sidecar(model_path, processed_dir, bases, feature_cols, median_vals)
+        if sidecar:
+            print(f"[OK] Serving preprocessor saved to: {sidecar}")
+
+    # Rebuild the persisted leaderboard so the backend can serve the ranking
+    # without re-scoring candidates.
+    leaderboard = None
+    if not combined_cand.empty:
+        n_rows = build_leaderboard(combined_cand, args.leaderboard_path, model_name=model_name)
+        leaderboard = os.path.abspath(args.leaderboard_path)
+        print(f"[OK] Leaderboard with {n_rows} candidates written to: {args.leaderboard_path}")
+
+    # Remember what this run was trained on (used by --skip_if_unchanged)
+    train_state[run_key] = {
+        **run_record,
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "model": model_name,
+        "model_path": os.path.abspath(model_path) if model_path else None,
+        "leaderboard": leaderboard,
+    }
+    save_train_state(processed_dir, train_state)
 
 
 if __name__ == "__main__":
@@ -34,6 +34,32 @@ Exemplo completo:
 Isso gerará arquivos como ``processed/KOIFULL_train.csv``,
 ``processed/K2FULL_valid.csv``, etc. (um trio para cada base) e um
 ``*_meta.json`` com metadados úteis (colunas mantidas, tamanhos, etc.).
+O estado ajustado do ``ExoPreprocessor`` (colunas, médias e medianas) vai para
+``*_preprocessor.json``, para que o backend aplique a mesma transformação.
+Os mesmos splits também vão para o feature store binário
+(``processed/feature_store.json`` + blocos ``.npy``, ver ``feature_store.py``),
+alinhados na união de colunas de todas as bases; é ele que o
+``train_multi_rf.py`` lê.  Com ``--no_csv`` só o feature store é gravado.
+
+Colunas brutas que o ``ExoPreprocessor`` descarta das features, mas que o
+cruzamento e o leaderboard usam (posição no céu ``ra``/``dec``, período, raio
+do planeta e identificador), vão para ``<BASE>_sky.npz``, linha a linha.
+
+Duplicatas entre missões (a mesma estrela/planeta no KOI, K2 e TOI): ao final,
+todas as bases são cruzadas (KD-tree de vetores unitários + tolerância de
+período, ver ``crossmatch.py``) e os grupos de duplicatas vão para
+``processed/dedup_map.json``, usado pelo ``train_multi_rf.py`` e pelo
+leaderboard; as linhas que sairiam de cada split são impressas por base.  Só
+linhas de bases diferentes são casadas: dentro de uma base o split treino/valid
+já foi feito, e o K2 repete planetas (uma linha por referência), então casar
+dentro dela esvaziaria a validação.  ``--within_bases`` casa também essas
+linhas.  ``--match_arcsec`` e ``--period_rtol`` ajustam o casamento;
+``--no_crossmatch`` pula a etapa.
+
+Builds são incrementais: o ``*_meta.json`` guarda o SHA-256 do arquivo bruto,
+os parâmetros do ``ExoPreprocessor`` e o hash de ``exo_preprocess.py``; bases
+cujas entradas não mudaram são puladas (``--force`` refaz tudo).  As bases
+refeitas em cada execução ficam em ``processed/build_state.json``.
 
 Autor: ChatGPT
 """
@@ -41,12 +67,69 @@ Autor: ChatGPT
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+from datetime import datetime
 from pathlib import Path
 import pandas as pd
+from crossmatch import (DEDUP_MAP, DEFAULT_PERIOD_RTOL, DEFAULT_RADIUS_ARCSEC, build_dedup_map,
+                        has_sky, sky_frame, write_sky)
 from exo_preprocess import ExoPreprocessor
+from feature_store import has_bases, read_schema, write_base
+
+# estado do último build (bases refeitas/puladas), lido pelo train_multi_rf.py
+BUILD_STATE = "build_state.json"
+
+
+def file_sha256(path: Path, chunk_bytes: int = 1 << 20) -> str:
+    """Hash SHA-256 de um arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_fingerprint(raw_sha256: str, null_cut: float, test_size: float, random_state: int) -> dict:
+    """Tudo o que determina a saída de uma base: arquivo bruto, parâmetros e código do pré-processador."""
+    params = {
+        "raw_sha256": raw_sha256,
+        "null_pct_cut": null_cut,
+        "test_size": test_size,
+        "random_state": random_state,
+        "preprocessor_sha256": file_sha256(Path(__file__).with_name("exo_preprocess.py")),
+    }
+    params["fingerprint"] = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return params
 
 
+def is_up_to_date(out_dir: Path, base: str, fingerprint: str, write_csv: bool) -> bool:
+    """True se ``<BASE>_meta.json`` tem o mesmo fingerprint e as saídas ainda existem."""
+    meta_path = out_dir / f"{base}_meta.json"
+    if not meta_path.exists() or not has_bases(out_dir, [base]):
+        return False
+    if not (out_dir / f"{base}_preprocessor.json").exists() or not has_sky(out_dir, base):
+        return False
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("fingerprint") != fingerprint:
+        return False
+    if write_csv:
+        return all((out_dir / f"{base}_{s}.csv").exists() for s in ("train", "valid", "candidates"))
+    return True
+
+
+def base_fingerprints(out_dir: Path, bases: list[str]) -> dict:
+    """Fingerprint gravado no ``<BASE>_meta.json`` de cada base (None se ausente)."""
+    fps = {}
+    for base in bases:
+        meta_path = out_dir / f"{base}_meta.json"
+        fps[base] = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                fps[base] = json.load(f).get("fingerprint")
+    return fps
+
 
 def process_dataset(
     csv_path: Path,
@@ -54,7 +137,9 @@ def process_dataset(
     null_cut: float,
     test_size: float,
     random_state: int = 42,
-) -> None:
+    write_csv: bool = True,
+    force: bool = False,
+) -> bool:
     """Processa um único arquivo CSV e salva os conjuntos tratados.
 
     Parameters
@@ -69,8 +154,24 @@ def process_dataset(
         Proporção de validação dentro das classes binárias.
     random_state : int
         Semente para o split estratificado.
+    write_csv : bool
+        Se True, também grava os splits em CSV (o feature store binário é
+        sempre gravado e é o que ``train_multi_rf.py`` lê).
+    force : bool
+        Reprocessa mesmo que o arquivo bruto e os parâmetros não tenham mudado.
+
+    Returns
+    -------
+    bool
+        True se a base foi reprocessada, False se foi pulada (saídas em dia).
     """
     base = csv_path.stem.upper()
+    fp = build_fingerprint(file_sha256(csv_path), null_cut, test_size, random_state)
+    if not force and is_up_to_date(out_dir, base, fp["fingerprint"], write_csv):
+        print(f"[CACHE] '{csv_path}' e parâmetros inalterados: {base} mantida.")
+        print()
+        return False
+
     raw = pd.read_csv(csv_path, comment="#")
     pre = ExoPreprocessor(null_pct_cut=null_cut, test_size=test_size, random_state=random_state)
     X_tr, y_tr, X_va, y_va, cands = pre.fit_and_split(raw)
@@ -83,9 +184,22 @@ def process_dataset(
     train_df["label"] = y_tr.values
     valid_df = X_va.copy()
     valid_df["label"] = y_va.values
-    train_df.to_csv(out_dir / f"{base}_train.csv", index=False)
-    valid_df.to_csv(out_dir / f"{base}_valid.csv", index=False)
-    cands.to_csv(out_dir / f"{base}_candidates.csv", index=False)
+    # feature store: blocos .npy tipados, já alinhados na união de colunas das bases
+    schema = write_base(out_dir, base, train_df, valid_df, cands)
+    if write_csv:
+        train_df.to_csv(out_dir / f"{base}_train.csv", index=False)
+        valid_df.to_csv(out_dir / f"{base}_valid.csv", index=False)
+        cands.to_csv(out_dir / f"{base}_candidates.csv", index=False)
+
+    # Posição no céu, período, raio e identificador de cada linha salva (os splits
+    # mantêm os rótulos de linha do CSV bruto): cruzamento entre missões e leaderboard
+    write_sky(out_dir, base, {
+        split: sky_frame(raw, df.index, pre.id_col_for_candidates_)
+        for split, df in (("train", train_df), ("valid", valid_df), ("candidates", cands))
+    })
+
+    # Estado ajustado do pré-processador (JSON, sem pickle): reaplicado no serving
+    pre.save_json(out_dir / f"{base}_preprocessor.json")
 
     # Salva metadados
     meta = {
@@ -96,6 +210,8 @@ def process_dataset(
         "n_candidates": len(cands),
         "null_cut": null_cut,
         "test_size": test_size,
+        **fp,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
     }
     with open(out_dir / f"{base}_meta.json", "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
@@ -107,8 +223,22 @@ def process_dataset(
     print(f"  Tamanho treino (0/1): {len(train_df)} registros")
     print(f"  Tamanho validação: {len(valid_df)} registros")
     print(f"  Tamanho candidatos (classe 2): {len(cands)} registros")
+    print(f"  Feature store: {len(schema['columns'])} colunas na união de {len(schema['bases'])} base(s)")
     print(f"  Arquivos salvos em: {out_dir.resolve()}")
     print()
+    return True
+
+
+def write_build_state(out_dir: Path, refreshed: list[str], skipped: list[str]) -> None:
+    """Registra quais bases foram refeitas neste build (consumido pelo train_multi_rf.py)."""
+    state = {
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "refreshed": refreshed,
+        "skipped": skipped,
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / BUILD_STATE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
 
 
 def main() -> None:
@@ -156,6 +286,38 @@ def main() -> None:
         default=42,
         help="Semente para o split estratificado (default 42).",
     )
+    parser.add_argument(
+        "--no_csv",
+        action="store_true",
+        help="Não grava os splits em CSV, só o feature store binário (.npy).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocessa todas as bases, mesmo as que não mudaram desde o último build.",
+    )
+    parser.add_argument(
+        "--match_arcsec",
+        type=float,
+        default=DEFAULT_RADIUS_ARCSEC,
+        help=f"Raio (segundos de arco) do cruzamento entre missões (default {DEFAULT_RADIUS_ARCSEC}).",
+    )
+    parser.add_argument(
+        "--period_rtol",
+        type=float,
+        default=DEFAULT_PERIOD_RTOL,
+        help=f"Diferença relativa máxima de período entre duplicatas (default {DEFAULT_PERIOD_RTOL}).",
+    )
+    parser.add_argument(
+        "--within_bases",
+        action="store_true",
+        help="Casa também linhas da mesma base (padrão: só entre bases diferentes).",
+    )
+    parser.add_argument(
+        "--no_crossmatch",
+        action="store_true",
+        help="Não cruza as bases nem grava o dedup_map.json.",
+    )
     args = parser.parse_args()
 
     # Parsea lista de arquivos
@@ -165,19 +327,41 @@ def main() -> None:
 
     out_dir = Path(args.out_dir)
 
-    # Processa cada arquivo separadamente
+    # Processa cada arquivo separadamente (bases inalteradas são puladas)
+    refreshed, skipped = [], []
     for csv_path_str in csv_list:
         csv_path = Path(csv_path_str)
         if not csv_path.is_file():
             print(f"[AVISO] Arquivo '{csv_path}' não encontrado, ignorando.")
             continue
-        process_dataset(
+        changed = process_dataset(
             csv_path=csv_path,
             out_dir=out_dir,
             null_cut=args.null_cut,
             test_size=args.test_size,
             random_state=args.random_state,
+            write_csv=not args.no_csv,
+            force=args.force,
         )
+        (refreshed if changed else skipped).append(csv_path.stem.upper())
+
+    write_build_state(out_dir, refreshed, skipped)
+    print(f"Bases reprocessadas: {', '.join(refreshed) or 'nenhuma'}; mantidas: {', '.join(skipped) or 'nenhuma'}")
+
+    # Cruzamento entre missões: todas as bases do diretório, não só as desta
+    # execução, refeito sempre (é barato e as linhas mudam quando uma base é refeita)
+    bases = list((read_schema(out_dir) or {}).get("bases", {}))
+    if args.no_crossmatch:
+        if refreshed and (out_dir / DEDUP_MAP).exists():
+            (out_dir / DEDUP_MAP).unlink()   # apontaria para linhas que podem ter mudado
+    elif bases:
+        dedup = build_dedup_map(out_dir, bases, args.match_arcsec, args.period_rtol,
+                                cross_only=not args.within_bases, inputs=base_fingerprints(out_dir, bases))
+        print(f"Cruzamento de {', '.join(dedup['bases'])}: {dedup['n_groups']} grupos de duplicatas, "
+              f"{dedup['n_duplicates']} linhas repetidas (mapa em {out_dir / DEDUP_MAP})")
+        for base, counts in dedup["n_dropped"].items():
+            print(f"  {base}: descarta {counts['train']} treino, {counts['valid']} valid, "
+                  f"{counts['candidates']} candidatos")
 
 
 if __name__ == "__main__":